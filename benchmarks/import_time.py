@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Import-time budget for the cei entry point, measured with ``python -X importtime``.
+
+Imports ``conditioned_ensemble_interface.cli`` in fresh interpreters, takes the
+best cumulative import time over ``--runs``, and exits 1 if it exceeds
+``--budget-ms`` or if the import (or ``cei --help``) pulled in any of the
+heavy modules that must stay lazy.
+
+Usage:
+  python benchmarks/import_time.py --budget-ms 150
+  python benchmarks/import_time.py --module conditioned_ensemble_interface.scoring.model --budget-ms 600 --allow numpy
+"""
+import argparse, json, os, subprocess, sys
+
+HEAVY = ("numpy", "scipy", "sklearn", "joblib", "Bio", "rdkit", "pandas", "torch", "networkx", "yaml")
+_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (_SRC, env.get("PYTHONPATH")) if p)
+    return env
+
+def import_profile(module):
+    """``{module: (self_us, cumulative_us)}`` from one ``-X importtime`` run."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, env=_env(), check=True)
+    out = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        out[name.strip()] = (int(self_us), int(cum_us))
+    return out
+
+def loaded_modules(code):
+    """Top-level package names of the heavy modules imported after running ``code``."""
+    probe = code + f"\nimport sys, json\nprint(json.dumps(sorted({{m.split('.')[0] for m in sys.modules}} & {set(HEAVY)!r})))"
+    proc = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, env=_env(), check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def help_code():
+    return ("import contextlib, io\nfrom conditioned_ensemble_interface.cli import main\n"
+            "with contextlib.redirect_stdout(io.StringIO()):\n"
+            "    try:\n        main(['--help'])\n    except SystemExit:\n        pass")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--module", default="conditioned_ensemble_interface.cli")
+    ap.add_argument("--budget-ms", type=float, default=150.0, help="Allowed best-of-runs cumulative import time")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--allow", nargs="*", default=[], help="Heavy modules this import may load")
+    ap.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    args = ap.parse_args(argv)
+
+    runs = [import_profile(args.module) for _ in range(max(1, args.runs))]
+    best = min(runs, key=lambda r: r[args.module][1])
+    total_ms = best[args.module][1] / 1e3
+    print(f"[import] {args.module}: {total_ms:.1f} ms (best of {len(runs)}; budget {args.budget_ms:.0f} ms)")
+    for name, (self_us, cum_us) in sorted(best.items(), key=lambda kv: -kv[1][0])[:args.top]:
+        print(f"[import]   {self_us / 1e3:8.2f} ms self {cum_us / 1e3:8.2f} ms cumulative  {name}")
+
+    heavy = [m for m in loaded_modules(f"import {args.module}") if m not in args.allow]
+    if args.module == "conditioned_ensemble_interface.cli":
+        heavy += [f"{m} (cei --help)" for m in loaded_modules(help_code()) if m not in args.allow]
+    failed = False
+    if heavy:
+        print(f"[import] heavy modules loaded: {', '.join(heavy)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"[import] over budget by {total_ms - args.budget_ms:.1f} ms")
+        failed = True
+    print("[import] FAIL" if failed else "[import] ok")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Time the scoring pipeline stage by stage and compare against a stored baseline.
+
+Workloads are the shipped 3PTB ensemble (receptor + 10 smina poses), the
+minipep dataset, and synthetic receptor + multi-model ligand ensembles named
+``synth:<atoms>x<poses>``. Each workload is timed separately for parsing,
+contact features, pose checks, model scoring, aggregation and the condition
+sweep. Results go to JSON; with ``--baseline`` every stage's median is
+compared to the baseline and the run exits 1 if any stage got slower than
+``--threshold`` (a fraction) and ``--min-delta`` seconds.
+
+Usage:
+  python benchmarks/run_benchmarks.py --out runs/bench.json --baseline benchmarks/baseline.json
+  python benchmarks/run_benchmarks.py --full --save-baseline benchmarks/baseline.json
+  python benchmarks/run_benchmarks.py --workloads synth:10000x100 --stages features,checks --repeats 3
+"""
+import argparse, json, os, platform, statistics, sys, tempfile, time
+from datetime import datetime, timezone
+import numpy as np
+
+from conditioned_ensemble_interface.data.ensembles import pose_files, pose_ref
+from conditioned_ensemble_interface.data.loaders import load_dataset
+from conditioned_ensemble_interface.data.structure import read_first_model, read_models
+from conditioned_ensemble_interface.scoring.ensemble import aggregate_batch
+from conditioned_ensemble_interface.scoring.features import compute_interface_features, condition_features, pose_features
+from conditioned_ensemble_interface.scoring.model import load_model, score_rows
+from conditioned_ensemble_interface.scoring.receptor_cache import ReceptorCache
+from conditioned_ensemble_interface.scoring.sweep import DEFAULT_GRID, condition_grid, sweep_scores
+from conditioned_ensemble_interface.utils.posechecks import basic_pose_checks
+
+RESULTS_FORMAT = 1
+STAGES = ("parse", "features", "checks", "score", "aggregate", "sweep")
+DEFAULT_WORKLOADS = ("3ptb", "minipep", "synth:1000x10", "synth:10000x100")
+FULL_WORKLOADS = DEFAULT_WORKLOADS + ("synth:50000x1000",)
+CONDITIONS = {"pH": 7.4, "ionic_strength": 0.15}
+# synthetic receptor residues: backbone + CB, a mix of hydrophobic and charged types
+_RESNAMES = ("LEU", "LYS", "ASP", "SER", "ALA", "GLU", "ARG", "VAL", "PHE", "THR")
+_BACKBONE = (("N", "N"), ("CA", "C"), ("C", "C"), ("O", "O"), ("CB", "C"))
+_LIGAND_ATOMS = 24
+
+def _atom_line(serial, name, resname, chain, resseq, xyz, element, record="ATOM"):
+    return (f"{record:<6}{serial % 100000:5d} {name:<4} {resname:>3} {chain}{resseq % 10000:4d}    "
+            f"{xyz[0]:8.3f}{xyz[1]:8.3f}{xyz[2]:8.3f}  1.00  0.00          {element:>2}\n")
+
+def write_synthetic(out_dir, n_atoms, n_poses, seed=0):
+    """Receptor PDB of ``n_atoms`` on a jittered 3 A lattice and a ``n_poses``-model ligand PDB on its top face."""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(n_atoms ** (1 / 3)))
+    grid = np.stack(np.unravel_index(np.arange(n_atoms), (side, side, side)), axis=1) * 3.0
+    xyz = grid + rng.normal(scale=0.3, size=grid.shape)
+    resnames = rng.choice(_RESNAMES, size=n_atoms // len(_BACKBONE) + 1)
+    receptor = os.path.join(out_dir, f"synth_{n_atoms}_receptor.pdb")
+    with open(receptor, "w") as f:
+        for i in range(n_atoms):
+            name, element = _BACKBONE[i % len(_BACKBONE)]
+            res = i // len(_BACKBONE)
+            f.write(_atom_line(i + 1, name, resnames[res], "A", res + 1, xyz[i], element))
+        f.write("END\n")
+    # a compact blob of ligand atoms resting about 3.5 A above the receptor's top face
+    blob = rng.normal(scale=1.5, size=(_LIGAND_ATOMS, 3))
+    top = xyz[:, 2].max() + 3.5
+    ligands = os.path.join(out_dir, f"synth_{n_atoms}x{n_poses}_ligands.pdb")
+    with open(ligands, "w") as f:
+        for k in range(n_poses):
+            q, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+            center = np.array([*rng.uniform(0.2, 0.8, size=2) * 3.0 * (side - 1), top])
+            pose = blob @ q.T + center
+            f.write(f"MODEL {k + 1:8d}\n")
+            for a, p in enumerate(pose):
+                element = "N" if a % 6 == 0 else "O" if a % 6 == 3 else "C"
+                f.write(_atom_line(a + 1, f"{element}{a + 1}", "LIG", "L", 1, p, element, "HETATM"))
+            f.write("ENDMDL\n")
+    return receptor, ligands
+
+def load_workload(name, tmp_dir):
+    """Items (id, poses, conditions) for a workload name."""
+    if name == "3ptb":
+        receptor, ligands = "data/3ptb/receptor_clean.pdb", "runs/3ptb_smina/poses.pdbqt"
+        return [{"id": "3ptb", "poses": [pose_ref(receptor, ligands, k) for k in range(1, 11)], "conditions": CONDITIONS}]
+    if name == "minipep":
+        return list(load_dataset("datasets/minipep.jsonl"))
+    if name.startswith("synth:"):
+        n_atoms, n_poses = (int(v) for v in name[len("synth:"):].lower().split("x"))
+        receptor, ligands = write_synthetic(tmp_dir, n_atoms, n_poses)
+        return [{"id": name, "poses": [pose_ref(receptor, ligands, k) for k in range(1, n_poses + 1)], "conditions": CONDITIONS}]
+    raise ValueError(f"unknown workload {name!r}; expected 3ptb, minipep or synth:<atoms>x<poses>")
+
+def _source_files(items):
+    """(path, multi_model) for every distinct file the poses are read from."""
+    seen = {}
+    for item in items:
+        for pose in item["poses"]:
+            files = pose_files(pose)
+            for i, path in enumerate(files):
+                seen.setdefault(path, len(files) > 1 and i == 1)
+    return list(seen.items())
+
+def measure(fn, repeats=5, min_time=0.05):
+    """Per-call seconds over ``repeats`` rounds; fast calls are looped so each round lasts about ``min_time``."""
+    t0 = time.perf_counter()
+    fn()  # warm-up, also sizes the loop
+    first = time.perf_counter() - t0
+    number = max(1, min(10000, int(min_time / max(first, 1e-9))))
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+    return {"number": number, "repeats": repeats, "min_s": min(times), "median_s": statistics.median(times),
+            "mean_s": statistics.fmean(times)}
+
+def bench_workload(items, model, stages=STAGES, repeats=5, min_time=0.05):
+    """Yield ``(stage, timing)`` for one workload; every timing also carries its unit count ``n``."""
+    poses = [p for item in items for p in item["poses"]]
+    files = _source_files(items)
+    cache = ReceptorCache()
+    analyzed = [[pose_features(p, cache=cache) for p in item["poses"]] for item in items]
+    feats = [[f for f, _ in a] for a in analyzed]
+    pairs = [[c for _, c in a] for a in analyzed]
+    rows = [{**f, **condition_features(item.get("conditions", {}))} for item, fs in zip(items, feats) for f in fs]
+    scores = np.asarray(score_rows(model, rows), dtype=float)
+    offsets = np.concatenate([[0], np.cumsum([len(item["poses"]) for item in items])])
+    grid = condition_grid(DEFAULT_GRID)
+
+    def parse():
+        for path, multi in files:
+            read_models(path) if multi else read_first_model(path)
+
+    def features():
+        cache = ReceptorCache()
+        for p in poses:
+            compute_interface_features(p, cache=cache)
+
+    def checks():
+        for p in poses:
+            basic_pose_checks(p)
+
+    def sweep():
+        for fs, ps in zip(feats, pairs):
+            aggregate_batch(sweep_scores(model, fs, grid, ps), method="softmax")
+
+    jobs = {
+        "parse": (parse, len(files), "files"),
+        "features": (features, len(poses), "poses"),
+        "checks": (checks, len(poses), "poses"),
+        "score": (lambda: score_rows(model, rows), len(rows), "poses"),
+        "aggregate": (lambda: aggregate_batch(scores, offsets, method="softmax"), len(items), "items"),
+        "sweep": (sweep, len(poses) * len(grid), "pose-conditions"),
+    }
+    for stage in stages:
+        fn, n, unit = jobs[stage]
+        timing = measure(fn, repeats, min_time)
+        yield stage, {"n": n, "unit": unit, **timing, "per_unit_s": timing["median_s"] / max(1, n)}
+
+def run(workloads, model_path=None, stages=STAGES, repeats=5, min_time=0.05, log=print):
+    model = load_model({"path": model_path} if model_path else None)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="cei_bench_") as tmp:
+        for name in workloads:
+            items = load_workload(name, tmp)
+            for stage, timing in bench_workload(items, model, stages, repeats, min_time):
+                results[f"{name}/{stage}"] = timing
+                log(f"[bench] {name:<18} {stage:<9} {1e3 * timing['median_s']:10.3f} ms  ({timing['n']} {timing['unit']})")
+    return {
+        "format": RESULTS_FORMAT,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                    "processor": platform.processor(), "cpu_count": os.cpu_count()},
+        "settings": {"model": model_path, "repeats": repeats, "min_time": min_time, "grid_points": len(condition_grid(DEFAULT_GRID))},
+        "results": results,
+    }
+
+def compare(current, baseline, threshold=0.25, min_delta=1e-3):
+    """Rows ``{key, baseline_s, current_s, ratio, status}`` over the union of both result sets.
+
+    A stage regresses when its median is more than ``threshold`` (fractional)
+    and ``min_delta`` seconds above the baseline median; ``improved`` is the
+    mirror image. Stages in only one of the two runs are ``new``/``missing``.
+    """
+    cur, base = current["results"], baseline["results"]
+    rows = []
+    for key in list(base) + [k for k in cur if k not in base]:
+        b = base[key]["median_s"] if key in base else None
+        c = cur[key]["median_s"] if key in cur else None
+        if b is None or c is None:
+            status, ratio = ("new" if b is None else "missing"), None
+        else:
+            ratio = c / b if b > 0 else float("inf")
+            if c > b * (1 + threshold) and c - b > min_delta:
+                status = "regression"
+            elif c < b / (1 + threshold) and b - c > min_delta:
+                status = "improved"
+            else:
+                status = "ok"
+        rows.append({"key": key, "baseline_s": b, "current_s": c, "ratio": ratio, "status": status})
+    return rows
+
+def _write_json(path, obj):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(obj, f, indent=2)
+        f.write("\n")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workloads", help=f"Comma-separated workloads (default: {','.join(DEFAULT_WORKLOADS)})")
+    ap.add_argument("--full", action="store_true", help=f"Run {','.join(FULL_WORKLOADS)}")
+    ap.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to time")
+    ap.add_argument("--model", default="artifacts/real_3ptb_complex.joblib", help="Model artifact (missing -> dummy model)")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--min-time", type=float, default=0.05, help="Seconds per round; faster stages are looped")
+    ap.add_argument("--out", default="runs/bench.json", help="Results JSON")
+    ap.add_argument("--baseline", help="Baseline JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.25, help="Allowed fractional slowdown of a stage median")
+    ap.add_argument("--min-delta", type=float, default=1e-3, help="Ignore slowdowns smaller than this many seconds")
+    ap.add_argument("--save-baseline", help="Also write the results here as the new baseline")
+    args = ap.parse_args(argv)
+
+    workloads = args.workloads.split(",") if args.workloads else list(FULL_WORKLOADS if args.full else DEFAULT_WORKLOADS)
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        ap.error(f"unknown stages {unknown}; expected any of {list(STAGES)}")
+    results = run(workloads, args.model, stages, args.repeats, args.min_time)
+    _write_json(args.out, results)
+    print(f"[bench] wrote {args.out}")
+    if args.save_baseline:
+        _write_json(args.save_baseline, results)
+        print(f"[bench] wrote baseline {args.save_baseline}")
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        rows = compare(results, json.load(f), args.threshold, args.min_delta)
+    for r in rows:
+        if r["ratio"] is None:
+            print(f"[bench] {r['key']:<28} {r['status']}")
+        else:
+            print(f"[bench] {r['key']:<28} {1e3 * r['baseline_s']:10.3f} -> {1e3 * r['current_s']:10.3f} ms  x{r['ratio']:.2f}  {r['status']}")
+    regressions = [r["key"] for r in rows if r["status"] == "regression"]
+    if regressions:
+        print(f"[bench] {len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("[bench] no regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
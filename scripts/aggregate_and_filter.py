@@ -5,70 +5,91 @@
 Usage:
   python scripts/aggregate_and_filter.py --dataset datasets/train.jsonl --pred runs/out_learned.jsonl --out runs/summary.csv --method softmax --temperature 1.0
 """
-import argparse, json, csv, pathlib, math
-from typing import Dict, Any, List
-from conditioned_ensemble_interface.utils.posechecks import basic_pose_checks
-from conditioned_ensemble_interface.scoring.features import compute_interface_features, condition_features
+import argparse, csv, json, pathlib, math
+from typing import Dict, Any, Iterator, Tuple
+from conditioned_ensemble_interface.data.columnar import iter_predictions
+from conditioned_ensemble_interface.data.loaders import JsonlWriter, iter_jsonl, merge_by_id
+from conditioned_ensemble_interface.utils.posebusters_checks import gate_poses
+from conditioned_ensemble_interface.utils.posechecks import analyze_pose, checks_from_structure
 from conditioned_ensemble_interface.scoring.ensemble import aggregate
 
-def load_jsonl(path):
-    for line in open(path):
-        yield json.loads(line)
+FIELDS = ["id", "conditions", "n_poses_in", "n_pass", "pass_rate", "aggregate_method", "aggregate_score"]
+# columns read from Parquet/Arrow predictions (JSONL records are read whole)
+PRED_FIELDS = ("score", "weight", "structure", "features")
+# dataset fields joined onto each prediction (small, so the unsorted join can hold them per id)
+ITEM_FIELDS = ("conditions", "box")
+
+def _item(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: row[k] for k in ITEM_FIELDS if k in (row or {})}
+
+def joined(pred_path: str, dataset_path: str, sorted_ids: bool) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """(prediction, dataset ``ITEM_FIELDS``) pairs; both files are streamed when ``sorted_ids``."""
+    if sorted_ids:
+        for pred, row in merge_by_id(iter_predictions(pred_path, PRED_FIELDS), iter_jsonl(dataset_path)):
+            yield pred, _item(row)
+        return
+    dset = {row["id"]: _item(row) for row in iter_jsonl(dataset_path)}
+    for pred in iter_predictions(pred_path, PRED_FIELDS):
+        yield pred, dset.get(pred["id"], {})
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--dataset", required=True, help="JSONL dataset used for predictions")
-    ap.add_argument("--pred", required=True, help="JSONL predictions from 'cei'")
+    ap.add_argument("--pred", required=True, help="Predictions from 'cei' (JSONL, or .parquet/.arrow)")
     ap.add_argument("--out", required=True, help="CSV summary output path")
     ap.add_argument("--filtered", default="runs/filtered_predictions.jsonl", help="Filtered predictions JSONL output")
     ap.add_argument("--method", default="best", choices=["best", "mean", "softmax"])
     ap.add_argument("--temperature", type=float, default=1.0)
     ap.add_argument("--min_atoms_per_chain", type=int, default=2)
+    ap.add_argument("--geometry", action="store_true",
+                    help="Also require the bond/angle/clash validity gates (read from `cei --geometry-gates` output, else computed per ensemble)")
+    ap.add_argument("--cluster-weights", action="store_true",
+                    help="Weight mean/softmax by the per-pose weight of `cei --dedup-rmsd` output, so each pose cluster counts once")
+    ap.add_argument("--sorted-ids", action="store_true", help="Dataset and predictions are sorted by id: stream-merge them in bounded memory")
     args = ap.parse_args()
 
-    # Map id -> conditions from dataset
-    dset = {row["id"]: row.get("conditions", {}) for row in load_jsonl(args.dataset)}
-
-    out_rows = []
-    filtered_preds = []
-
-    for pred in load_jsonl(args.pred):
-        pid = pred["id"]
-        conditions = dset.get(pid, {})
-        kept = []
-        for s in pred["scores"]:
-            pose = s["pose"]
-            score = float(s["score"])
-            checks = basic_pose_checks(pose, min_atoms_per_chain=args.min_atoms_per_chain)
-            feats = compute_interface_features(pose)
-            # Simple pass rule: must pass basic checks AND have no parse errors and at least some contact signal if available
-            passes = checks["pass"] and (feats.get("contact_count_4A", 0.0) >= 0.0)
-            if passes:
-                kept.append({"pose": pose, "score": score})
-        n_in = len(pred["scores"])
-        n_pass = len(kept)
-        agg = aggregate([k["score"] for k in kept], method=args.method, temperature=args.temperature) if kept else float("nan")
-        filtered_preds.append({"id": pid, "scores": kept})
-        out_rows.append({
-            "id": pid,
-            "n_poses_in": n_in,
-            "n_pass": n_pass,
-            "pass_rate": (n_pass / n_in) if n_in else math.nan,
-            "aggregate_method": args.method,
-            "aggregate_score": agg
-        })
-
     pathlib.Path(args.out).parent.mkdir(parents=True, exist_ok=True)
-    with open(args.out, "w", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=list(out_rows[0].keys()) if out_rows else ["id","n_poses_in","n_pass","pass_rate","aggregate_method","aggregate_score"])
+    with open(args.out, "w", newline="") as f, JsonlWriter(args.filtered) as filtered:
+        w = csv.DictWriter(f, fieldnames=FIELDS)
         w.writeheader()
-        for r in out_rows:
-            w.writerow(r)
-
-    pathlib.Path(args.filtered).parent.mkdir(parents=True, exist_ok=True)
-    with open(args.filtered, "w") as f:
-        for row in filtered_preds:
-            f.write(json.dumps(row) + "\n")
+        for pred, item in joined(args.pred, args.dataset, args.sorted_ids):
+            pid = pred["id"]
+            kept = []
+            geometry = None
+            if args.geometry and not all("geometry" in s.get("structure", {}) for s in pred["scores"]):
+                geometry = gate_poses([s["pose"] for s in pred["scores"]], box=item.get("box"))
+            for k, s in enumerate(pred["scores"]):
+                pose = s["pose"]
+                score = float(s["score"])
+                if "structure" in s:
+                    # written by `cei --gates`: no need to open the pose again
+                    checks = checks_from_structure(s["structure"], args.min_atoms_per_chain)
+                    feats = s.get("features", {})
+                else:
+                    analysis = analyze_pose(pose, min_atoms_per_chain=args.min_atoms_per_chain)
+                    checks, feats = analysis["checks"], analysis["features"]
+                # Simple pass rule: must pass basic checks AND have no parse errors and at least some contact signal if available
+                passes = checks["pass"] and (feats.get("contact_count_4A", 0.0) >= 0.0)
+                if args.geometry:
+                    passes = passes and (checks["geometry_ok"] if "geometry_ok" in checks else geometry[k]["pass"])
+                if passes:
+                    kept.append({"pose": pose, "score": score, "weight": float(s.get("weight", 1.0))})
+            n_in = len(pred["scores"])
+            n_pass = len(kept)
+            weights = [k.pop("weight") for k in kept]
+            agg = aggregate([k["score"] for k in kept], method=args.method, temperature=args.temperature,
+                            weights=weights if args.cluster_weights else None) if kept else float("nan")
+            filtered.write({"id": pid, "scores": kept})
+            w.writerow({
+                "id": pid,
+                # the item's conditions as compact JSON, so runs under different conditions can be told apart
+                "conditions": json.dumps(item.get("conditions", {}), sort_keys=True, separators=(",", ":")),
+                "n_poses_in": n_in,
+                "n_pass": n_pass,
+                "pass_rate": (n_pass / n_in) if n_in else math.nan,
+                "aggregate_method": args.method,
+                "aggregate_score": agg
+            })
 
     print(f"[aggregate] wrote {args.out} and {args.filtered}")
 
@@ -1,55 +1,55 @@
 #!/usr/bin/env python3
 """
-Sweep pH and ionic strength, rescore poses, and write a CSV + PNG.
+Sweep pH and ionic strength (or any condition grid), rescore poses, and write a CSV/Parquet + PNG.
 Usage:
   python scripts/condition_sweep.py --in runs/out_learned.jsonl --out runs/sweep.csv
+  python scripts/condition_sweep.py --in runs/out_learned.jsonl --grid grid.yaml --out runs/sweep.parquet
+
+A grid file maps condition axes to value lists or {start, stop, num}, e.g.
+  pH: {start: 6.5, stop: 8.0, num: 7}
+  ionic_strength: [0.05, 0.15, 0.30]
+  cofactor: [false, true]
 """
-import argparse, json, csv
+import argparse
 from pathlib import Path
-import numpy as np
 import pandas as pd
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
+from conditioned_ensemble_interface.data.columnar import iter_predictions
 from conditioned_ensemble_interface.scoring.model import load_model
-from conditioned_ensemble_interface.scoring.features import compute_interface_features, condition_features
-from conditioned_ensemble_interface.scoring.ensemble import aggregate
+from conditioned_ensemble_interface.scoring.feature_store import add_feature_store_args, feature_store_from_args
+from conditioned_ensemble_interface.scoring.sweep import RowWriter, load_grid, sweep
 
 def load_preds(path):
-    for line in open(path):
-        yield json.loads(line)
+    # only ids and poses are needed; Parquet/Arrow predictions are read without their other columns
+    return iter_predictions(path, ())
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--in", dest="pred_path", required=True)
+    ap.add_argument("--in", dest="pred_path", required=True, help="Predictions (JSONL, or .parquet/.arrow)")
     ap.add_argument("--model", default="artifacts/model.joblib")
-    ap.add_argument("--out", default="runs/sweep.csv")
+    ap.add_argument("--out", default="runs/sweep.csv", help=".csv or .parquet")
+    ap.add_argument("--grid", default=None, help="YAML/JSON condition grid (default: 7 pH x 3 ionic strengths)")
+    ap.add_argument("--method", default="softmax", choices=["best", "mean", "softmax"])
+    ap.add_argument("--temperature", type=float, default=1.0)
+    add_feature_store_args(ap)
     args = ap.parse_args()
+    store = feature_store_from_args(args)
 
     model = load_model({"path": args.model})
-
-    ph_vals = np.linspace(6.5, 8.0, 7)          # 6.5, 6.75, ..., 8.0
-    ionic_vals = [0.05, 0.15, 0.30]              # low / physio / high
+    axes = load_grid(args.grid)
+    plot = sorted(axes) == ["ionic_strength", "pH"]
     rows = []
 
-    for pred in load_preds(args.pred_path):
-        pid = pred["id"]
-        poses = [s["pose"] for s in pred["scores"]]
-        for ph in ph_vals:
-            for ionic in ionic_vals:
-                cond = {"pH": float(ph), "ionic_strength": float(ionic)}
-                scores = []
-                for p in poses:
-                    feats = compute_interface_features(p)
-                    feats.update(condition_features(cond))
-                    scores.append(model.score(feats))
-                agg = float(aggregate(scores, method="softmax", temperature=1.0))
-                rows.append({"id": pid, "pH": float(ph), "ionic_strength": float(ionic), "aggregate": agg})
-
-    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
-    pd.DataFrame(rows).to_csv(args.out, index=False)
-    print(f"[sweep] wrote {args.out} with {len(rows)} rows")
+    with RowWriter(args.out) as writer:
+        for row in sweep(model, load_preds(args.pred_path), axes, method=args.method,
+                         temperature=args.temperature, store=store):
+            writer.write(row)
+            if plot:
+                rows.append(row)
+    print(f"[sweep] wrote {args.out} with {writer.rows_written} rows")
 
     # simple heatmap per id (one figure per complex)
     for pid in sorted(set(r["id"] for r in rows)):
@@ -1,6 +1,7 @@
 
 import json, sys, pathlib
 from collections import defaultdict
+from conditioned_ensemble_interface.data.columnar import iter_predictions
 
 def load_jsonl(path):
     for line in open(path):
@@ -8,7 +9,7 @@ def load_jsonl(path):
 
 def main():
     if len(sys.argv) != 3:
-        print("Usage: python eval_baseline.py <dataset.jsonl> <predictions.jsonl>")
+        print("Usage: python eval_baseline.py <dataset.jsonl> <predictions.jsonl|.parquet|.arrow>")
         sys.exit(1)
     ds_path, pred_path = sys.argv[1], sys.argv[2]
 
@@ -19,7 +20,7 @@ def main():
 
     total = 0
     correct = 0
-    for pred in load_jsonl(pred_path):
+    for pred in iter_predictions(pred_path, ("score",)):
         id_ = pred["id"]
         if id_ not in labels:
             continue
@@ -1,41 +1,68 @@
 #!/usr/bin/env python3
-import argparse, glob
-from rdkit import Chem
-from rdkit.Chem import AllChem
+"""Symmetry-aware, fixed-frame ligand RMSD and Top-k success (needs rdkit).
 
-def load_any(path):
-    if path.lower().endswith((".sdf",".sd")):
-        return Chem.SDMolSupplier(path, removeHs=False)[0]
-    return Chem.MolFromPDBFile(path, removeHs=False)
+Usage:
+  python scripts/eval_pose_rmsd_pdb.py --native runs/3ptb_smina/native_ligand.pdb --poses_glob "runs/3ptb_smina/pose_*.pdb"
+  python scripts/eval_pose_rmsd_pdb.py --dataset datasets/3ptb_complexes.jsonl --chain L --pred runs/real_3ptb_complex_preds.jsonl \
+      --out runs/rmsd.jsonl --workers 4
+"""
+import argparse, glob
+import numpy as np
+from conditioned_ensemble_interface.data.loaders import JsonlWriter, iter_jsonl, load_dataset
+from conditioned_ensemble_interface.utils.rmsd import evaluate_dataset, load_ligand, native_reference
 
-def best_rmsd(native_path, poses_glob, topk=5):
-    nat = load_any(native_path)
-    if nat is None:
-        raise RuntimeError(f"Failed to load native: {native_path}")
-    res=[]
-    for p in sorted(glob.glob(poses_glob)):
-        mol = load_any(p)
-        if mol is None: 
-            continue
-        if mol.GetNumAtoms()==nat.GetNumAtoms():
-            r = AllChem.GetBestRMS(nat, mol)
-            res.append((p, r))
-    res.sort(key=lambda x: x[1])
+def best_rmsd(native_path, poses_glob, topk=5, chain=None):
+    paths = sorted(glob.glob(poses_glob))
+    rmsd = native_reference(native_path, chain).rmsds([load_ligand(p, chain) for p in paths])
+    res = sorted(((p, float(r)) for p, r in zip(paths, rmsd) if np.isfinite(r)), key=lambda x: x[1])
     return res[:topk], res[0][1] if res else float("nan")
 
 def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--native", required=True)
-    ap.add_argument("--poses_glob", required=True)
+    ap = argparse.ArgumentParser(description="Heavy-atom RMSD in the native frame (no realignment), minimized over ligand symmetry")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--native", help="Native ligand (PDB/SDF) for a single pose set")
+    src.add_argument("--dataset", help="JSONL items with poses and a native (native_ligand or label.native_pose)")
+    ap.add_argument("--poses_glob", help="Pose files compared against --native")
     ap.add_argument("--topk", type=int, default=5)
     ap.add_argument("--threshold", type=float, default=2.0, help="success Å")
+    ap.add_argument("--chain", default=None, help="Take the ligand from this chain (for complex PDBs)")
+    ap.add_argument("--pred", default=None, help="cei predictions JSONL: rank poses by score instead of dataset order")
+    ap.add_argument("--out", default=None, help="Per-item JSONL output (dataset mode)")
+    ap.add_argument("--workers", type=int, default=1)
     args = ap.parse_args()
-    top, best = best_rmsd(args.native, args.poses_glob, args.topk)
-    if not top:
-        print("No comparable poses (atom count mismatch or load failure)."); return
-    print("Best pose:", top[0])
-    print("Top-k list:", top)
-    successes = sum(1 for _,r in top if r <= args.threshold)
-    print(f"Top-{args.topk} success @ {args.threshold} Å: {successes}/{len(top)}")
+
+    if args.native:
+        if not args.poses_glob:
+            ap.error("--native needs --poses_glob")
+        top, best = best_rmsd(args.native, args.poses_glob, args.topk, args.chain)
+        if not top:
+            print("No comparable poses (atom count mismatch or load failure)."); return
+        print("Best pose:", top[0])
+        print("Top-k list:", top)
+        successes = sum(1 for _,r in top if r <= args.threshold)
+        print(f"Top-{args.topk} success @ {args.threshold} Å: {successes}/{len(top)}")
+        return
+
+    scores = None
+    if args.pred:
+        scores = {p["id"]: {s["pose"]: s["score"] for s in p.get("scores", [])} for p in iter_jsonl(args.pred)}
+    ks = sorted({1, args.topk})
+    n, hits = 0, {k: 0 for k in ks}
+    out = JsonlWriter(args.out) if args.out else None
+    try:
+        for row in evaluate_dataset(load_dataset(args.dataset), ks, args.threshold, args.chain, scores, args.workers):
+            n += 1
+            for k in ks:
+                hits[k] += row[f"top{k}_success"]
+            if out is not None:
+                out.write(row)
+            print(f"{row['id']}: best RMSD {row['best_rmsd']:.3f} Å (rank {row['best_rank']}), "
+                  f"{row['n_compared']}/{row['n_poses']} poses compared")
+    finally:
+        if out is not None:
+            out.close()
+    for k in ks:
+        print(f"Top-{k} success @ {args.threshold} Å: {hits[k]}/{n} items")
+
 if __name__ == "__main__":
     main()
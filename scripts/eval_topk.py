@@ -5,6 +5,7 @@ Usage:
   python scripts/eval_topk.py --dataset datasets/minipep.jsonl --pred runs/minipep_preds.jsonl
 """
 import argparse, json
+from conditioned_ensemble_interface.data.columnar import iter_predictions
 
 def load_jsonl(p):
     for line in open(p):
@@ -13,12 +14,12 @@ def load_jsonl(p):
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--dataset", required=True)
-    ap.add_argument("--pred", required=True)
+    ap.add_argument("--pred", required=True, help="JSONL, or .parquet/.arrow predictions")
     args = ap.parse_args()
 
     labels = {r["id"]: r.get("label", {}).get("native_pose") for r in load_jsonl(args.dataset)}
     n = 0; top1 = 0; top2 = 0
-    for pr in load_jsonl(args.pred):
+    for pr in iter_predictions(args.pred, ("score",)):
         nid = pr["id"]; gold = labels.get(nid)
         if not gold: continue
         n += 1
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""Export trained GBT joblib artifacts to .npz tree arrays that load_model picks up automatically.
+
+Usage:
+  python scripts/export_gbt_npz.py artifacts/model.joblib [artifacts/other.joblib ...]
+"""
+import argparse, os
+import joblib
+
+from conditioned_ensemble_interface.scoring.model import export_tree_ensemble
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("models", nargs="+", help="joblib artifacts written by train_gbt.py")
+    args = ap.parse_args()
+    for path in args.models:
+        out = os.path.splitext(path)[0] + ".npz"
+        export_tree_ensemble(joblib.load(path), out, source_path=path)
+        print(f"[export] wrote {out}")
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,45 @@
 #!/usr/bin/env python3
 import argparse, glob, json
 from pathlib import Path
+from conditioned_ensemble_interface.data.ensembles import expand_ensemble
 
 def main():
     ap = argparse.ArgumentParser(description="Create JSONL dataset from complex PDBs")
     ap.add_argument("--id", default="example", help="dataset item id")
-    ap.add_argument("--native", required=True, help="path to native complex PDB")
-    ap.add_argument("--glob", required=True, help="glob for docked complex PDBs")
+    ap.add_argument("--native", help="path to native complex PDB")
+    ap.add_argument("--glob", help="glob for docked complex PDBs")
+    ap.add_argument("--receptor", help="receptor PDB/PDBQT (instead of --native/--glob)")
+    ap.add_argument("--ligands", help="multi-model docked ligand file (PDBQT/PDB/SDF) scored against --receptor")
+    ap.add_argument("--native-ligand", help="crystal ligand kept with the item for RMSD evaluation")
     ap.add_argument("--out", required=True, help="output JSONL file")
     ap.add_argument("--pH", type=float, default=7.4)
     ap.add_argument("--ionic_strength", type=float, default=0.15)
     args = ap.parse_args()
+    conditions = {"pH": args.pH, "ionic_strength": args.ionic_strength}
 
-    poses = [args.native] + sorted(glob.glob(args.glob))
-    if not poses:
-        raise SystemExit("no poses found")
-
-    item = {
-        "id": args.id,
-        "poses": poses,
-        "conditions": {"pH": args.pH, "ionic_strength": args.ionic_strength},
-        "label": {"native_pose": args.native}
-    }
+    if args.receptor or args.ligands:
+        if not (args.receptor and args.ligands):
+            ap.error("--receptor and --ligands go together")
+        # poses are assembled in memory by the loader: no per-pose complex files
+        item = {"id": args.id, "receptor": args.receptor, "ligands": args.ligands, "conditions": conditions}
+        if args.native_ligand:
+            item["native_ligand"] = args.native_ligand
+        n = len(expand_ensemble(item)["poses"])
+    else:
+        if not (args.native and args.glob):
+            ap.error("give --native and --glob, or --receptor and --ligands")
+        poses = [args.native] + sorted(glob.glob(args.glob))
+        item = {
+            "id": args.id,
+            "poses": poses,
+            "conditions": conditions,
+            "label": {"native_pose": args.native}
+        }
+        n = len(poses)
     Path(args.out).parent.mkdir(parents=True, exist_ok=True)
     with open(args.out, "w") as f:
         f.write(json.dumps(item) + "\n")
-    print(f"[ok] wrote {args.out} with {len(poses)} poses")
+    print(f"[ok] wrote {args.out} with {n} poses")
 
 if __name__ == "__main__":
     main()
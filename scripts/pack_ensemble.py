@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Pack receptor + ligand ensembles into memory-mapped .npz files.
+
+Usage:
+  python scripts/pack_ensemble.py --receptor data/3ptb/receptor_clean.pdb --ligands runs/3ptb_smina/poses.pdbqt --out packs/3ptb.npz
+  python scripts/pack_ensemble.py --dataset datasets/3ptb_ensemble.jsonl --out-dir packs --dataset-out datasets/3ptb_packed.jsonl
+"""
+import argparse, os, pathlib
+
+from conditioned_ensemble_interface.data.ensembles import pack_files
+from conditioned_ensemble_interface.data.loaders import JsonlWriter, iter_jsonl
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--receptor", help="Receptor PDB/PDBQT")
+    ap.add_argument("--ligands", nargs="+", help="Ligand files (multi-model PDB/PDBQT/SDF); every model becomes a pose")
+    ap.add_argument("--out", help="Pack to write")
+    ap.add_argument("--dataset", help="JSONL whose receptor + ligands items are packed (others are copied as is)")
+    ap.add_argument("--out-dir", default="packs", help="Directory for per-item packs (dataset mode)")
+    ap.add_argument("--dataset-out", help="Dataset JSONL rewritten to point at the packs (dataset mode)")
+    args = ap.parse_args()
+
+    if args.dataset:
+        if not args.dataset_out:
+            ap.error("--dataset needs --dataset-out")
+        pathlib.Path(args.out_dir).mkdir(parents=True, exist_ok=True)
+        with JsonlWriter(args.dataset_out) as out:
+            for item in iter_jsonl(args.dataset):
+                if "receptor" in item and "ligands" in item and not item.get("poses"):
+                    ligands = item["ligands"] if isinstance(item["ligands"], list) else [item["ligands"]]
+                    pack = os.path.join(args.out_dir, f"{item['id']}.npz")
+                    n = pack_files(item["receptor"], ligands, pack)
+                    print(f"[pack] {item['id']}: {n} poses -> {pack}")
+                    item = {k: v for k, v in item.items() if k not in ("receptor", "ligands")}
+                    item["ensemble"] = pack
+                out.write(item)
+        print(f"[pack] wrote {args.dataset_out}")
+        return
+    if not (args.receptor and args.ligands and args.out):
+        ap.error("give --receptor, --ligands and --out, or --dataset")
+    pathlib.Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    n = pack_files(args.receptor, args.ligands, args.out)
+    print(f"[pack] wrote {args.out} with {n} poses")
+
+if __name__ == "__main__":
+    main()
@@ -4,55 +4,40 @@
 
 Usage:
   python scripts/train_gbt.py --dataset datasets/train.jsonl --out artifacts/model.joblib
+  python scripts/train_gbt.py --dataset datasets/train.jsonl --out artifacts/model.joblib \
+      --features-from runs/train_features --workers 8
 """
-import argparse, json, pathlib, os
-from typing import List, Dict, Any
+import argparse, pathlib, os
+from typing import Iterator, Dict, Any
 import numpy as np
 
 from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.metrics import roc_auc_score
 from joblib import dump
 
-from conditioned_ensemble_interface.scoring.features import compute_interface_features, condition_features
+from conditioned_ensemble_interface.data.loaders import load_dataset
+from conditioned_ensemble_interface.scoring.model import export_tree_ensemble
+from conditioned_ensemble_interface.scoring.feature_store import add_feature_store_args, feature_store_from_args
+from conditioned_ensemble_interface.scoring.training import feature_table
 
-def load_items(path: str) -> List[Dict[str, Any]]:
-    items = []
-    with open(path) as f:
-        for line in f:
-            items.append(json.loads(line))
-    return items
-
-def build_table(items) -> (np.ndarray, np.ndarray, List[str]):
-    X, y = [], []
-    feature_keys = None
-    for ex in items:
-        cond = condition_features(ex.get("conditions", {}))
-        label_native = ex.get("label", {}).get("native_pose")
-        poses = ex.get("poses", [])
-        for p in poses:
-            feats = compute_interface_features(p)
-            feats.update(cond)
-            # set label: 1 if this pose equals native else 0 (skip if unknown)
-            if label_native is None:
-                continue
-            label = 1 if p == label_native else 0
-            # choose numeric keys and fix order
-            if feature_keys is None:
-                feature_keys = sorted([k for k,v in feats.items() if isinstance(v, (int, float))])
-            X.append([float(feats.get(k, 0.0)) for k in feature_keys])
-            y.append(label)
-    if not X:
-        raise RuntimeError("No labeled poses found in dataset")
-    return np.array(X, dtype=float), np.array(y, dtype=int), feature_keys
+def load_items(path: str) -> Iterator[Dict[str, Any]]:
+    return load_dataset(path)
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--dataset", required=True, help="JSONL with poses and native labels")
     ap.add_argument("--out", required=True, help="Path to write model.joblib")
+    ap.add_argument("--features-from", type=str, default=None,
+                    help="Directory of a saved training matrix: reused when current, otherwise rebuilt there")
+    ap.add_argument("--workers", type=int, default=1, help="Processes for feature extraction")
+    add_feature_store_args(ap)
     args = ap.parse_args()
 
     items = load_items(args.dataset)
-    X, y, keys = build_table(items)
+    table, reused = feature_table(items, args.features_from, workers=args.workers, store=feature_store_from_args(args))
+    X, y, keys = table.X, table.y, table.feature_order
+    if args.features_from:
+        print(f"[train] {'loaded' if reused else 'wrote'} feature table {args.features_from} ({len(table)} rows)")
 
     # simple train/val split
     rng = np.random.RandomState(42)
@@ -74,6 +59,9 @@ def main():
     pathlib.Path(args.out).parent.mkdir(parents=True, exist_ok=True)
     dump(model, args.out)
     print(f"[train] wrote {args.out} with {len(keys)} features")
+    npz = os.path.splitext(args.out)[0] + ".npz"
+    export_tree_ensemble(model, npz, source_path=args.out)
+    print(f"[train] wrote {npz} (NumPy tree export used by load_model)")
 
 if __name__ == "__main__":
     main()
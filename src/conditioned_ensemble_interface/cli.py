@@ -1,26 +1,187 @@
 from __future__ import annotations
-import argparse, yaml, json, pathlib
-from .scoring.model import load_model, score_ensemble
-from .data.loaders import load_dataset
+import argparse, pathlib, sys
+# scoring modules (numpy, scipy) load once arguments are parsed, so `cei --help` and bad flags return fast
+from .scoring.feature_store import DEFAULT_MAX_BYTES, DEFAULT_STORE_PATH, FeatureStore, add_feature_store_args, feature_store_from_args
+from .data.columnar import DEFAULT_ROW_GROUP_ROWS, columnar_format
+from .data.loaders import JsonlWriter, completed_ids, is_compressed, load_dataset, parse_shard, shard
+from .utils import profiling
 
-def main():
+def cache_main(argv):
+    p = argparse.ArgumentParser(prog="cei cache", description="Inspect or shrink the on-disk feature store")
+    p.add_argument("action", choices=["stats", "prune"])
+    p.add_argument("--store", type=str, default=DEFAULT_STORE_PATH)
+    p.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20, help="Size cap applied by prune")
+    args = p.parse_args(argv)
+    store = FeatureStore(args.store, max_bytes=int(args.max_mb * 2**20))
+    if args.action == "prune":
+        print(f"[cei] pruned {store.prune()} entries")
+    for k, v in store.stats().items():
+        if k not in ("hits", "misses"):
+            print(f"{k}: {v}")
+    store.close()
+
+def serve_main(argv):
+    p = argparse.ArgumentParser(prog="cei serve", description="Score poses for local clients with a warm model and receptor cache")
+    p.add_argument("--config", type=str, help="YAML config whose model: section is served")
+    p.add_argument("--model", type=str, help="Model artifact (overrides the config's model path)")
+    p.add_argument("--host", type=str, default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--unix", type=str, default=None, help="Listen on this Unix socket instead of TCP")
+    p.add_argument("--max-batch-poses", type=int, default=256, help="Poses per micro-batch / model call")
+    p.add_argument("--max-wait-ms", type=float, default=5.0, help="How long a batch waits for concurrent requests")
+    p.add_argument("--receptor-cache", type=int, default=8, help="Parsed receptors kept warm")
+    p.add_argument("--gates", action="store_true", help="Embed per-pose structure summaries in the scores")
+    p.add_argument("--geometry-gates", action="store_true", help="Also embed physical validity gates (implies --gates)")
+    add_feature_store_args(p)
+    args = p.parse_args(argv)
+    import asyncio
+    from .server import ScoringServer, serve
+    model_cfg = {}
+    if args.config:
+        import yaml
+        with open(args.config) as f:
+            model_cfg = dict((yaml.safe_load(f) or {}).get("model") or {})
+    if args.model:
+        model_cfg["path"] = args.model
+    server = ScoringServer(model_cfg, store=feature_store_from_args(args), gates=args.gates, geometry=args.geometry_gates,
+                           max_batch_poses=args.max_batch_poses,
+                           max_wait_ms=args.max_wait_ms, receptor_cache=args.receptor_cache)
+    asyncio.run(serve(server, args.host, args.port, args.unix))
+
+def _errors_path(out: str, kind: str = "errors") -> pathlib.Path:
+    out = pathlib.Path(out)
+    stem = out.name.split(".jsonl")[0] if ".jsonl" in out.name else out.stem if columnar_format(out) else out.name
+    return out.with_name(f"{stem}.{kind}.jsonl")
+
+class _ErrorLog:
+    """Side JSONL (failures, skipped poses) opened on the first record, so clean runs leave no file behind."""
+    def __init__(self, path: pathlib.Path, append: bool, flush_every: int = 1):
+        self.path, self.append, self.count, self._w = path, append, 0, None
+        self.flush_every = flush_every
+        self.reasons = {}
+        if not append and path.exists():
+            path.unlink()
+
+    def __call__(self, record) -> None:
+        if self._w is None:
+            self._w = JsonlWriter(self.path, flush_every=self.flush_every, mode="a" if self.append else "w", durable=True)
+        self._w.write(record)
+        self.count += 1
+        if "reason" in record:
+            self.reasons[record["reason"]] = self.reasons.get(record["reason"], 0) + 1
+
+    def close(self) -> None:
+        if self._w is not None:
+            self._w.close()
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["cache"]:
+        return cache_main(argv[1:])
+    if argv[:1] == ["serve"]:
+        return serve_main(argv[1:])
     p = argparse.ArgumentParser(prog="cei", description="Condition-aware ensemble interface scoring")
     p.add_argument("--config", type=str, help="Path to a YAML config")
     p.add_argument("--dataset", type=str, help="Path to dataset config or folder")
-    p.add_argument("--out", type=str, default="runs/out.jsonl")
-    args = p.parse_args()
+    p.add_argument("--out", type=str, default="runs/out.jsonl",
+                   help="Output JSONL (.gz/.zst compress), or flat columnar rows for .parquet/.arrow (needs pyarrow)")
+    p.add_argument("--row-group-rows", type=int, default=DEFAULT_ROW_GROUP_ROWS, help="Pose rows per Parquet/Arrow row group (cut at item boundaries)")
+    p.add_argument("--shard", type=parse_shard, default=None, help="Score only shard i/n of the dataset (round robin by item)")
+    p.add_argument("--flush-every", type=int, default=256, help="Output lines buffered per write")
+    p.add_argument("--workers", type=int, default=1, help="Scoring processes (1 = serial)")
+    p.add_argument("--chunksize", type=int, default=256, help="Poses per model call / worker task")
+    p.add_argument("--unordered", action="store_true", help="Write items in completion order instead of input order")
+    p.add_argument("--gates", action="store_true", help="Embed per-pose structure summaries so filtering needs no pose I/O")
+    p.add_argument("--geometry-gates", action="store_true",
+                   help="Also embed bond/angle/clash/box validity gates, computed per ensemble in bulk (implies --gates)")
+    p.add_argument("--features", action="store_true", help="Embed each pose's feature values (one column each in Parquet/Arrow)")
+    p.add_argument("--cascade", action="store_true",
+                   help="Drop hopeless poses (no receptor contact, gross clashes) on a coarse receptor grid before "
+                        "features and the model; thresholds from the config's cascade: section")
+    p.add_argument("--topk", type=int, default=None, help="Keep only the K best-scoring poses per item")
+    p.add_argument("--dedup-rmsd", type=float, default=None,
+                   help="Cluster each item's poses at this ligand RMSD (Angstrom) and score one pose per cluster; "
+                        "members get its score plus cluster/weight fields")
+    p.add_argument("--skipped", type=str, default=None,
+                   help="JSONL of poses dropped by --cascade/--topk/--dedup-rmsd (default: <out>.skipped.jsonl)")
+    p.add_argument("--resume", action="store_true", help="Skip item ids already in --out and append the rest")
+    p.add_argument("--errors", type=str, default=None, help="JSONL for failed items/poses (default: <out>.errors.jsonl)")
+    p.add_argument("--profile", action="store_true", help="Time pipeline stages and print a per-stage summary")
+    p.add_argument("--profile-trace", type=str, default=None, help="Per-pose stage timings JSONL (implies --profile)")
+    p.add_argument("--profile-sample", type=int, default=0, help="Profile every n-th task in depth (implies --profile)")
+    p.add_argument("--profile-dir", type=str, default="runs/profiles", help="Where sampled profiles are written")
+    p.add_argument("--profile-backend", choices=profiling.BACKENDS, default="cprofile")
+    add_feature_store_args(p)
+    args = p.parse_args(argv)
+    if args.resume and (columnar_format(args.out) or is_compressed(args.out)):
+        p.error("--resume needs an uncompressed JSONL --out")
+    store = feature_store_from_args(args)
+    traces = JsonlWriter(args.profile_trace) if args.profile_trace else None
+    prof = None
+    if args.profile or traces is not None or args.profile_sample > 0:
+        prof = profiling.enable(profiling.Profiler(trace_sink=traces.write if traces else None, sample_every=args.profile_sample,
+                                                   sample_dir=args.profile_dir, backend=args.profile_backend))
 
     cfg = {}
     if args.config:
+        import yaml
         with open(args.config) as f:
             cfg = yaml.safe_load(f)
+    from .scoring.parallel import iter_scores
 
     ds = load_dataset(args.dataset or cfg.get("dataset", {}))
-    model = load_model(cfg.get("model", {}))
-
-    out_path = pathlib.Path(args.out); out_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(out_path, "w") as f:
-        for item in ds:
-            scores = score_ensemble(model, item)
-            f.write(json.dumps({"id": item.get("id"), "scores": scores}) + "\n")
-    print(f"[cei] wrote {out_path}")
+    if args.shard:
+        ds = shard(ds, *args.shard)
+    done = completed_ids(args.out) if args.resume else set()
+    if done:
+        ds = (item for item in ds if item.get("id") not in done)
+    if prof is not None:
+        ds = profiling.timed(ds, "read")
+
+    errors = _ErrorLog(pathlib.Path(args.errors) if args.errors else _errors_path(args.out), append=args.resume)
+    pruning = args.cascade or args.topk is not None or args.dedup_rmsd is not None
+    skipped = _ErrorLog(pathlib.Path(args.skipped) if args.skipped else _errors_path(args.out, "skipped"),
+                        append=args.resume, flush_every=args.flush_every) if pruning else None
+    cascade = dict(cfg.get("cascade") or {}) if args.cascade else None
+    dedup = None
+    if args.dedup_rmsd is not None:
+        from .scoring.dedup import Deduplicator
+        dedup = Deduplicator(rmsd=args.dedup_rmsd)
+    try:
+        if columnar_format(args.out):
+            from .data.columnar import ColumnarWriter
+            from .scoring.features import FEATURE_KEYS
+            writer = ColumnarWriter(args.out, FEATURE_KEYS if args.features else (), gates=args.gates, geometry=args.geometry_gates,
+                                    clusters=dedup is not None, row_group_rows=args.row_group_rows)
+        else:
+            writer = JsonlWriter(args.out, flush_every=args.flush_every, mode="a" if args.resume else "w", durable=True)
+        with writer as out:
+            for item_id, scores in iter_scores(ds, cfg.get("model", {}), workers=args.workers,
+                                               chunksize=args.chunksize, ordered=not args.unordered,
+                                               store_path=store.path if store else None, gates=args.gates, geometry=args.geometry_gates,
+                                               on_error=errors, cascade=cascade, topk=args.topk, on_skip=skipped, dedup=dedup,
+                                               features=args.features):
+                with profiling.stage("write"):
+                    out.write({"id": item_id, "scores": scores})
+    finally:
+        errors.close()
+        if skipped is not None:
+            skipped.close()
+        if traces is not None:
+            traces.close()
+        profiling.disable()
+    if done:
+        print(f"[cei] resumed: skipped {len(done)} items already in {args.out}")
+    if errors.count:
+        print(f"[cei] {errors.count} failures logged to {errors.path}")
+    if dedup is not None:
+        print(f"[cei] dedup: scored {dedup.representatives} cluster representatives for {dedup.poses} poses")
+    if skipped is not None and skipped.count:
+        detail = ", ".join(f"{k}: {v}" for k, v in sorted(skipped.reasons.items()))
+        print(f"[cei] skipped {skipped.count} poses ({detail}), listed in {skipped.path}")
+    print(f"[cei] wrote {args.out}")
+    if prof is not None:
+        for line in prof.format_summary():
+            print(f"[profile] {line}")
+        if traces is not None:
+            print(f"[profile] per-pose traces in {args.profile_trace}")
@@ -0,0 +1,242 @@
+"""Flat columnar predictions (Parquet or Arrow IPC), the alternative to nested JSONL for large runs.
+
+One row per scored pose: ``id``, ``pose``, ``score``, then the blocks a run
+embeds: ``cluster``/``weight`` (``cei --dedup-rmsd``), the structure summary
+``file_exists``/``parsed_ok``/``chain_atoms`` (``--gates``), ``geometry_*``
+gate flags (``--geometry-gates``; the raw geometry metrics stay JSONL-only)
+and one ``f_<name>`` column per feature (``--features``). The columns are
+fixed by those options up front, so every row group shares one schema; an
+item left without poses keeps one row with a null pose. ``id`` is an int
+or a string column, following the dataset's ids, which must all be one
+type. Readers fetch only the columns they need and ``iter_predictions``
+rebuilds the nested ``{"id", "scores"}`` records from them, so downstream
+scripts take either format without decoding JSON. Needs pyarrow (imported
+on first use); JSONL stays the default.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+import pathlib
+from .loaders import iter_jsonl
+
+SUFFIXES = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+FEATURE_PREFIX = "f_"
+GEOMETRY_PREFIX = "geometry_"
+GEOMETRY_FLAGS = ("pass", "bond_lengths_ok", "bond_angles_ok", "internal_clash_ok", "protein_clash_ok", "in_box")
+CLUSTER_COLUMNS = ("cluster", "weight")
+STRUCTURE_COLUMNS = ("file_exists", "parsed_ok", "chain_atoms")
+DEFAULT_ROW_GROUP_ROWS = 65536
+
+def columnar_format(path) -> Optional[str]:
+    """``"parquet"`` or ``"arrow"`` for columnar prediction paths, None for anything else (JSONL)."""
+    return SUFFIXES.get(pathlib.Path(str(path)).suffix.lower())
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except Exception:
+        raise RuntimeError("pyarrow not available; install pyarrow for Parquet/Arrow predictions") from None
+    return pyarrow
+
+def prediction_columns(feature_keys: Sequence[str] = (), gates: bool = False, geometry: bool = False,
+                       clusters: bool = False) -> List[str]:
+    """Column names of a prediction file written with these options, in file order."""
+    cols = ["id", "pose", "score"]
+    if clusters:
+        cols += CLUSTER_COLUMNS
+    if gates or geometry:
+        cols += STRUCTURE_COLUMNS
+    if geometry:
+        cols += [GEOMETRY_PREFIX + f for f in GEOMETRY_FLAGS]
+    return cols + [FEATURE_PREFIX + k for k in feature_keys]
+
+def flat_rows(record: Dict[str, Any], columns: Sequence[str]) -> List[Dict[str, Any]]:
+    """One row per score entry of a ``{"id", "scores"}`` record; values absent from an entry are None."""
+    rows = []
+    for s in record.get("scores") or [{}]:
+        structure = s.get("structure") or {}
+        geometry = structure.get("geometry") or {}
+        feats = s.get("features") or {}
+        row = {}
+        for c in columns:
+            if c == "id":
+                row[c] = record["id"]
+            elif c.startswith(FEATURE_PREFIX):
+                row[c] = feats.get(c[len(FEATURE_PREFIX):])
+            elif c.startswith(GEOMETRY_PREFIX):
+                row[c] = geometry.get(c[len(GEOMETRY_PREFIX):])
+            elif c in STRUCTURE_COLUMNS:
+                row[c] = structure.get(c)
+            else:
+                row[c] = s.get(c)
+        rows.append(row)
+    return rows
+
+def _entry_builder(columns: Sequence[str]):
+    """Function from one row tuple (values in ``columns`` order) to its score entry."""
+    idx = {c: k for k, c in enumerate(columns)}
+    pose, score = idx["pose"], idx.get("score")
+    clusters = [(c, idx[c]) for c in CLUSTER_COLUMNS if c in idx]
+    structure = [(c, idx[c]) for c in STRUCTURE_COLUMNS if c in idx]
+    geometry = [(c[len(GEOMETRY_PREFIX):], k) for c, k in idx.items() if c.startswith(GEOMETRY_PREFIX)]
+    feats = [(c[len(FEATURE_PREFIX):], k) for c, k in idx.items() if c.startswith(FEATURE_PREFIX)]
+
+    def entry(row) -> Dict[str, Any]:
+        out = {"pose": row[pose]}
+        if score is not None:
+            out["score"] = row[score]
+        for c, k in clusters:
+            if row[k] is not None:
+                out[c] = row[k]
+        if structure or geometry:
+            summary = {c: row[k] for c, k in structure}
+            gates = {c: row[k] for c, k in geometry if row[k] is not None}
+            if gates:
+                summary["geometry"] = gates
+            if summary:
+                out["structure"] = summary
+        if feats:
+            values = {c: row[k] for c, k in feats if row[k] is not None}
+            if values:
+                out["features"] = values
+        return out
+    return entry
+
+def nested_records(rows: Iterable[Sequence[Any]], columns: Sequence[str]) -> Iterator[Dict[str, Any]]:
+    """``{"id", "scores"}`` records from flat row tuples; consecutive rows with the same id form one record."""
+    entry = _entry_builder(columns)
+    id_col, pose = list(columns).index("id"), list(columns).index("pose")
+    cur = None
+    for row in rows:
+        if cur is None or row[id_col] != cur["id"]:
+            if cur is not None:
+                yield cur
+            cur = {"id": row[id_col], "scores": []}
+        if row[pose] is not None:
+            cur["scores"].append(entry(row))
+    if cur is not None:
+        yield cur
+
+def file_columns(path) -> List[str]:
+    """Column names stored in a columnar prediction file (read from its schema only)."""
+    pa = _pyarrow()
+    if columnar_format(path) == "parquet":
+        return list(pa.parquet.read_schema(str(path)).names)
+    with pa.memory_map(str(path)) as source:
+        return list(pa.ipc.open_file(source).schema.names)
+
+def iter_batches(path, columns: Optional[Sequence[str]] = None) -> Iterator[Any]:
+    """pyarrow record batches of a columnar file (one or more per row group), reading only ``columns``."""
+    pa = _pyarrow()
+    columns = list(columns) if columns is not None else None
+    if columnar_format(path) == "parquet":
+        yield from pa.parquet.ParquetFile(str(path)).iter_batches(columns=columns)
+        return
+    with pa.memory_map(str(path)) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            yield batch.select(columns) if columns is not None else batch
+
+def iter_rows(path, columns: Sequence[str]) -> Iterator[tuple]:
+    """Row tuples (values in ``columns`` order) of a columnar file, one record batch at a time."""
+    for batch in iter_batches(path, columns):
+        yield from zip(*(col.to_pylist() for col in batch.columns))
+
+def iter_predictions(path, fields: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Prediction records from JSONL or a columnar file.
+
+    For columnar files only ``id``, ``pose`` and the requested ``fields`` are
+    read: any of ``score``, ``cluster``, ``weight``, ``structure`` (summary and
+    geometry flags) and ``features``; None reads everything. JSONL records
+    are returned whole.
+    """
+    if columnar_format(path) is None:
+        yield from iter_jsonl(path)
+        return
+    stored = file_columns(path)
+    if fields is None:
+        columns = stored
+    else:
+        want = {"id", "pose"} | set(fields)
+        columns = [c for c in stored if c in want
+                   or ("structure" in want and (c in STRUCTURE_COLUMNS or c.startswith(GEOMETRY_PREFIX)))
+                   or ("features" in want and c.startswith(FEATURE_PREFIX))]
+    yield from nested_records(iter_rows(path, columns), columns)
+
+class ColumnarWriter:
+    """Writes ``{"id", "scores"}`` records as flat rows (see the module docstring).
+
+    Same ``write``/``close`` interface as ``loaders.JsonlWriter``; rows are
+    held in column lists and a row group is cut at the first item boundary
+    past ``row_group_rows`` rows, so an item never spans two. The file is
+    only readable once closed.
+    """
+    def __init__(self, path, feature_keys: Sequence[str] = (), gates: bool = False, geometry: bool = False,
+                 clusters: bool = False, row_group_rows: int = DEFAULT_ROW_GROUP_ROWS):
+        self.path = pathlib.Path(path)
+        self.format = columnar_format(self.path)
+        if self.format is None:
+            raise ValueError(f"{path}: columnar predictions need a .parquet or .arrow path")
+        self._pa = _pyarrow()
+        self.columns = prediction_columns(feature_keys, gates, geometry, clusters)
+        self.row_group_rows = max(1, int(row_group_rows))
+        self.lines_written = 0
+        self.rows_written = 0
+        self._cols: Dict[str, List[Any]] = {c: [] for c in self.columns}
+        self._pending = 0
+        self._id_type: Optional[type] = None
+        self._schema = self._writer = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        id_type = type(record["id"])
+        if self._id_type is None:
+            self._id_type = id_type
+        elif id_type is not self._id_type:
+            # one schema for the whole file; readers and id joins get the dataset's own ids back
+            raise ValueError(f"{self.path}: item id {record['id']!r} is {id_type.__name__} but earlier ids are "
+                             f"{self._id_type.__name__}; columnar predictions need ids of one type (use JSONL for mixed ids)")
+        for row in flat_rows(record, self.columns):
+            for c in self.columns:
+                self._cols[c].append(row[c])
+            self._pending += 1
+        self.lines_written += 1
+        if self._pending >= self.row_group_rows:
+            self.flush()
+
+    def _make_schema(self):
+        pa = self._pa
+        types = {"id": pa.int64() if self._id_type is int else pa.string(), "pose": pa.string(), "score": pa.float64(),
+                 "cluster": pa.string(), "weight": pa.float64(), "file_exists": pa.bool_(), "parsed_ok": pa.bool_(),
+                 "chain_atoms": pa.list_(pa.int64())}
+        return pa.schema([(c, types.get(c) or (pa.bool_() if c.startswith(GEOMETRY_PREFIX) else pa.float64()))
+                          for c in self.columns])
+
+    def flush(self) -> None:
+        if self._writer is None:
+            self._schema = self._make_schema()
+            if self.format == "parquet":
+                self._writer = self._pa.parquet.ParquetWriter(str(self.path), self._schema)
+            else:
+                self._writer = self._pa.ipc.new_file(str(self.path), self._schema)
+        if not self._pending:
+            return
+        table = self._pa.Table.from_pydict(self._cols, schema=self._schema)
+        if self.format == "parquet":
+            self._writer.write_table(table, row_group_size=self._pending)
+        else:
+            self._writer.write_table(table)
+        self.rows_written += self._pending
+        self._cols = {c: [] for c in self.columns}
+        self._pending = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,175 @@
+"""Receptor + multi-model ligand ensembles, assembled in memory.
+
+A dataset item may give ``receptor`` (PDB/PDBQT) and ``ligands`` (a
+multi-MODEL PDB/PDBQT or multi-record SDF) instead of per-pose complex
+files. Its poses are then references ``"<receptor>::<ligands>#<k>"``, with
+``k`` the 1-based model (or SDF record), which every pose consumer resolves
+by taking the receptor's chains plus ligand model ``k`` as one more chain.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import functools, os, re
+import numpy as np
+from .packed import open_packed, packed_ref, parse_packed_ref, write_packed
+from .structure import AD_ELEMENTS, ATOM_DTYPE, pdbparser_keep, read_first_model, read_models
+
+REF_SEP = "::"
+_REF = re.compile(r"^(?P<receptor>.+?)::(?P<ligands>.+)#(?P<model>\d+)$")
+_SDF_SUFFIXES = (".sdf", ".sd", ".mol")
+
+def pose_ref(receptor: str, ligands: str, model: int) -> str:
+    return f"{receptor}{REF_SEP}{ligands}#{int(model)}"
+
+def parse_pose_ref(pose: str) -> Optional[Tuple[str, str, int]]:
+    """``(receptor, ligands, model)`` for an ensemble pose reference, None for a plain file path."""
+    m = _REF.match(pose) if REF_SEP in pose else None
+    if m is None or os.path.exists(pose):
+        return None
+    return m["receptor"], m["ligands"], int(m["model"])
+
+def pose_files(pose: str) -> List[str]:
+    """Files a pose is read from (a complex, receptor + ligands, or a pack)."""
+    ref = parse_pose_ref(pose)
+    if ref is not None:
+        return [ref[0], ref[1]]
+    packed = parse_packed_ref(pose)
+    return [pose] if packed is None else [packed[0]]
+
+def _is_sdf(path: str) -> bool:
+    return path.lower().endswith(_SDF_SUFFIXES)
+
+def _sdf_records(path: str) -> List[List[str]]:
+    records, lines = [], []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("$$$$"):
+                records.append(lines)
+                lines = []
+            else:
+                lines.append(line.rstrip("\r\n"))
+    if any(line.strip() for line in lines):
+        records.append(lines)
+    return records
+
+def _sdf_atoms(lines: List[str]) -> np.ndarray:
+    if len(lines) < 4 or "V3000" in lines[3]:
+        raise ValueError("only V2000 SDF records are supported")
+    n = int(lines[3][:3])
+    atoms = np.zeros(n, dtype=ATOM_DTYPE)
+    for i, line in enumerate(lines[4:4 + n]):
+        x, y, z = float(line[:10]), float(line[10:20]), float(line[20:30])
+        symbol = line[31:34].strip()
+        atoms[i] = ((x, y, z), symbol.upper(), symbol, "UNL", 1, " ", "L", True)
+    return atoms
+
+def _sdf_bonds(lines: List[str]) -> np.ndarray:
+    n, b = int(lines[3][:3]), int(lines[3][3:6])
+    return np.array([(int(line[:3]) - 1, int(line[3:6]) - 1) for line in lines[4 + n:4 + n + b]], dtype=np.intp).reshape(-1, 2)
+
+def read_sdf_bonds(path: str) -> List[np.ndarray]:
+    """(B, 2) 0-based atom index pairs of every record's bond block, cached while the file is unchanged."""
+    st = os.stat(path)
+    return _sdf_bond_blocks(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+@functools.lru_cache(maxsize=8)
+def _sdf_bond_blocks(path: str, size: int, mtime_ns: int) -> List[np.ndarray]:
+    return [_sdf_bonds(r) for r in _sdf_records(path)]
+
+def read_ligand_models(path: str, keep_duplicates: bool = True) -> List[np.ndarray]:
+    """Atoms (``ATOM_DTYPE``) of every model of a ligand file, cached while the file is unchanged.
+
+    Every atom is kept, although docking output often names every carbon
+    "C", and PDBQT atom types give the elements; ``keep_duplicates=False``
+    gives PDBParser's atoms instead, which interface features are defined
+    on. SDF records never drop atoms.
+    """
+    st = os.stat(path)
+    return _ligand_models(os.path.abspath(path), st.st_size, st.st_mtime_ns, bool(keep_duplicates) or _is_sdf(path))
+
+@functools.lru_cache(maxsize=8)
+def _ligand_models(path: str, size: int, mtime_ns: int, keep_duplicates: bool) -> List[np.ndarray]:
+    if _is_sdf(path):
+        return [_sdf_atoms(r) for r in _sdf_records(path)]
+    return read_models(path, keep_duplicates, keep_duplicates and path.lower().endswith(".pdbqt"))
+
+def count_models(path: str) -> int:
+    """Number of models (or SDF records) without parsing coordinates."""
+    if _is_sdf(path):
+        return len(_sdf_records(path))
+    with open(path) as f:
+        n, atoms = 0, False
+        for line in f:
+            if line.startswith("MODEL "):
+                n += 1
+            elif line.startswith(("ATOM  ", "HETATM")):
+                atoms = True
+    return n if n else int(atoms)
+
+def _pdbqt_to_pdb(line: str) -> str:
+    # AutoDock atom type (columns 78-79) -> PDB element (columns 77-78)
+    ad = line[77:79].strip()
+    element = AD_ELEMENTS.get(ad.upper(), ad[:2])
+    return f"{line[:66].rstrip(chr(10)):<66}          {element:>2}\n"
+
+def model_block(ligands: str, model: int) -> str:
+    """Text of one model: an SDF record, or that model's ATOM/HETATM lines (PDBQT types as elements)."""
+    if _is_sdf(ligands):
+        return "\n".join(_sdf_records(ligands)[model - 1]) + "\n$$$$\n"
+    pdbqt = ligands.lower().endswith(".pdbqt")
+    out, k = [], 0
+    with open(ligands) as f:
+        for line in f:
+            if line.startswith("MODEL "):
+                k += 1
+            elif max(k, 1) == model and line.startswith(("ATOM  ", "HETATM")):
+                out.append(_pdbqt_to_pdb(line) if pdbqt else line)
+    return "".join(out)
+
+def expand_ensemble(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Give a ``receptor`` + ``ligands`` item, or an ``ensemble`` pack item, one pose reference per model.
+
+    ``ligands`` may be one file or a list; ``label.native_model`` (1-based,
+    into the first ligands file or the pack) becomes the matching
+    ``native_pose``. Items that already list ``poses`` are returned unchanged.
+    """
+    if item.get("poses"):
+        return item
+    if "ensemble" in item:
+        pack = item["ensemble"]
+        # a missing file still yields a pose, so the run reports it as missing_file
+        n = len(open_packed(pack)) if os.path.exists(pack) else 1
+        poses = [packed_ref(pack, k) for k in range(1, n + 1)]
+        native = lambda k: packed_ref(pack, k)
+    elif "receptor" in item and "ligands" in item:
+        receptor, files = item["receptor"], item["ligands"]
+        files = [files] if isinstance(files, str) else list(files)
+        poses = []
+        for lig in files:
+            n = count_models(lig) if os.path.exists(lig) else 1
+            poses.extend(pose_ref(receptor, lig, k) for k in range(1, n + 1))
+        native = (lambda k: pose_ref(receptor, files[0], k)) if files else None
+    else:
+        return item
+    out = dict(item, poses=poses)
+    label = item.get("label") or {}
+    if "native_model" in label and "native_pose" not in label and native is not None:
+        out["label"] = dict(label, native_pose=native(label["native_model"]))
+    return out
+
+def pack_files(receptor: str, ligands: Sequence[str], out: str) -> int:
+    """Write a pack (see ``data.packed``) from a receptor and ligand files; returns the pose count.
+
+    Every model of every ligand file becomes one pose, in order, with all of
+    its atoms.
+    """
+    rec = read_first_model(receptor)
+    if rec is None:
+        raise ValueError(f"{receptor}: no model")
+    models, names, keep = [], [], []
+    for lig in ligands:
+        for k, atoms in enumerate(read_ligand_models(lig), 1):
+            models.append(atoms)
+            names.append(pose_ref(receptor, lig, k))
+            keep.append(np.ones(len(atoms), dtype=bool) if _is_sdf(lig) else pdbparser_keep(atoms))
+    write_packed(out, rec, models, names, source=receptor, keep=keep)
+    return len(models)
@@ -1,19 +1,170 @@
 from __future__ import annotations
-from typing import Iterator, Dict, Any
-import pathlib, json, yaml
+from typing import IO, Iterable, Iterator, Dict, Any, List, Set, Tuple, TypeVar
+import gzip, io, itertools, os, pathlib, json
+
+T = TypeVar("T")
+
+def _is_zstd(path) -> bool:
+    return str(path).lower().endswith((".zst", ".zstd"))
+
+def is_compressed(path) -> bool:
+    """Whether ``open_text`` (de)compresses ``path`` (``.gz``, ``.zst``)."""
+    return str(path).lower().endswith(".gz") or _is_zstd(path)
+
+def open_text(path, mode: str = "r") -> IO[str]:
+    """Open a text file, transparently (de)compressing ``.gz`` and ``.zst`` paths."""
+    mode = mode.replace("t", "")
+    if str(path).lower().endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if _is_zstd(path):
+        try:
+            import zstandard
+        except Exception:
+            raise RuntimeError("zstandard not available; install zstandard to read/write .zst files") from None
+        return io.TextIOWrapper(zstandard.open(path, mode + "b"), encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def iter_jsonl(path) -> Iterator[Dict[str, Any]]:
+    """Stream records from a (possibly compressed) JSONL file; blank lines are skipped."""
+    with open_text(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """'i/n' -> (i, n) with 0 <= i < n."""
+    try:
+        i, n = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/n, got {spec!r}") from None
+    if n < 1 or not 0 <= i < n:
+        raise ValueError(f"Shard index out of range: {spec!r}")
+    return i, n
+
+def shard(items: Iterable[T], index: int, count: int) -> Iterator[T]:
+    """Every ``count``-th item starting at ``index`` (round robin by position)."""
+    return itertools.islice(items, index, None, count)
 
 def load_dataset(spec) -> Iterator[Dict[str, Any]]:
+    """Dataset items; receptor + multi-model ligand items get one pose reference per model."""
+    from .ensembles import expand_ensemble  # numpy-backed; kept off the import path of light CLIs
+    return map(expand_ensemble, _dataset_rows(spec))
+
+def _dataset_rows(spec) -> Iterator[Dict[str, Any]]:
     if isinstance(spec, str) and pathlib.Path(spec).exists():
         path = pathlib.Path(spec)
         if path.suffix.lower() in [".yaml",".yml"]:
+            import yaml
             cfg = yaml.safe_load(path.read_text())
             for row in cfg.get("items", []):
                 yield row
         else:
-            for line in open(spec):
-                yield json.loads(line)
+            yield from iter_jsonl(path)
     elif isinstance(spec, dict):
         for row in spec.get("items", []):
             yield row
     else:
         raise ValueError("Unsupported dataset spec")
+
+def _truncate_partial_line(f, block: int = 1 << 16) -> None:
+    """Cut a binary file back to its last newline, scanning backwards from the end."""
+    size = pos = f.seek(0, os.SEEK_END)
+    end = 0
+    while pos > 0:
+        step = min(block, pos)
+        pos -= step
+        f.seek(pos)
+        nl = f.read(step).rfind(b"\n")
+        if nl >= 0:
+            end = pos + nl + 1
+            break
+    if end < size:
+        f.truncate(end)
+
+def completed_ids(path, key: str = "id") -> Set[Any]:
+    """Ids already written to a plain JSONL output, for resuming a run.
+
+    A trailing partial line (from a crash mid-write) is truncated away first,
+    so appending afterwards always starts on a clean line. The file is
+    streamed and, for records that lead with ``key`` (as ``cei`` writes
+    them), only the id is decoded.
+    """
+    path = pathlib.Path(path)
+    if not path.exists():
+        return set()
+    if is_compressed(path):
+        raise ValueError(f"{path}: resuming needs an uncompressed JSONL output")
+    with open(path, "rb+") as f:
+        _truncate_partial_line(f)
+    prefix = ("{" + json.dumps(key) + ": ").encode()
+    decode = json.JSONDecoder().raw_decode
+    ids = set()
+    with open(path, "rb") as f:
+        for line in f:
+            if line.startswith(prefix):
+                ids.add(decode(line[len(prefix):].decode("utf-8"))[0])
+            elif line.strip():
+                ids.add(json.loads(line)[key])
+    return ids
+
+class JsonlWriter:
+    """Buffered JSONL writer: records are serialized as they arrive and written every ``flush_every`` lines.
+
+    Each flush is a single write followed by fsync (with ``durable``), so a
+    crash can only leave a partial last line, which ``completed_ids`` drops.
+    """
+    def __init__(self, path, flush_every: int = 256, mode: str = "w", durable: bool = False):
+        self.path = pathlib.Path(path)
+        self.flush_every = max(1, int(flush_every))
+        self.durable = durable
+        self.lines_written = 0
+        self._buf: List[str] = []
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open_text(self.path, mode)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._buf.append(json.dumps(record) + "\n")
+        if len(self._buf) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buf:
+            self._fh.write("".join(self._buf))
+            self.lines_written += len(self._buf)
+            self._buf = []
+        self._fh.flush()
+        if self.durable:
+            os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        self.flush()
+        self._fh.close()
+
+    def __enter__(self) -> "JsonlWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def _checked_sorted(records: Iterable[Dict[str, Any]], key: str, side: str) -> Iterator[Dict[str, Any]]:
+    last = None
+    for rec in records:
+        k = rec[key]
+        if last is not None and k < last:
+            raise ValueError(f"{side} stream not sorted by {key!r}: {k!r} after {last!r}")
+        last = k
+        yield rec
+
+def merge_by_id(left: Iterable[Dict[str, Any]], right: Iterable[Dict[str, Any]], key: str = "id") -> Iterator[Tuple[Dict[str, Any], Any]]:
+    """Streaming join of two id-sorted record streams.
+
+    Yields ``(left_record, matching right record or None)`` for every left
+    record while holding a single right record in memory. Raises
+    ``ValueError`` if either stream is not sorted by ``key``.
+    """
+    right = _checked_sorted(right, key, "right")
+    cur = next(right, None)
+    for rec in _checked_sorted(left, key, "left"):
+        while cur is not None and cur[key] < rec[key]:
+            cur = next(right, None)
+        yield rec, (cur if cur is not None and cur[key] == rec[key] else None)
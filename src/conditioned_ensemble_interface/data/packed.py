@@ -0,0 +1,152 @@
+"""Packed pose ensembles: one uncompressed ``.npz`` per target, read through memory maps.
+
+The receptor is stored once and every pose's ligand atoms sit in one
+contiguous float32 coordinate block indexed by ``pose_offsets``; atom
+metadata are fixed-width columns named after ``ATOM_DTYPE`` fields
+(``receptor_<field>``, ``ligand_<field>``). Ligands keep every atom;
+``ligand_keep`` marks the ones PDBParser would keep (see
+``structure.pdbparser_keep``), which interface features are computed on.
+The archive is a plain ``.npz``
+(``np.load`` reads it) whose members are stored uncompressed, so
+``PackedEnsemble`` maps them straight from the file instead of reading them.
+Pose ``k`` (1-based) is referenced as ``"<pack>.npz#<k>"``.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+import functools, os, re, zipfile
+import numpy as np
+from .structure import ATOM_DTYPE, chain_slices
+
+PACK_FORMAT = 2
+_REF = re.compile(r"^(?P<pack>.+\.npz)#(?P<model>\d+)$", re.IGNORECASE)
+_LOCAL_HEADER = 30
+
+def packed_ref(pack: str, model: int) -> str:
+    return f"{pack}#{int(model)}"
+
+def parse_packed_ref(pose: str) -> Optional[Tuple[str, int]]:
+    """``(pack, model)`` for a packed pose reference, None otherwise."""
+    m = _REF.match(pose) if "#" in pose else None
+    if m is None or os.path.exists(pose):
+        return None
+    return m["pack"], int(m["model"])
+
+def _columns(atoms: np.ndarray, prefix: str) -> Dict[str, np.ndarray]:
+    cols = {f"{prefix}_{f}": np.ascontiguousarray(atoms[f]) for f in ATOM_DTYPE.names}
+    cols[f"{prefix}_xyz"] = cols[f"{prefix}_xyz"].astype(np.float32)
+    cols[f"{prefix}_resseq"] = cols[f"{prefix}_resseq"].astype(np.int32)
+    return cols
+
+def write_packed(path: str, receptor: np.ndarray, ligands: Sequence[np.ndarray],
+                 names: Optional[Sequence[str]] = None, source: str = "",
+                 keep: Optional[Sequence[np.ndarray]] = None) -> None:
+    """Pack receptor atoms and per-pose ligand atoms (``ATOM_DTYPE`` arrays) into ``path``.
+
+    Coordinates are kept as float32, which is exact for PDB/PDBQT input.
+    ``keep`` gives each ligand's ``ligand_keep`` mask (default: every atom).
+    """
+    ligands = list(ligands)
+    lig = np.concatenate(ligands) if ligands else np.zeros(0, dtype=ATOM_DTYPE)
+    keep = [np.ones(len(a), dtype=bool) for a in ligands] if keep is None else list(keep)
+    chains = chain_slices(receptor)
+    arrays = {
+        "format": np.array([PACK_FORMAT], dtype=np.int64),
+        "source": np.array([source]),
+        "receptor_chain_offsets": np.array([0] + [s.stop for _, s in chains], dtype=np.int64),
+        "pose_offsets": np.concatenate([[0], np.cumsum([len(a) for a in ligands])]).astype(np.int64),
+        "pose_names": np.array(list(names) if names is not None else [str(k) for k in range(1, len(ligands) + 1)], dtype=str),
+        "ligand_keep": np.concatenate(keep).astype(bool) if keep else np.zeros(0, dtype=bool),
+        **_columns(receptor, "receptor"), **_columns(lig, "ligand"),
+    }
+    tmp = f"{path}.tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+def _mmap_npz(path: str) -> Dict[str, np.ndarray]:
+    """Read-only memory maps of every member of an uncompressed ``.npz``."""
+    out = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {info.filename} is compressed; packs must be written uncompressed")
+            f.seek(info.header_offset)
+            local = f.read(_LOCAL_HEADER)
+            name_len, extra_len = int.from_bytes(local[26:28], "little"), int.from_bytes(local[28:30], "little")
+            f.seek(info.header_offset + _LOCAL_HEADER + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version not in ((1, 0), (2, 0)):
+                raise ValueError(f"{path}: unsupported .npy version {version} in {info.filename}")
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran, dtype = read_header(f)
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if dtype.hasobject:
+                raise ValueError(f"{path}: member {name} holds Python objects")
+            if not int(np.prod(shape)):
+                out[name] = np.zeros(shape, dtype=dtype)
+                continue
+            mm = np.memmap(f, dtype=dtype, mode="r", offset=f.tell(), shape=shape, order="F" if fortran else "C")
+            # plain ndarray views of the map slice much faster than np.memmap objects
+            out[name] = mm.view(np.ndarray)
+    return out
+
+class PackedEnsemble:
+    """Memory-mapped view of a pack; atom accessors return column views, not copies."""
+    def __init__(self, path: str):
+        self.path = str(path)
+        st = os.stat(self.path)
+        # identifies this version of the file, e.g. for caching per-chain tables
+        self.key = f"{os.path.abspath(self.path)}\0{st.st_size}\0{st.st_mtime_ns}"
+        self.arrays = _mmap_npz(self.path)
+        fmt = int(self.arrays["format"][0]) if "format" in self.arrays else None
+        if fmt != PACK_FORMAT:
+            raise ValueError(f"{path}: unsupported pack format {fmt!r}")
+        self.pose_offsets = self.arrays["pose_offsets"]
+        self.chain_offsets = self.arrays["receptor_chain_offsets"]
+
+    def __len__(self) -> int:
+        return len(self.pose_offsets) - 1
+
+    @property
+    def names(self) -> List[str]:
+        return [str(n) for n in self.arrays["pose_names"]]
+
+    def _cols(self, prefix: str, lo: int, hi: int) -> Dict[str, np.ndarray]:
+        return {f: self.arrays[f"{prefix}_{f}"][lo:hi] for f in ATOM_DTYPE.names}
+
+    def receptor_chains(self) -> List[Dict[str, np.ndarray]]:
+        o = self.chain_offsets
+        return [self._cols("receptor", int(o[i]), int(o[i + 1])) for i in range(len(o) - 1)]
+
+    def ligand(self, model: int, keep_duplicates: bool = True) -> Dict[str, np.ndarray]:
+        """Columns of pose ``model`` (1-based); ``keep_duplicates=False`` gives PDBParser's atoms (copies)."""
+        if not 1 <= model <= len(self):
+            raise IndexError(f"{self.path}: pose {model} out of range 1..{len(self)}")
+        lo, hi = int(self.pose_offsets[model - 1]), int(self.pose_offsets[model])
+        cols = self._cols("ligand", lo, hi)
+        if keep_duplicates:
+            return cols
+        keep = self.arrays["ligand_keep"][lo:hi]
+        return {f: c[keep] for f, c in cols.items()}
+
+    def ligand_xyz(self) -> np.ndarray:
+        """(n_ligand_atoms, 3) float32 coordinates of all poses, split by ``pose_offsets``."""
+        return self.arrays["ligand_xyz"]
+
+    def pdb_block(self, model: int) -> str:
+        """HETATM lines of one pose's ligand, for tools that want PDB text (e.g. RDKit)."""
+        c = self.ligand(model)
+        lines = []
+        for i in range(len(c["xyz"])):
+            x, y, z = (float(v) for v in c["xyz"][i])
+            lines.append(f"HETATM{i + 1:5d} {c['name'][i]:<4} {c['resname'][i]:>3} {c['chain'][i]:1}{int(c['resseq'][i]):4d}"
+                         f"{c['icode'][i]:1}   {x:8.3f}{y:8.3f}{z:8.3f}  1.00  0.00          {c['element'][i]:>2}\n")
+        return "".join(lines)
+
+def open_packed(path: str) -> PackedEnsemble:
+    """Pack at ``path``, mapped once per process while the file is unchanged."""
+    st = os.stat(path)
+    return _open_packed(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+@functools.lru_cache(maxsize=8)
+def _open_packed(path: str, size: int, mtime_ns: int) -> PackedEnsemble:
+    return PackedEnsemble(path)
@@ -0,0 +1,343 @@
+"""Column-oriented PDB/PDBQT coordinate reader.
+
+Parses the ATOM/HETATM records of a structure's first model straight into a
+NumPy structured array (``ATOM_DTYPE``), reproducing what Bio.PDB's
+PDBParser would report for the same file: model boundaries, hetero flags,
+element assignment and float32 coordinates. Files using features the fast
+path does not model (alternate locations, repeated residues or atom names,
+discontinuous chains, ANISOU/SIG* records, malformed columns) are handed to
+PDBParser instead, so callers always see the same atoms either way.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+ATOM_DTYPE = np.dtype([
+    ("xyz", np.float64, (3,)),
+    ("element", "U2"),
+    ("name", "U4"),
+    ("resname", "U3"),
+    ("resseq", np.int64),
+    ("icode", "U1"),
+    ("chain", "U1"),
+    ("hetero", np.bool_),
+])
+
+# element symbols PDBParser accepts (Bio.Data.IUPACData.atom_weights)
+_ELEMENTS = frozenset("""
+Ac Ag Al Am Ar As At Au B Ba Be Bh Bi Bk Br C Ca Cd Ce Cf Cl Cm Co Cr Cs Cu D Db Dy Er Es Eu F Fe
+Fm Fr Ga Gd Ge H He Hf Hg Ho Hs I In Ir K Kr La Li Lr Lu Md Mg Mn Mo Mt N Na Nb Nd Ne Ni No Np O Os
+P Pa Pb Pd Pm Po Pr Pt Pu Ra Rb Re Rf Rh Rn Ru S Sb Sc Se Sg Si Sm Sn Sr Ta Tb Tc Te Th Ti Tl Tm U
+V W Xe Y Yb Zn Zr
+""".split())
+
+# AutoDock atom types (PDBQT columns 78-79) that are not element symbols
+AD_ELEMENTS = {"A": "C", "NA": "N", "NS": "N", "OA": "O", "OS": "O", "SA": "S", "HD": "H", "HS": "H"}
+
+_WIDTH = 80
+_SPACE = 32
+# byte classes for the numeric columns
+_BLANK, _MINUS, _DIGIT, _POINT, _OTHER = range(5)
+_BYTE_CLASS = np.full(256, _OTHER, dtype=np.int64)
+_BYTE_CLASS[ord(" ")] = _BLANK
+_BYTE_CLASS[ord("-")] = _MINUS
+_BYTE_CLASS[ord("0"):ord("9") + 1] = _DIGIT
+_BYTE_CLASS[ord(".")] = _POINT
+_DIGIT_VALUE = np.zeros(256, dtype=np.float64)
+_DIGIT_VALUE[ord("0"):ord("9") + 1] = np.arange(10)
+_BASE5 = 5 ** np.arange(3, -1, -1)
+# digit weights for an 8-column "%8.3f" field, giving the value in thousandths
+_COORD_WEIGHTS = np.array([10**6, 10**5, 10**4, 10**3, 0, 100, 10, 1], dtype=np.float64)
+_INT_WEIGHTS = np.array([1000, 100, 10, 1], dtype=np.float64)
+_CHARS = np.array([chr(i) for i in range(256)], dtype="U1")
+_WATER = [int.from_bytes(b"HOH", "big"), int.from_bytes(b"WAT", "big")]
+
+def _integer_patterns() -> Tuple[np.ndarray, np.ndarray]:
+    # which 4-column class patterns read as blanks, an optional minus, then digits
+    ok = np.zeros(5 ** 4, dtype=bool)
+    negative = np.zeros(5 ** 4, dtype=bool)
+    for code in range(5 ** 4):
+        text = "".join(" -0.x"[(code // 5 ** (3 - j)) % 5] for j in range(4)).lstrip(" ")
+        ok[code] = text.lstrip("-").isdigit() and not text.startswith("--")
+        negative[code] = text.startswith("-")
+    return ok, negative
+
+_INT_OK, _INT_NEG = _integer_patterns()
+_FRACTION = int(np.array([_POINT, _DIGIT, _DIGIT, _DIGIT]) @ _BASE5)
+
+class UnsupportedRecords(ValueError):
+    """The fast path cannot reproduce PDBParser for this input; use ``read_first_model``."""
+
+def _atom_name(fullname: str) -> str:
+    parts = fullname.split()
+    return parts[0] if len(parts) == 1 else fullname
+
+def _assign_element(element: str, fullname: str) -> str:
+    # same rules as Bio.PDB.Atom._assign_element
+    if element and element.capitalize() in _ELEMENTS:
+        return element
+    name = _atom_name(fullname)
+    if fullname[0].isalpha() and not fullname[2:].isdigit():
+        putative = name.strip()
+    elif name[0].isdigit():
+        putative = name[1]
+    else:
+        putative = name[0]
+    return putative if putative.capitalize() in _ELEMENTS else "X"
+
+def read_rows(path: str) -> np.ndarray:
+    """File lines as an (n, 80) uint8 matrix, NUL-padded and cut at column 80."""
+    with open(path) as f:
+        lines = f.readlines()
+    if not lines:
+        raise ValueError("Empty file.")
+    try:
+        raw = np.array(lines, dtype=f"S{_WIDTH}")
+    except UnicodeEncodeError:
+        raise UnsupportedRecords() from None
+    return raw.view(np.uint8).reshape(len(lines), _WIDTH)
+
+def _field(rows: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    return np.ascontiguousarray(rows[:, lo:hi]).view(f"S{hi - lo}")[:, 0]
+
+def _pack(cols: np.ndarray) -> np.ndarray:
+    # up to 8 byte columns as one integer key per row
+    return cols.astype(np.int64) @ (256 ** np.arange(cols.shape[1] - 1, -1, -1))
+
+def _unpack(code, width: int) -> str:
+    return int(code).to_bytes(width, "big").decode("latin-1")
+
+def _parse_coords(rows: np.ndarray) -> np.ndarray:
+    """(n, 3) array of ``float(field)`` for the x/y/z columns 31-54.
+
+    The usual ``%8.3f`` layout is decoded arithmetically (an exact integer
+    count of thousandths divided by 1000 is the correctly rounded value, the
+    same as ``float``); anything else goes through ``float`` row by row.
+    """
+    f = np.ascontiguousarray(rows[:, 30:54]).reshape(-1, 8)
+    cls = _BYTE_CLASS[f]
+    head = cls[:, :4] @ _BASE5
+    fixed = _INT_OK[head] & (cls[:, 4:] @ _BASE5 == _FRACTION)
+    # digit sums stay far below 2**53, so float arithmetic here is exact
+    out = (_DIGIT_VALUE[f] @ _COORD_WEIGHTS) / 1000.0
+    out[_INT_NEG[head]] *= -1.0
+    for i in np.flatnonzero(~fixed):
+        try:
+            out[i] = float(f[i].tobytes().decode())
+        except ValueError:
+            raise UnsupportedRecords() from None
+    return out.reshape(-1, 3)
+
+def _parse_resseq(f: np.ndarray) -> np.ndarray:
+    """``int(field.split()[0])`` (PDBParser's reading) for the 4-column residue number."""
+    code = _BYTE_CLASS[f] @ _BASE5
+    out = (_DIGIT_VALUE[f] @ _INT_WEIGHTS).astype(np.int64)
+    out[_INT_NEG[code]] *= -1
+    for i in np.flatnonzero(~_INT_OK[code]):
+        try:
+            out[i] = int(f[i].tobytes().decode().split()[0])
+        except (ValueError, IndexError):
+            raise UnsupportedRecords() from None
+    return out
+
+def _check_numeric(rows: np.ndarray) -> None:
+    _parse_coords(rows)
+    _parse_resseq(rows[:, 22:26])
+
+def split_first_model(rows: np.ndarray) -> Optional[List[Tuple[str, np.ndarray]]]:
+    """First model's ATOM/HETATM rows grouped by chain, in file order.
+
+    Follows PDBParser's model boundaries: a second MODEL record, or atoms
+    after ENDMDL, start a new model; CONECT or a padded ``END   `` stops
+    parsing. Returns None when the file has no model at all. Records of
+    later models are only checked for well-formed coordinates, since
+    PDBParser rejects the whole file otherwise.
+    """
+    rt = _field(rows, 0, 6)
+    atom = (rt == b"ATOM  ") | (rt == b"HETATM")
+    model = rt == b"MODEL "
+    hits = np.flatnonzero(atom | model)
+    if not hits.size:
+        return None
+    start = int(hits[0])
+    ends = np.flatnonzero((rt[start:] == b"END   ") | (rt[start:] == b"CONECT"))
+    stop = start + int(ends[0]) if ends.size else len(rows)
+    if np.isin(rt[start:stop], (b"ANISOU", b"SIGATM", b"SIGUIJ")).any():
+        raise UnsupportedRecords()
+
+    # a model opens at MODEL, or at an atom while no model is open (start of file or after ENDMDL)
+    endmdl = rt == b"ENDMDL"
+    state = np.flatnonzero((atom | model | endmdl)[start:stop]) + start
+    after_close = np.ones(len(state), dtype=bool)
+    after_close[1:] = endmdl[state[:-1]]
+    opens = state[model[state] | (atom[state] & after_close)]
+    end0 = int(opens[1]) if len(opens) > 1 else stop
+
+    rows = np.where(rows < _SPACE, _SPACE, rows).astype(np.uint8)
+    later = np.flatnonzero(atom[end0:stop]) + end0
+    if later.size:
+        _check_numeric(rows[later])
+    first = np.flatnonzero(atom[start:end0]) + start
+    if not first.size:
+        return []
+    chain = rows[first, 21]
+    bounds = [0, *(np.flatnonzero(chain[1:] != chain[:-1]) + 1).tolist(), len(first)]
+    ids = [chr(chain[lo]) for lo in bounds[:-1]]
+    if len(set(ids)) != len(ids):
+        raise UnsupportedRecords()
+    return [(ch, rows[first[lo:hi]]) for ch, lo, hi in zip(ids, bounds[:-1], bounds[1:])]
+
+def parse_records(rows: np.ndarray, keep_duplicates: bool = False, ad_types: bool = False) -> np.ndarray:
+    """Structured ``ATOM_DTYPE`` array for one chain's ATOM/HETATM rows.
+
+    With ``keep_duplicates`` every row becomes an atom, instead of only the
+    first atom of each name in a residue as PDBParser keeps. With
+    ``ad_types`` elements come from the PDBQT atom type (``AD_ELEMENTS``)
+    rather than the PDB element column PDBParser reads.
+    """
+    n = len(rows)
+    atoms = np.zeros(n, dtype=ATOM_DTYPE)
+    if not n:
+        return atoms
+    xyz = _parse_coords(rows)
+    resseq = _parse_resseq(rows[:, 22:26])
+    if (rows[:, 16] != _SPACE).any():
+        raise UnsupportedRecords()
+    # PDBParser stores coordinates as float32
+    atoms["xyz"] = xyz.astype(np.float32)
+    atoms["resseq"] = resseq
+    hetero = rows[:, 0] == ord("H")
+    atoms["hetero"] = hetero
+    atoms["chain"] = _CHARS[rows[:, 21]]
+    atoms["icode"] = _CHARS[rows[:, 26]]
+    rescodes, inverse = np.unique(_pack(rows[:, 17:20]), return_inverse=True)
+    atoms["resname"] = np.array([_unpack(r, 3).strip() for r in rescodes], dtype="U3")[inverse.ravel()]
+
+    # atom name and element depend only on columns 13-16 and 77-78
+    labels, inverse = np.unique(_pack(np.concatenate([rows[:, 12:16], rows[:, 76:78]], axis=1)), return_inverse=True)
+    inverse = inverse.ravel()
+    labels = [_unpack(code, 6) for code in labels]
+    names, name_id = np.unique(np.array([_atom_name(p[:4]) for p in labels], dtype="U4"), return_inverse=True)
+    _, fullname_id = np.unique(np.array([p[:4] for p in labels], dtype="U4"), return_inverse=True)
+    name_id, fullname_id = name_id.ravel()[inverse], fullname_id.ravel()[inverse]
+    atoms["name"] = names[name_id]
+    atoms["element"] = np.array([_assign_element(p[4:].strip().upper(), p[:4]) for p in labels], dtype="U2")[inverse]
+    if ad_types:
+        types, inverse = np.unique(_pack(rows[:, 77:79]), return_inverse=True)
+        types = [_unpack(code, 2).strip().upper() for code in types]
+        ad = np.array([AD_ELEMENTS.get(t, t) for t in types], dtype="U2")[inverse.ravel()]
+        atoms["element"] = np.where(ad != "", ad, atoms["element"])
+
+    # residues start wherever PDBParser would call init_residue; each must be new to the chain
+    key = np.concatenate([rows[:, :1], rows[:, 17:20], rows[:, 22:27]], axis=1)
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = (key[1:] != key[:-1]).any(axis=1)
+    residue = np.cumsum(starts) - 1
+    # PDBParser's residue id: hetero field (blank, "W" for water, "H_<resname>"), number, insertion code
+    rescode = _pack(rows[starts, 17:20])
+    field = np.where(hetero[starts], np.where(np.isin(rescode, _WATER), 1, 2 + rescode), 0)
+    res_id = (field * 16384 + (resseq[starts] + 1000)) * 256 + rows[starts, 26]
+    if len(np.unique(res_id)) != len(res_id):
+        raise UnsupportedRecords()
+
+    if keep_duplicates:
+        return atoms
+    # PDBParser keeps the first atom of each name in a residue and drops the
+    # rest (docking ligands often name every carbon "C")
+    atom_key = residue * len(names) + name_id
+    order = np.argsort(atom_key, kind="stable")
+    later = np.zeros(n, dtype=bool)
+    later[1:] = atom_key[order][1:] == atom_key[order][:-1]
+    if later.any():
+        # a same-named atom whose full name differs is kept under its full name; not modelled here
+        first = order[np.maximum.accumulate(np.where(later, 0, np.arange(n)))]
+        if (fullname_id[order][later] != fullname_id[first][later]).any():
+            raise UnsupportedRecords()
+        keep = np.ones(n, dtype=bool)
+        keep[order[later]] = False
+        atoms = atoms[keep]
+    return atoms
+
+def pdbparser_keep(atoms: np.ndarray) -> np.ndarray:
+    """Mask of the atoms PDBParser keeps from a ``keep_duplicates`` read: the first of each name per residue."""
+    keep = np.zeros(len(atoms), dtype=bool)
+    if not len(atoms):
+        return keep
+    # residues are runs of atoms sharing record type, name and number, as in parse_records
+    starts = np.zeros(len(atoms), dtype=bool)
+    starts[0] = True
+    for field in ("hetero", "resname", "resseq", "icode"):
+        starts[1:] |= atoms[field][1:] != atoms[field][:-1]
+    key = np.rec.fromarrays([np.cumsum(starts), atoms["name"]])
+    keep[np.unique(key, return_index=True)[1]] = True
+    return keep
+
+def split_models(rows: np.ndarray) -> List[np.ndarray]:
+    """ATOM/HETATM rows of every model in file order; a file without MODEL records is one model.
+
+    Meant for multi-model ligand files (docking output): chains are not
+    separated and CONECT/END records do not stop reading.
+    """
+    rt = _field(rows, 0, 6)
+    atom = np.flatnonzero((rt == b"ATOM  ") | (rt == b"HETATM"))
+    if not atom.size:
+        return []
+    model = np.cumsum(rt == b"MODEL ")[atom]
+    rows = np.where(rows < _SPACE, _SPACE, rows).astype(np.uint8)
+    return [rows[idx] for idx in np.split(atom, np.flatnonzero(np.diff(model)) + 1)]
+
+def _model_atoms(model) -> np.ndarray:
+    rows = []
+    for chain in model.get_chains():
+        for a in chain.get_atoms():
+            res = a.get_parent()
+            rows.append((a.coord, a.element, a.get_name()[:4], res.get_resname(), res.id[1], res.id[2], chain.id, res.id[0] != " "))
+    return np.array(rows, dtype=ATOM_DTYPE)
+
+def _models_with_biopython(path: str) -> List[np.ndarray]:
+    from Bio.PDB import PDBParser
+    structure = PDBParser(QUIET=True).get_structure("pose", path)
+    return [_model_atoms(m) for m in structure.get_models()]
+
+def _read_with_biopython(path: str) -> Optional[np.ndarray]:
+    from Bio.PDB import PDBParser
+    structure = PDBParser(QUIET=True).get_structure("pose", path)
+    models = list(structure.get_models())
+    if not models:
+        return None
+    return _model_atoms(models[0])
+
+def read_first_model(path: str, fallback: bool = True, keep_duplicates: bool = False, ad_types: bool = False) -> Optional[np.ndarray]:
+    """Atoms of the first model as a structured array, or None if there is no model.
+
+    Raises on files PDBParser cannot read either. With ``fallback=False``,
+    files outside the fast path raise ``ValueError`` instead of being
+    re-read with Bio.PDB. ``keep_duplicates`` and ``ad_types`` are passed to
+    ``parse_records`` (the Bio.PDB fallback always reports PDBParser's atoms).
+    """
+    try:
+        chains = split_first_model(read_rows(path))
+        if chains is None:
+            return None
+        parts = [parse_records(records, keep_duplicates, ad_types) for _, records in chains]
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=ATOM_DTYPE)
+    except UnsupportedRecords:
+        if not fallback:
+            raise ValueError(f"{path}: needs the Bio.PDB reader") from None
+    return _read_with_biopython(path)
+
+def read_models(path: str, keep_duplicates: bool = False, ad_types: bool = False) -> List[np.ndarray]:
+    """Atoms of every model (see ``split_models``), falling back to Bio.PDB like ``read_first_model``."""
+    try:
+        return [parse_records(records, keep_duplicates, ad_types) for records in split_models(read_rows(path))]
+    except UnsupportedRecords:
+        return _models_with_biopython(path)
+
+def chain_slices(atoms: np.ndarray) -> List[Tuple[str, slice]]:
+    """(chain id, row slice) per chain; chains are contiguous in reader output."""
+    if not len(atoms):
+        return []
+    chain = atoms["chain"]
+    bounds = np.flatnonzero(chain[1:] != chain[:-1]) + 1
+    edges = [0, *bounds.tolist(), len(atoms)]
+    return [(str(chain[lo]), slice(lo, hi)) for lo, hi in zip(edges[:-1], edges[1:])]
@@ -0,0 +1,108 @@
+"""Cheap-first cascade: drop hopeless poses before the full features and the model, and keep a per-item top-k.
+
+``Prefilter`` looks only at heavy ligand coordinates and a coarse distance
+grid over the receptor (a Euclidean distance transform, built once per
+receptor), so all poses of an item are screened with one array lookup:
+
+- ``no_overlap``: the ligand's bounding box misses the receptor's, grown by
+  ``contact_distance``;
+- ``no_contact``: no ligand atom within ``contact_distance`` of the receptor;
+- ``clash``: more than ``max_clashes`` ligand atoms within ``clash_distance``.
+
+Grid distances are off by at most ``spacing * sqrt(3)``; that slack is
+applied against the rejection, so a pose is only dropped when the exact
+distances would drop it too. Poses that cannot be read, or come without a
+receptor, pass through and meet the full pipeline (and its error reporting).
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import heapq, math
+import numpy as np
+from ..utils.posebusters_checks import ReceptorAtoms, load_pose_atoms
+
+class _Grid:
+    """Distance from each voxel centre to the nearest receptor atom's voxel centre."""
+    def __init__(self, xyz: np.ndarray, spacing: float, pad: float):
+        from scipy.ndimage import distance_transform_edt
+        self.spacing = spacing
+        self.lo = xyz.min(axis=0) - pad
+        self.box_lo, self.box_hi = xyz.min(axis=0), xyz.max(axis=0)
+        shape = np.floor((xyz.max(axis=0) + pad - self.lo) / spacing).astype(np.intp) + 1
+        empty = np.ones(shape, dtype=bool)
+        empty[tuple(self._voxels(xyz).T)] = False
+        self.dist = distance_transform_edt(empty, sampling=spacing).astype(np.float32)
+
+    def _voxels(self, pts: np.ndarray) -> np.ndarray:
+        return np.floor((pts - self.lo) / self.spacing + 0.5).astype(np.intp)
+
+    def lookup(self, pts: np.ndarray) -> np.ndarray:
+        """Approximate receptor distance per point; inf outside the padded grid."""
+        idx = self._voxels(pts)
+        inside = ((idx >= 0) & (idx < self.dist.shape)).all(axis=1)
+        out = np.full(len(pts), np.inf, dtype=np.float32)
+        out[inside] = self.dist[tuple(idx[inside].T)]
+        return out
+
+class Prefilter:
+    """Screens an item's poses against coarse receptor grids (LRU of ``maxsize`` receptors)."""
+    def __init__(self, contact_distance: float = 6.0, clash_distance: float = 2.0, max_clashes: int = 2,
+                 spacing: float = 0.5, maxsize: int = 8, ligand_chain: Optional[str] = None):
+        self.contact_distance, self.clash_distance = float(contact_distance), float(clash_distance)
+        self.max_clashes, self.spacing, self.ligand_chain = int(max_clashes), float(spacing), ligand_chain
+        self.slack = self.spacing * math.sqrt(3.0)
+        self.receptors = ReceptorAtoms(maxsize=maxsize)
+
+    def _grid(self, key: str) -> Optional[_Grid]:
+        pad = self.contact_distance + self.slack + self.spacing
+        return self.receptors.derived(key, "grid", lambda xyz, el: _Grid(xyz, self.spacing, pad) if len(xyz) else None)
+
+    def screen(self, poses: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        """Per pose: None to keep it, else ``{"reason", "clashes", "min_distance"}`` (approximate, in Angstrom)."""
+        out: List[Optional[Dict[str, Any]]] = [None] * len(poses)
+        groups: Dict[str, List[Tuple[int, np.ndarray]]] = {}
+        for k, pose in enumerate(poses):
+            try:
+                xyz, _, rec = load_pose_atoms(pose, self.receptors, self.ligand_chain)
+            except Exception:
+                continue
+            if rec is not None and len(xyz):
+                groups.setdefault(rec, []).append((k, xyz))
+        for rec, members in groups.items():
+            grid = self._grid(rec)
+            if grid is None:
+                continue
+            for (k, xyz), verdict in zip(members, self._screen_group(grid, [xyz for _, xyz in members])):
+                out[k] = verdict
+        return out
+
+    def _screen_group(self, grid: _Grid, ligands: List[np.ndarray]) -> List[Optional[Dict[str, Any]]]:
+        sizes = np.array([len(x) for x in ligands])
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        atoms = np.concatenate(ligands)
+        d = grid.lookup(atoms)
+        min_d = np.minimum.reduceat(d, starts)
+        clashes = np.add.reduceat((d + self.slack < self.clash_distance).astype(np.intp), starts)
+        reach = self.contact_distance
+        overlap = ((np.maximum.reduceat(atoms, starts) >= grid.box_lo - reach)
+                   & (np.minimum.reduceat(atoms, starts) <= grid.box_hi + reach)).all(axis=1)
+        out: List[Optional[Dict[str, Any]]] = []
+        for k in range(len(ligands)):
+            if not overlap[k]:
+                reason = "no_overlap"
+            elif min_d[k] - self.slack > self.contact_distance:
+                reason = "no_contact"
+            elif clashes[k] > self.max_clashes:
+                reason = "clash"
+            else:
+                out.append(None)
+                continue
+            out.append({"reason": reason, "clashes": int(clashes[k]),
+                        "min_distance": float(min_d[k]) if np.isfinite(min_d[k]) else None})
+        return out
+
+def top_k(entries: List[Dict[str, Any]], k: Optional[int]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(kept, dropped): the ``k`` best-scoring entries in their original order, ties to the earlier pose."""
+    if k is None or len(entries) <= k:
+        return entries, []
+    best = set(heapq.nlargest(max(0, k), range(len(entries)), key=lambda i: entries[i]["score"]))
+    return [e for i, e in enumerate(entries) if i in best], [e for i, e in enumerate(entries) if i not in best]
@@ -0,0 +1,86 @@
+from __future__ import annotations
+from typing import Dict, Tuple
+import numpy as np
+
+CONTACT_CUTOFF = 4.0
+CLASH_CUTOFF = 2.0
+# pairs this close to a cutoff are re-measured with the scalar norm so counts match the reference loop
+_EDGE_TOL = 1e-9
+
+class ChainAtoms:
+    """Heavy-atom coordinates of one chain plus per-atom residue-class masks.
+
+    ``n_atoms`` is the chain's full atom count (hydrogens included), which
+    pose gates use; it defaults to the number of coordinates. The KD-tree over the coordinates is built on first use and kept, so a
+    chain shared by many poses only pays for indexing once. ``site_index``,
+    ``site_type`` and ``site_share`` describe the titratable atoms used by
+    ``scoring.electrostatics`` (none by default), with their own cached tree.
+    """
+    __slots__ = ("coords", "standard", "hydrophobic", "positive", "negative", "n_atoms",
+                 "site_index", "site_type", "site_share", "_tree", "_site_tree")
+
+    def __init__(self, coords, standard, hydrophobic, positive, negative, n_atoms=None,
+                 site_index=(), site_type=(), site_share=()):
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        self.standard = np.asarray(standard, dtype=bool)
+        self.hydrophobic = np.asarray(hydrophobic, dtype=bool)
+        self.positive = np.asarray(positive, dtype=bool)
+        self.negative = np.asarray(negative, dtype=bool)
+        self.n_atoms = len(self.coords) if n_atoms is None else int(n_atoms)
+        self.site_index = np.asarray(site_index, dtype=np.intp)
+        self.site_type = np.asarray(site_type, dtype=np.intp)
+        self.site_share = np.asarray(site_share, dtype=float)
+        self._tree = self._site_tree = None
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            # scipy.spatial costs ~0.3 s to import; runs served from the feature store never need it
+            from scipy.spatial import cKDTree
+            self._tree = cKDTree(self.coords)
+        return self._tree
+
+    @property
+    def site_tree(self):
+        if self._site_tree is None:
+            from scipy.spatial import cKDTree
+            self._site_tree = cKDTree(self.coords[self.site_index])
+        return self._site_tree
+
+    def centroid(self) -> np.ndarray:
+        return self.coords.mean(axis=0)
+
+def _candidate_pairs(a: ChainAtoms, b: ChainAtoms, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+    hits = a.tree.sparse_distance_matrix(b.tree, radius + 1e-6, output_type="ndarray")
+    return hits["i"].astype(np.intp), hits["j"].astype(np.intp)
+
+def pair_distances(a: ChainAtoms, b: ChainAtoms, radius: float = CONTACT_CUTOFF) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """All (i, j, d) atom pairs between two chains with d <= radius (plus a tiny margin)."""
+    if not len(a) or not len(b):
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, np.zeros(0, dtype=float)
+    ia, ib = _candidate_pairs(a, b, radius)
+    diff = a.coords[ia] - b.coords[ib]
+    d = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+    edge = np.flatnonzero((np.abs(d - CONTACT_CUTOFF) < _EDGE_TOL) | (np.abs(d - CLASH_CUTOFF) < _EDGE_TOL))
+    for k in edge:
+        d[k] = float(np.linalg.norm(a.coords[ia[k]] - b.coords[ib[k]]))
+    return ia, ib, d
+
+def chain_pair_contacts(a: ChainAtoms, b: ChainAtoms) -> Dict[str, int]:
+    """Contact, clash, hydrophobic and salt-bridge counts between two chains."""
+    ia, ib, d = pair_distances(a, b, max(CONTACT_CUTOFF, CLASH_CUTOFF))
+    contact = d <= CONTACT_CUTOFF
+    ia, ib = ia[contact], ib[contact]
+    both_std = a.standard[ia] & b.standard[ib]
+    hydrophobic = both_std & a.hydrophobic[ia] & b.hydrophobic[ib]
+    salt = both_std & ((a.positive[ia] & b.negative[ib]) | (b.positive[ib] & a.negative[ia]))
+    return {
+        "contacts": int(contact.sum()),
+        "clashes": int((d < CLASH_CUTOFF).sum()),
+        "hydrophobic": int(hydrophobic.sum()),
+        "salt_bridges": int(salt.sum()),
+    }
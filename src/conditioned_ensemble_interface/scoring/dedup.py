@@ -0,0 +1,69 @@
+"""Pose deduplication: score one representative per RMSD cluster and propagate its score.
+
+``Deduplicator.reduce`` clusters an item's poses (every heavy ligand atom,
+including repeated names PDBParser would drop; fixed-frame RMSD, greedy
+leader clustering over each stack of poses that share a receptor and an
+atom order) and returns the item restricted to the
+cluster leaders; ``expand`` turns the leaders' score entries back into one
+entry per original pose. Expanded entries carry ``cluster`` (the leader's
+pose) and ``weight`` (1 / cluster size), so weighted aggregation counts each
+cluster once however many near-identical poses it holds. Poses that cannot
+be read stay their own cluster and meet the normal error path; members of a
+leader that fails (or is pruned) are dropped with it and listed by ``expand``.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from ..utils.posebusters_checks import ReceptorAtoms, load_pose_atoms
+from ..utils.rmsd import leader_clusters
+
+class Deduplicator:
+    """Leader clustering at ``rmsd`` Angstrom; counts poses seen and representatives kept."""
+    def __init__(self, rmsd: float = 0.5, ligand_chain: Optional[str] = None, maxsize: int = 8):
+        self.rmsd, self.ligand_chain = float(rmsd), ligand_chain
+        self.receptors = ReceptorAtoms(maxsize=maxsize)
+        self.poses = 0
+        self.representatives = 0
+
+    def clusters(self, poses: Sequence[str]) -> np.ndarray:
+        """Index of each pose's cluster leader (itself for leaders and unreadable poses)."""
+        leader = np.arange(len(poses), dtype=np.intp)
+        groups: Dict[Tuple[Optional[str], bytes], List[Tuple[int, np.ndarray]]] = {}
+        for k, pose in enumerate(poses):
+            try:
+                xyz, el, rec = load_pose_atoms(pose, self.receptors, self.ligand_chain)
+            except Exception:
+                continue
+            if len(xyz):
+                groups.setdefault((rec, el.tobytes()), []).append((k, xyz))
+        for members in groups.values():
+            idx = np.array([k for k, _ in members], dtype=np.intp)
+            leader[idx] = idx[leader_clusters(np.stack([xyz for _, xyz in members]), self.rmsd)]
+        return leader
+
+    def reduce(self, item: Dict[str, Any]) -> Tuple[Dict[str, Any], Tuple[List[str], np.ndarray]]:
+        """(item with only the cluster leaders as poses, expansion state for ``expand``)."""
+        poses = list(item.get("poses", []))
+        leader = self.clusters(poses)
+        self.poses += len(poses)
+        keep = np.flatnonzero(leader == np.arange(len(poses)))
+        self.representatives += len(keep)
+        return dict(item, poses=[poses[k] for k in keep]), (poses, leader)
+
+def expand(entries: List[Dict[str, Any]], state: Tuple[List[str], np.ndarray]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(one entry per pose, in pose order, copied from its leader's entry; members whose leader has no entry).
+
+    The second list holds ``{"pose", "cluster"}`` for members of leaders that
+    failed or were pruned, so callers can report them.
+    """
+    poses, leader = state
+    by_pose = {e["pose"]: e for e in entries}
+    scored = [k for k in range(len(poses)) if poses[leader[k]] in by_pose]
+    orphans = [{"pose": poses[k], "cluster": poses[leader[k]]} for k in range(len(poses))
+               if leader[k] != k and poses[leader[k]] not in by_pose]
+    sizes = np.bincount(leader[scored], minlength=len(poses)) if scored else np.zeros(len(poses), dtype=np.intp)
+    out = []
+    for k in scored:
+        head = poses[leader[k]]
+        out.append({**by_pose[head], "pose": poses[k], "cluster": head, "weight": 1.0 / int(sizes[leader[k]])})
+    return out, orphans
@@ -1,19 +1,85 @@
 
 from __future__ import annotations
-from typing import List, Dict
-import math
+from typing import List, Optional, Sequence
+import numpy as np
+from ..utils import profiling
 
-def aggregate(scores: List[float], method: str = "best", temperature: float = 1.0) -> float:
-    if not scores:
-        return float("nan")
+METHODS = ("best", "mean", "softmax")
+
+def _padded(scores, offsets, mask):
+    if offsets is None:
+        S = np.atleast_2d(np.asarray(scores, dtype=float))
+        M = np.ones(S.shape, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        if M.shape != S.shape:
+            raise ValueError(f"mask shape {M.shape} does not match scores {S.shape}")
+        return S, M
+    flat = np.asarray(scores, dtype=float).ravel()
+    offsets = np.asarray(offsets, dtype=np.intp)
+    lengths = np.diff(offsets)
+    if offsets[0] != 0 or offsets[-1] != len(flat) or (lengths < 0).any():
+        raise ValueError("offsets must rise from 0 to len(scores)")
+    width = int(lengths.max(initial=0))
+    M = np.arange(width) < lengths[:, None]
+    S = np.zeros(M.shape)
+    S[M] = flat
+    return S, M
+
+def _row_sums(A: np.ndarray) -> np.ndarray:
+    # left to right per row, the order the scalar formula always summed in
+    total = np.zeros(len(A))
+    for j in range(A.shape[1]):
+        total += A[:, j]
+    return total
+
+def aggregate_batch(scores, offsets: Optional[Sequence[int]] = None, mask=None, method: str = "best",
+                    temperature: float = 1.0, weights=None) -> np.ndarray:
+    """Aggregate many ensembles at once; returns one float per item (NaN for empty items).
+
+    ``scores`` is either flat with CSR-style ``offsets`` (item ``i`` owns
+    ``scores[offsets[i]:offsets[i+1]]``) or a padded ``(n_items, n_poses)``
+    matrix with an optional boolean ``mask`` of valid entries. Softmax is
+    log-sum-exp stabilized, so large scores at low temperature do not overflow.
+    Optional positive ``weights``, laid out like ``scores`` (e.g. the
+    1 / cluster size of ``cei --dedup-rmsd``), weight the mean and softmax.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    with profiling.stage("aggregate"):
+        return _aggregate(scores, offsets, mask, method, temperature, weights)
+
+def _aggregate(scores, offsets, mask, method: str, temperature: float, weights=None) -> np.ndarray:
+    S, M = _padded(scores, offsets, mask)
+    V = _padded(weights, offsets, mask)[0] if weights is not None else None
+    n = M.sum(axis=1)
+    out = np.full(len(S), np.nan)
+    has = n > 0
+    if not has.any():
+        return out
+    S, M, n = S[has], M[has], n[has]
+    V = V[has] if V is not None else None
     if method == "best":
-        return float(max(scores))
-    if method == "mean":
-        return float(sum(scores) / len(scores))
-    if method == "softmax":
+        out[has] = np.where(M, S, -np.inf).max(axis=1)
+    elif method == "mean":
+        if V is None:
+            out[has] = _row_sums(np.where(M, S, 0.0)) / n
+        else:
+            out[has] = _row_sums(np.where(M, V * S, 0.0)) / _row_sums(np.where(M, V, 0.0))
+    else:
         # temperature > 0; larger -> flatter
         t = max(1e-6, float(temperature))
-        ws = [math.exp(s / t) for s in scores]
-        denom = sum(ws)
-        return float(sum(w*s for w, s in zip(ws, scores)) / (denom if denom else 1.0))
-    raise ValueError(f"Unknown method: {method}")
+        with np.errstate(over="ignore", invalid="ignore"):
+            Z = np.where(M, S / t, -np.inf)
+            top = Z.max(axis=1)
+            W = np.exp(Z - np.where(np.isfinite(top), top, 0.0)[:, None])
+            if V is not None:
+                W = np.where(M, V * W, 0.0)
+            num = _row_sums(np.where(M, W * S, 0.0))
+            den = _row_sums(W)
+            out[has] = num / np.where(den != 0, den, 1.0)
+    return out
+
+def aggregate(scores: List[float], method: str = "best", temperature: float = 1.0, weights: Optional[List[float]] = None) -> float:
+    if not scores:
+        return float("nan")
+    w = np.asarray(weights, dtype=float)[None] if weights is not None else None
+    return float(aggregate_batch(np.asarray(scores, dtype=float)[None], method=method, temperature=temperature, weights=w)[0])
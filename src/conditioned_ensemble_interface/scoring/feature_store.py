@@ -0,0 +1,176 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import hashlib, json, os, sqlite3, time
+from ..utils import profiling
+if TYPE_CHECKING:
+    from .receptor_cache import ReceptorCache
+# the store's pose and feature modules (numpy, scipy) are imported on first use,
+# so CLIs that only declare the feature-store arguments start without them
+
+DEFAULT_STORE_PATH = "runs/feature_store.sqlite"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# refresh an entry's LRU stamp at most this often so warm reads stay read-only
+_TOUCH_INTERVAL = 3600.0
+_PRUNE_EVERY = 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha1 TEXT);
+CREATE TABLE IF NOT EXISTS features (
+    sha1 TEXT, version INTEGER, feats TEXT, nbytes INTEGER, last_used REAL, pairs TEXT,
+    PRIMARY KEY (sha1, version));
+CREATE INDEX IF NOT EXISTS features_lru ON features (last_used);
+"""
+
+def file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class FeatureStore:
+    """SQLite store of interface features keyed by pose content and feature-schema version.
+
+    A (path, size, mtime) index avoids re-hashing unchanged files; renamed or
+    copied files still hit through the content hash. The database runs in WAL
+    mode so several processes can read and write it at once, and the least
+    recently used rows are evicted once it grows past ``max_bytes``.
+    """
+    def __init__(self, path: str = DEFAULT_STORE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 version: Optional[int] = None):
+        if version is None:
+            from .features import FEATURE_SCHEMA_VERSION
+            version = FEATURE_SCHEMA_VERSION
+        self.path = str(path)
+        self.max_bytes = int(max_bytes)
+        self.version = int(version)
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+        self._conn = None
+        self._pid = None
+
+    def _db(self) -> sqlite3.Connection:
+        # connections must not cross a fork, so each worker process opens its own
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            # stores made before the charge-pair column only hold stale versions; give them the column
+            if "pairs" not in {r[1] for r in conn.execute("PRAGMA table_info(features)")}:
+                conn.execute("ALTER TABLE features ADD COLUMN pairs TEXT")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+    def _content_key(self, pose_path: str) -> str:
+        from ..data.ensembles import REF_SEP, parse_pose_ref
+        from ..data.packed import parse_packed_ref
+        ref = parse_pose_ref(pose_path)
+        if ref is not None:
+            receptor, ligands, model = ref
+            return hashlib.sha1(f"{self._file_key(receptor)}{REF_SEP}{self._file_key(ligands)}#{model}".encode()).hexdigest()
+        packed = parse_packed_ref(pose_path)
+        if packed is not None:
+            return hashlib.sha1(f"{self._file_key(packed[0])}#{packed[1]}".encode()).hexdigest()
+        return self._file_key(pose_path)
+
+    def _file_key(self, pose_path: str) -> str:
+        st = os.stat(pose_path)
+        path = os.path.abspath(pose_path)
+        db = self._db()
+        row = db.execute("SELECT size, mtime_ns, sha1 FROM files WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        sha1 = file_sha1(pose_path)
+        db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (path, st.st_size, st.st_mtime_ns, sha1))
+        return sha1
+
+    def interface_features(self, pose_path: str, cache: Optional[ReceptorCache] = None) -> dict:
+        """Same result as ``compute_interface_features``, served from the store when possible."""
+        return self.pose_features(pose_path, cache)[0]
+
+    def pose_features(self, pose_path: str, cache: Optional[ReceptorCache] = None) -> Tuple[dict, Optional[Dict[str, List]]]:
+        """Same result as ``features.pose_features``; the charge pairs live in their own column."""
+        from ..data.ensembles import pose_files
+        from .features import pose_features
+        if not all(os.path.exists(p) for p in pose_files(pose_path)):
+            return pose_features(pose_path, cache=cache)
+        with profiling.stage("store_lookup"):
+            key = self._content_key(pose_path)
+            db = self._db()
+            row = db.execute("SELECT feats, pairs, last_used FROM features WHERE sha1 = ? AND version = ?", (key, self.version)).fetchone()
+        now = time.time()
+        if row is not None:
+            self.hits += 1
+            profiling.count("store_hits")
+            if now - row[2] > _TOUCH_INTERVAL:
+                db.execute("UPDATE features SET last_used = ? WHERE sha1 = ? AND version = ?", (now, key, self.version))
+            return {"pose_path": pose_path, **json.loads(row[0])}, json.loads(row[1])
+        self.misses += 1
+        profiling.count("store_misses")
+        feats, pairs = pose_features(pose_path, cache=cache)
+        with profiling.stage("store_write"):
+            blob = json.dumps({k: v for k, v in feats.items() if k != "pose_path"})
+            pairs_blob = json.dumps(pairs)
+            db.execute("INSERT OR REPLACE INTO features (sha1, version, feats, nbytes, last_used, pairs) VALUES (?, ?, ?, ?, ?, ?)",
+                       (key, self.version, blob, len(blob) + len(pairs_blob) + len(key), now, pairs_blob))
+        self._inserts += 1
+        if self._inserts % _PRUNE_EVERY == 0:
+            self.prune()
+        return feats, pairs
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """Drop rows of other schema versions, orphaned file entries, then LRU rows over the size cap."""
+        cap = self.max_bytes if max_bytes is None else int(max_bytes)
+        db = self._db()
+        removed = db.execute("DELETE FROM features WHERE version != ?", (self.version,)).rowcount
+        total = db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM features").fetchone()[0]
+        if total > cap:
+            doomed, freed = [], 0
+            for sha1, version, nbytes in db.execute("SELECT sha1, version, nbytes FROM features ORDER BY last_used"):
+                if total - freed <= cap:
+                    break
+                doomed.append((sha1, version))
+                freed += nbytes
+            db.executemany("DELETE FROM features WHERE sha1 = ? AND version = ?", doomed)
+            removed += len(doomed)
+        db.execute("DELETE FROM files WHERE sha1 NOT IN (SELECT sha1 FROM features)")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        db = self._db()
+        entries, nbytes = db.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM features").fetchone()
+        stale = db.execute("SELECT COUNT(*) FROM features WHERE version != ?", (self.version,)).fetchone()[0]
+        files = db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return {"path": self.path, "version": self.version, "entries": entries, "stale_entries": stale,
+                "files": files, "bytes": nbytes, "max_bytes": self.max_bytes,
+                "db_bytes": os.path.getsize(self.path), "hits": self.hits, "misses": self.misses}
+
+def interface_features(pose_path: str, cache: Optional[ReceptorCache] = None, store: Optional[FeatureStore] = None) -> dict:
+    """``compute_interface_features`` through ``store`` when one is given."""
+    if store is None:
+        from .features import compute_interface_features
+        return compute_interface_features(pose_path, cache=cache)
+    return store.interface_features(pose_path, cache=cache)
+
+def pose_features(pose_path: str, cache: Optional[ReceptorCache] = None,
+                  store: Optional[FeatureStore] = None) -> Tuple[dict, Optional[Dict[str, List]]]:
+    """``features.pose_features`` (feature row, charge pairs) through ``store`` when one is given."""
+    if store is None:
+        from .features import pose_features
+        return pose_features(pose_path, cache=cache)
+    return store.pose_features(pose_path, cache=cache)
+
+def add_feature_store_args(parser) -> None:
+    parser.add_argument("--feature-store", type=str, default=DEFAULT_STORE_PATH, help="SQLite feature store reused across runs")
+    parser.add_argument("--no-feature-store", action="store_true", help="Always recompute features")
+
+def feature_store_from_args(args) -> Optional[FeatureStore]:
+    return None if args.no_feature_store else FeatureStore(args.feature_store)
@@ -1,104 +1,174 @@
 from __future__ import annotations
-from typing import Dict, Tuple, List
+from typing import Any, Dict, List, Optional, Tuple
 import os
-from Bio.PDB import PDBParser
 import numpy as np
+from ..data.ensembles import parse_pose_ref, pose_files, read_ligand_models
+from ..data.packed import open_packed, parse_packed_ref
+from ..data.structure import UnsupportedRecords, chain_slices, parse_records, read_first_model, read_rows, split_first_model
+from .contacts import ChainAtoms, chain_pair_contacts
+from .electrostatics import add_screened_electrostatics, charge_sites, site_pairs
+from .receptor_cache import ReceptorCache
+from ..utils import profiling
+
+# bump whenever interface features change so on-disk feature stores stop serving stale rows
+FEATURE_SCHEMA_VERSION = 3
+
+# every numeric key a scored pose row can carry (interface, error flags, conditions, electrostatics);
+# columnar outputs get one column per key
+FEATURE_KEYS = ("contact_count_4A", "hydrophobic_contacts", "salt_bridges", "clashes", "centroid_distance",
+                "approx_buried_score", "missing_file", "parse_error", "no_models", "single_chain_or_no_atoms",
+                "no_interface_pairs", "pH", "ionic_strength", "has_cofactor", "glycosaminoglycan_sulfation_level",
+                "screened_electrostatics")
 
 POSITIVE = {"LYS","ARG","HIS"}
 NEGATIVE = {"ASP","GLU"}
 HYDROPHOBIC = {"ALA","VAL","LEU","ILE","PRO","PHE","MET","TRP","TYR"}
 
-def _load_structure(pdb_path: str):
-    parser = PDBParser(QUIET=True)
-    return parser.get_structure("pose", pdb_path)
-
-def _atom_coords(atom):
-    v = atom.get_vector()
-    return np.array([float(v[0]), float(v[1]), float(v[2])], dtype=float)
-
-def _first_model(structure):
-    models = list(structure.get_models())
-    return models[0] if models else None
-
-def _inter_chain_atom_pairs(model) -> List[Tuple]:
-    chains = list(model.get_chains())
-    if len(chains) < 2:
-        return []
-    atoms_by_chain = []
-    for ch in chains:
-        atoms_by_chain.append([a for a in ch.get_atoms() if a.element != "H"])
-    pairs = []
-    for i in range(len(atoms_by_chain)):
-        for j in range(i+1, len(atoms_by_chain)):
-            for a in atoms_by_chain[i]:
-                for b in atoms_by_chain[j]:
-                    pairs.append((a, b))
-    return pairs
-
-def compute_interface_features(pose_path: str) -> dict:
-    # Gracefully handle missing files
-    if not os.path.exists(pose_path):
-        return {"pose_path": pose_path, "missing_file": 1.0}
-
+def _chain_atoms(atoms) -> ChainAtoms:
+    """Table of one chain from a structured atom array or a mapping of its columns (packs)."""
+    heavy = atoms["element"] != "H"
+    resnames = atoms["resname"][heavy]
+    standard = ~atoms["hetero"][heavy]
+    site_index, site_type, site_share = charge_sites(resnames, atoms["name"][heavy], standard)
+    return ChainAtoms(
+        coords=atoms["xyz"][heavy],
+        standard=standard,
+        hydrophobic=np.isin(resnames, sorted(HYDROPHOBIC)),
+        positive=np.isin(resnames, sorted(POSITIVE)),
+        negative=np.isin(resnames, sorted(NEGATIVE)),
+        n_atoms=len(atoms["element"]),
+        site_index=site_index,
+        site_type=site_type,
+        site_share=site_share,
+    )
+
+def _chain_tables(pose_path: str, cache: Optional[ReceptorCache] = None) -> Optional[List[ChainAtoms]]:
+    """Per-chain heavy-atom tables of the first model, or None if the file has no model."""
     try:
-        structure = _load_structure(pose_path)
-    except Exception:
-        return {"pose_path": pose_path, "parse_error": 1.0}
-
-    model = _first_model(structure)
-    if model is None:
-        return {"pose_path": pose_path, "no_models": 1.0}
-
-    chains = list(model.get_chains())
-    if len(chains) < 2:
-        return {"pose_path": pose_path, "single_chain_or_no_atoms": 1.0}
-
-    # Compute simple interface features
-    pairs = _inter_chain_atom_pairs(model)
-    if not pairs:
-        return {"pose_path": pose_path, "no_interface_pairs": 1.0}
-
+        chains = split_first_model(read_rows(pose_path))
+        if chains is None:
+            return None
+        if cache is None:
+            return [_chain_atoms(parse_records(records)) for _, records in chains]
+        return [cache.get_or_build(records, lambda r=records: _chain_atoms(parse_records(r))) for _, records in chains]
+    except UnsupportedRecords:
+        atoms = read_first_model(pose_path)
+        if atoms is None:
+            return None
+        return [_chain_atoms(atoms[s]) for _, s in chain_slices(atoms)]
+
+def _ensemble_tables(receptor: str, ligands: str, model: int, cache: Optional[ReceptorCache] = None) -> Optional[List[ChainAtoms]]:
+    """Receptor chains plus ligand model ``model`` as one extra chain, or None if either has no model."""
+    tables = _chain_tables(receptor, cache)
+    models = read_ligand_models(ligands, keep_duplicates=False)
+    if tables is None or not 1 <= model <= len(models):
+        return None
+    return tables + [_chain_atoms(models[model - 1])]
+
+def _packed_tables(pack_path: str, model: int, cache: Optional[ReceptorCache] = None) -> Optional[List[ChainAtoms]]:
+    """Receptor chains plus pose ``model`` of a pack, straight from its memory maps."""
+    pack = open_packed(pack_path)
+    if not 1 <= model <= len(pack):
+        return None
+    chains = pack.receptor_chains()
+    if cache is None:
+        tables = [_chain_atoms(c) for c in chains]
+    else:
+        # keyed on the pack file and chain index, not coordinates: other packs may share them, and no hashing per pose
+        tables = [cache.get_or_build(c["xyz"], lambda c=c: _chain_atoms(c), key=f"{pack.key}\0receptor{i}")
+                  for i, c in enumerate(chains)]
+    return tables + [_chain_atoms(pack.ligand(model, keep_duplicates=False))]
+
+def interface_features(tables: List[ChainAtoms]) -> Dict[str, float]:
+    """Interface features from per-chain heavy-atom tables (chains in file order)."""
     contact_count = 0
     hydrophobic_contacts = 0
     salt_bridges = 0
     clashes = 0
 
     # centroid per chain
-    chain_centroids = []
-    for ch in chains:
-        coords = np.array([_atom_coords(a) for a in ch.get_atoms() if a.element != "H"])
-        if len(coords):
-            chain_centroids.append(coords.mean(axis=0))
+    chain_centroids = [t.centroid() for t in tables if len(t)]
     centroid_distance = 0.0
     if len(chain_centroids) >= 2:
         centroid_distance = float(np.linalg.norm(chain_centroids[0] - chain_centroids[1]))
 
-    for a, b in pairs:
-        d = float(np.linalg.norm(_atom_coords(a) - _atom_coords(b)))
-        if d < 2.0:
-            clashes += 1
-        if d <= 4.0:
-            contact_count += 1
-            ra = a.get_parent(); rb = b.get_parent()
-            if ra.id[0] == " " and rb.id[0] == " ":
-                if ra.get_resname() in HYDROPHOBIC and rb.get_resname() in HYDROPHOBIC:
-                    hydrophobic_contacts += 1
-                if (ra.get_resname() in POSITIVE and rb.get_resname() in NEGATIVE) or \
-                   (rb.get_resname() in POSITIVE and ra.get_resname() in NEGATIVE):
-                    salt_bridges += 1
+    for i in range(len(tables)):
+        for j in range(i+1, len(tables)):
+            c = chain_pair_contacts(tables[i], tables[j])
+            contact_count += c["contacts"]
+            clashes += c["clashes"]
+            hydrophobic_contacts += c["hydrophobic"]
+            salt_bridges += c["salt_bridges"]
 
     approx_buried_score = float(contact_count - 5.0 * clashes)
 
     return {
-        "pose_path": pose_path,
         "contact_count_4A": float(contact_count),
         "hydrophobic_contacts": float(hydrophobic_contacts),
         "salt_bridges": float(salt_bridges),
         "clashes": float(clashes),
         "centroid_distance": float(centroid_distance),
-        "approx_buried_score": approx_buried_score
+        "approx_buried_score": approx_buried_score,
     }
 
+def _has_interface_pairs(tables: List[ChainAtoms]) -> bool:
+    sizes = [len(t) for t in tables]
+    return any(sizes[i] and sizes[j] for i in range(len(sizes)) for j in range(i+1, len(sizes)))
+
+def analyze_interface(pose_path: str, cache: Optional[ReceptorCache] = None) -> Tuple[Optional[List[ChainAtoms]], dict]:
+    """Per-chain tables and interface features from one parse of the pose.
+
+    Tables are None when the file is missing, unreadable or has no model;
+    the features then carry the matching error flag.
+    """
+    # Gracefully handle missing files
+    if not all(os.path.exists(p) for p in pose_files(pose_path)):
+        return None, {"pose_path": pose_path, "missing_file": 1.0}
+
+    try:
+        with profiling.stage("parse"):
+            ref, packed = parse_pose_ref(pose_path), parse_packed_ref(pose_path)
+            if ref is not None:
+                tables = _ensemble_tables(*ref, cache)
+            elif packed is not None:
+                tables = _packed_tables(*packed, cache)
+            else:
+                tables = _chain_tables(pose_path, cache)
+    except Exception:
+        return None, {"pose_path": pose_path, "parse_error": 1.0}
+
+    if tables is None:
+        return None, {"pose_path": pose_path, "no_models": 1.0}
+
+    # Compute simple interface features
+    with profiling.stage("features"):
+        return tables, _features_from_tables(pose_path, tables)
+
+def compute_interface_features(pose_path: str, cache: Optional[ReceptorCache] = None) -> dict:
+    """Interface features for the first model of a complex (or an ensemble pose reference).
+
+    With a ``cache``, chains already seen in earlier poses (typically the
+    receptor) are taken from it instead of being parsed and indexed again.
+    """
+    return analyze_interface(pose_path, cache)[1]
+
+def charge_pairs(tables: Optional[List[ChainAtoms]]) -> Optional[Dict[str, List]]:
+    """Condition-independent half of the screened electrostatics (``site_pairs``), None without tables."""
+    return site_pairs(tables) if tables is not None else None
+
+def pose_features(pose_path: str, cache: Optional[ReceptorCache] = None) -> Tuple[dict, Optional[Dict[str, List]]]:
+    """``compute_interface_features`` plus the pose's ``charge_pairs``, kept out of the feature row."""
+    tables, feats = analyze_interface(pose_path, cache)
+    return feats, charge_pairs(tables)
+
+def _features_from_tables(pose_path: str, tables: List[ChainAtoms]) -> dict:
+    if len(tables) < 2:
+        return {"pose_path": pose_path, "single_chain_or_no_atoms": 1.0}
+    if not _has_interface_pairs(tables):
+        return {"pose_path": pose_path, "no_interface_pairs": 1.0}
+
+    return {"pose_path": pose_path, **interface_features(tables)}
+
 def condition_features(conditions: dict) -> dict:
     ph = float(conditions.get("pH", 7.4))
     ionic = float(conditions.get("ionic_strength", 0.15))
@@ -109,4 +179,14 @@ def condition_features(conditions: dict) -> dict:
         "ionic_strength": ionic,
         "has_cofactor": has_cofactor,
         "glycosaminoglycan_sulfation_level": sulfation
-    }
\ No newline at end of file
+    }
+
+def with_conditions(rows: List[dict], cond: dict, pairs: Optional[List[Any]] = None) -> List[dict]:
+    """Merge ``condition_features`` output into pose feature rows and add their screened electrostatics.
+
+    ``pairs`` holds each row's ``charge_pairs`` (None, or no list at all, scores 0).
+    """
+    for row in rows:
+        row.update(cond)
+    add_screened_electrostatics(rows, pairs if pairs is not None else [None] * len(rows), cond)
+    return rows
\ No newline at end of file
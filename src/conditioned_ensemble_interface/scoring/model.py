@@ -1,15 +1,27 @@
 
 from __future__ import annotations
-from typing import Dict, Any, List
-import json, os
-from .features import compute_interface_features, condition_features
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+import hashlib, json, os
+import numpy as np
+from .features import condition_features, with_conditions
+from .feature_store import FeatureStore, pose_features
+from .cascade import Prefilter, top_k
+from .dedup import Deduplicator, expand
+from .receptor_cache import ReceptorCache, default_receptor_cache
+from ..utils import profiling
+from ..utils.posebusters_checks import gate_poses
+from ..utils.posechecks import analyze_pose
 
-try:
-    import joblib  # scikit-learn compatible
-except Exception:
-    joblib = None
+def feature_matrix(rows: Sequence[Dict[str, float]], keys: Sequence[str], dtype=np.float32) -> np.ndarray:
+    """Dense (n_rows, n_keys) matrix with columns in ``keys`` order; missing keys read as 0."""
+    X = np.empty((len(rows), len(keys)), dtype=dtype)
+    for j, k in enumerate(keys):
+        X[:, j] = [float(r.get(k, 0.0)) for r in rows]
+    return X
 
 class DummyModel:
+    feature_order = ["approx_buried_score"]
+    dtype = np.float64
     def __init__(self, **kwargs):
         self.kwargs = kwargs
     def score(self, feats: Dict[str, float]) -> float:
@@ -17,13 +29,23 @@ class DummyModel:
         s = float(feats.get("approx_buried_score", 0.0))
         # squash to 0..1
         return 1.0 / (1.0 + pow(2.71828, -0.01 * s))
+    def feature_keys(self, rows: Sequence[Dict[str, float]]) -> Optional[List[str]]:
+        return self.feature_order
+    def score_batch(self, X: np.ndarray) -> np.ndarray:
+        s = np.asarray(X, dtype=float)[:, 0]
+        return 1.0 / (1.0 + np.power(2.71828, -0.01 * s))
 
 class SklearnModel:
     def __init__(self, path: str):
-        if joblib is None:
-            raise RuntimeError("joblib not available; install scikit-learn")
+        # imported here so the dummy and .npz tree paths never load joblib/sklearn
+        try:
+            import joblib  # scikit-learn compatible
+        except Exception:
+            raise RuntimeError("joblib not available; install scikit-learn") from None
         self.model = joblib.load(path)
         self.feature_order = getattr(self.model, "feature_order_", None)
+        # tree ensembles cast inputs to float32 themselves, so a float32 matrix scores identically
+        self.dtype = np.float32 if hasattr(self.model, "estimators_") else np.float64
     def score(self, feats: Dict[str, float]) -> float:
         if self.feature_order is None:
             # heuristic: use all numeric features sorted by key
@@ -33,20 +55,293 @@ class SklearnModel:
         x = [[float(feats.get(k, 0.0)) for k in keys]]
         y = float(self.model.predict_proba(x)[0][1]) if hasattr(self.model, "predict_proba") else float(self.model.predict(x)[0])
         return y
+    def feature_keys(self, rows: Sequence[Dict[str, float]]) -> Optional[List[str]]:
+        """Column order for a batch, or None when rows disagree on their numeric keys."""
+        if self.feature_order is not None:
+            return list(self.feature_order)
+        key_sets = {tuple(sorted(k for k, v in r.items() if isinstance(v, (int, float)))) for r in rows}
+        return list(key_sets.pop()) if len(key_sets) == 1 else None
+    def score_batch(self, X: np.ndarray) -> np.ndarray:
+        if hasattr(self.model, "predict_proba"):
+            return np.asarray(self.model.predict_proba(X)[:, 1], dtype=float)
+        return np.asarray(self.model.predict(X), dtype=float)
+
+def _file_sha1(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def export_tree_ensemble(model, out_path: str, source_path: str = None) -> str:
+    """Flatten a fitted binary GradientBoostingClassifier into NumPy arrays saved as ``.npz``.
+
+    ``source_path`` (the joblib the model came from) is fingerprinted so
+    ``load_model`` only trusts the export while it matches that file.
+    """
+    if getattr(model, "n_classes_", None) != 2 or getattr(model, "estimators_", None) is None or model.estimators_.shape[1] != 1:
+        raise ValueError("only fitted binary GradientBoostingClassifier models can be exported")
+    trees = [est.tree_ for est in model.estimators_[:, 0]]
+    sizes = [t.node_count for t in trees]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    def children(t, off, attr):
+        c = getattr(t, attr).astype(np.int64)
+        return np.where(c >= 0, c + off, -1)
+    n_features = int(model.n_features_in_)
+    init = float(np.asarray(model._raw_predict_init(np.zeros((1, n_features), dtype=np.float32))).ravel()[0])
+    order = getattr(model, "feature_order_", None)
+    np.savez(
+        out_path,
+        feature=np.concatenate([t.feature for t in trees]).astype(np.int64),
+        threshold=np.concatenate([t.threshold for t in trees]).astype(np.float64),
+        left=np.concatenate([children(t, o, "children_left") for t, o in zip(trees, offsets)]),
+        right=np.concatenate([children(t, o, "children_right") for t, o in zip(trees, offsets)]),
+        value=np.concatenate([t.value[:, 0, 0] for t in trees]).astype(np.float64),
+        roots=offsets,
+        max_depth=np.int64(max(t.max_depth for t in trees)),
+        learning_rate=np.float64(model.learning_rate),
+        init=np.float64(init),
+        n_features=np.int64(n_features),
+        feature_order=np.array(order if order is not None else [], dtype=str),
+        has_feature_order=np.bool_(order is not None),
+        source_sha1=np.array(_file_sha1(source_path) if source_path else ""),
+    )
+    return out_path
+
+_TREE_BLOCK = 128
+
+class TreeEnsembleModel:
+    """NumPy evaluator for a GBT exported by ``export_tree_ensemble``.
+
+    Trees are re-laid out as complete binary trees of the ensemble's depth
+    (shallow leaves are repeated down to the last level), so all trees are
+    walked together with index arithmetic, one level per step. Leaf values are
+    accumulated in tree order exactly as sklearn does, so scores match
+    ``predict_proba`` without importing sklearn.
+    """
+    dtype = np.float32
+    def __init__(self, path: str):
+        with np.load(path) as z:
+            arrays = {k: z[k] for k in ("feature", "threshold", "left", "right", "value", "roots")}
+            self.depth = int(z["max_depth"])
+            self.learning_rate = float(z["learning_rate"])
+            self.init = float(z["init"])
+            self.n_features = int(z["n_features"])
+            self.feature_order = [str(k) for k in z["feature_order"]] if bool(z["has_feature_order"]) else None
+            self.source_sha1 = str(z["source_sha1"])
+        self._layout(**arrays)
+
+    def _layout(self, feature, threshold, left, right, value, roots) -> None:
+        n_trees, inner = len(roots), 2 ** self.depth - 1
+        self.feature = np.zeros((n_trees, inner), dtype=np.intp)
+        self.threshold = np.full((n_trees, inner), np.inf)
+        self.leaf_value = np.zeros((n_trees, inner + 1))
+        def place(t, node, pos):
+            if pos >= inner:
+                self.leaf_value[t, pos - inner] = value[node]
+            elif left[node] < 0:
+                # leaf above the last level: both subtrees repeat it
+                place(t, node, 2 * pos + 1)
+                place(t, node, 2 * pos + 2)
+            else:
+                self.feature[t, pos], self.threshold[t, pos] = feature[node], threshold[node]
+                place(t, left[node], 2 * pos + 1)
+                place(t, right[node], 2 * pos + 2)
+        for t, root in enumerate(roots):
+            place(t, int(root), 0)
+        self._node_base = np.arange(n_trees) * inner
+        self._leaf_base = np.arange(n_trees) * (inner + 1) - inner
+        self._feature_flat = self.feature.ravel()
+        self._threshold_flat = self.threshold.ravel()
+        # sklearn adds learning_rate * value per tree; precomputing the product is bit-identical
+        self._leaf_flat = (self.learning_rate * self.leaf_value).ravel()
+
+    def score(self, feats: Dict[str, float]) -> float:
+        keys = self.feature_keys([feats])
+        return float(self.score_batch(feature_matrix([feats], keys, self.dtype))[0])
+
+    feature_keys = SklearnModel.feature_keys
+
+    def score_batch(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected (n, {self.n_features}) features, got {X.shape}")
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN or infinity.")  # as GradientBoostingClassifier does
+        # row blocks keep the (rows x trees) index arrays cache-resident
+        return np.concatenate([self._score_block(X[i:i + _TREE_BLOCK]) for i in range(0, len(X), _TREE_BLOCK)] or [np.zeros(0)])
+
+    def _score_block(self, X: np.ndarray) -> np.ndarray:
+        from scipy.special import expit
+        n = len(X)
+        flat_x = X.ravel()
+        row_base = (np.arange(n) * self.n_features)[:, None]
+        pos = np.zeros((n, len(self._node_base)), dtype=np.intp)
+        for _ in range(self.depth):
+            k = self._node_base + pos
+            x = flat_x[row_base + self._feature_flat[k]]
+            pos = 2 * pos + 2 - (x <= self._threshold_flat[k])
+        # add.accumulate sums strictly left to right: init, then each tree in order, as sklearn does
+        terms = np.empty((n, pos.shape[1] + 1))
+        terms[:, 0] = self.init
+        terms[:, 1:] = self._leaf_flat[self._leaf_base + pos]
+        return expit(np.add.accumulate(terms, axis=1)[:, -1])
+
+def _tree_export_for(joblib_path: str) -> Optional[str]:
+    npz = os.path.splitext(joblib_path)[0] + ".npz"
+    if not os.path.exists(npz):
+        return None
+    with np.load(npz) as z:
+        source = str(z["source_sha1"]) if "source_sha1" in z else ""
+    return npz if source == _file_sha1(joblib_path) else None
 
 def load_model(cfg: Dict[str, Any] = None):
+    """Model from ``cfg["path"]``, or DummyModel when there is none.
+
+    A ``.joblib`` path is served by its ``.npz`` tree export when one exists
+    and was made from that exact file; ``kind: sklearn`` forces the pickle.
+    """
     cfg = cfg or {}
     model_path = cfg.get("path")
     if model_path and os.path.exists(model_path):
-        return SklearnModel(model_path)
+        if model_path.endswith(".npz"):
+            return TreeEnsembleModel(model_path)
+        npz = _tree_export_for(model_path) if cfg.get("kind") != "sklearn" else None
+        return TreeEnsembleModel(npz) if npz else SklearnModel(model_path)
     return DummyModel(**cfg)
 
-def score_ensemble(model, item: Dict[str, Any]) -> List[Dict[str, float]]:
+def score_rows(model, rows: Sequence[Dict[str, float]]) -> List[float]:
+    """Score feature dicts with one vectorized call where the model supports it."""
+    if not rows:
+        return []
+    profiling.count("poses_scored", len(rows))
+    with profiling.stage("score"):
+        keys = model.feature_keys(rows) if hasattr(model, "score_batch") else None
+        if keys is None:
+            return [float(model.score(r)) for r in rows]
+        return [float(y) for y in model.score_batch(feature_matrix(rows, keys, model.dtype))]
+
+def _error(item: Dict[str, Any], stage: str, exc: Exception, pose: str = None) -> Dict[str, Any]:
+    rec = {"id": item.get("id"), "stage": stage, "error": f"{type(exc).__name__}: {exc}"}
+    if pose is not None:
+        rec["pose"] = pose
+    return rec
+
+def _skip(item: Dict[str, Any], pose: str, reason: str, **detail: Any) -> Dict[str, Any]:
+    return {"id": item.get("id"), "pose": pose, "reason": reason, **detail}
+
+def _item_rows(item: Dict[str, Any], cache: ReceptorCache = None, store: FeatureStore = None, gates: bool = False,
+               errors: Optional[List[Dict[str, Any]]] = None, geometry: bool = False, cascade: Optional[Prefilter] = None,
+               skipped: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[str], List[Dict[str, float]], List[Optional[Dict[str, Any]]]]:
+    cache = cache if cache is not None else default_receptor_cache()
+    gates = gates or geometry
     cond = condition_features(item.get("conditions", {}))
-    out = []
-    for pose in item.get("poses", []):
-        feats = compute_interface_features(pose)
-        feats.update(cond)
-        score = model.score(feats)
-        out.append({"pose": pose, "score": float(score)})
-    return out
+    todo = list(item.get("poses", []))
+    if cascade is not None and todo:
+        with profiling.stage("cascade"):
+            verdicts = cascade.screen(todo)
+        profiling.count("poses_rejected", sum(v is not None for v in verdicts))
+        if skipped is not None:
+            skipped.extend(_skip(item, pose, **v) for pose, v in zip(todo, verdicts) if v is not None)
+        todo = [pose for pose, v in zip(todo, verdicts) if v is None]
+    poses, rows, pairs, structures = [], [], [], []
+    for pose in todo:
+        try:
+            with profiling.pose_trace(item.get("id"), pose):
+                if gates:
+                    # one parse serves both the gates and the features
+                    analysis = analyze_pose(pose, cache=cache)
+                    feats, charges, structure = analysis["features"], analysis["charge_pairs"], analysis["structure"]
+                else:
+                    (feats, charges), structure = pose_features(pose, cache=cache, store=store), None
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.append(_error(item, "pose", e, pose))
+            continue
+        poses.append(pose)
+        rows.append(feats)
+        pairs.append(charges)
+        structures.append(structure)
+    with_conditions(rows, cond, pairs)
+    if geometry and poses:
+        with profiling.stage("geometry"):
+            for structure, gate in zip(structures, gate_poses(poses, box=item.get("box"))):
+                structure["geometry"] = gate
+    return poses, rows, structures
+
+def item_features(item: Dict[str, Any], cache: ReceptorCache = None, store: FeatureStore = None) -> List[Dict[str, float]]:
+    return _item_rows(item, cache, store)[1]
+
+def _entries(poses, structures, scores, rows=None) -> List[Dict[str, Any]]:
+    entries = []
+    for k, (pose, structure, score) in enumerate(zip(poses, structures, scores)):
+        entry = {"pose": pose, "score": score}
+        if structure is not None:
+            entry["structure"] = structure
+        if rows is not None:
+            entry["features"] = {f: v for f, v in rows[k].items() if isinstance(v, (int, float))}
+        entries.append(entry)
+    return entries
+
+def _keep_top(item: Dict[str, Any], entries: List[Dict[str, Any]], topk: Optional[int],
+              skipped: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    kept, dropped = top_k(entries, topk)
+    if skipped is not None:
+        skipped.extend(_skip(item, e["pose"], "topk", score=e["score"]) for e in dropped)
+    return kept
+
+def score_items(model, items: Iterable[Dict[str, Any]], cache: ReceptorCache = None, store: FeatureStore = None,
+                gates: bool = False, errors: Optional[List[Dict[str, Any]]] = None,
+                geometry: bool = False, cascade: Optional[Prefilter] = None, topk: Optional[int] = None,
+                skipped: Optional[List[Dict[str, Any]]] = None, features: bool = False) -> List[Optional[List[Dict[str, Any]]]]:
+    """Per-item score lists for a block of items, scored as one feature matrix.
+
+    With ``gates`` each entry also carries the pose's structure summary, from
+    which ``utils.posechecks.checks_from_structure`` rebuilds the gate flags;
+    ``geometry`` (implies ``gates``) adds the item's physical validity gates
+    (``utils.posebusters_checks.gate_poses``, honouring an item ``box``).
+    Given an ``errors`` list, failures are recorded there instead of raised:
+    a failing pose is left out of its item, a failing item comes back as None.
+    A ``cascade`` prefilter (``scoring.cascade.Prefilter``) drops hopeless
+    poses before featurization and ``topk`` keeps each item's best ``topk``
+    entries; both record what they drop in ``skipped``
+    (``{"id", "pose", "reason", ...}``). With ``features`` each entry also
+    carries the numeric feature values it was scored on.
+    """
+    items = list(items)
+    per_item = []
+    for item in items:
+        try:
+            per_item.append(_item_rows(item, cache, store, gates, errors, geometry, cascade, skipped))
+        except Exception as e:
+            if errors is None:
+                raise
+            errors.append(_error(item, "item", e))
+            per_item.append(None)
+    ok = [p for p in per_item if p is not None]
+    try:
+        flat = score_rows(model, [r for _, rows, _ in ok for r in rows])
+    except Exception:
+        if errors is None:
+            raise
+        # isolate the item(s) the model chokes on
+        out = []
+        for item, p in zip(items, per_item):
+            try:
+                out.append(None if p is None else _keep_top(item, _entries(p[0], p[2], score_rows(model, p[1]), p[1] if features else None), topk, skipped))
+            except Exception as e:
+                errors.append(_error(item, "score", e))
+                out.append(None)
+        return out
+    scores = iter(flat)
+    return [None if p is None else _keep_top(item, _entries(p[0], p[2], [next(scores) for _ in p[1]], p[1] if features else None), topk, skipped)
+            for item, p in zip(items, per_item)]
+
+def score_ensemble(model, item: Dict[str, Any], cache: ReceptorCache = None, store: FeatureStore = None,
+                   cascade: Optional[Prefilter] = None, topk: Optional[int] = None,
+                   skipped: Optional[List[Dict[str, Any]]] = None, dedup: Optional[Deduplicator] = None) -> List[Dict[str, float]]:
+    if dedup is None:
+        return score_items(model, [item], cache, store, cascade=cascade, topk=topk, skipped=skipped)[0]
+    reduced, state = dedup.reduce(item)
+    entries, orphans = expand(score_items(model, [reduced], cache, store, cascade=cascade, skipped=skipped)[0], state)
+    if skipped is not None:
+        skipped.extend(_skip(item, o["pose"], "cluster", cluster=o["cluster"]) for o in orphans)
+    return _keep_top(item, entries, topk, skipped)
@@ -0,0 +1,193 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+import itertools, queue
+import multiprocessing as mp
+from .cascade import Prefilter, top_k
+from .dedup import Deduplicator, expand
+from .feature_store import FeatureStore
+from .model import load_model, score_items
+from ..utils import profiling
+
+# (item index, pose offset, chunks in item, item id, item restricted to one pose chunk)
+Part = Tuple[int, int, int, Any, Dict[str, Any]]
+
+_MODEL = None
+_STORE: Optional[FeatureStore] = None
+_GATES = False
+_GEOMETRY = False
+_FEATURES = False
+_CASCADE: Optional[Prefilter] = None
+_TOPK: Optional[int] = None
+_CATCH = False
+# pool workers send their profiler totals back with every task
+_DRAIN = False
+# tasks in flight per worker: enough to keep workers busy, while the item stream
+# (and the dedup expansions held for it) is only read this far ahead
+_AHEAD = 4
+
+def _tasks(items: Iterable[Dict[str, Any]], chunksize: int) -> Iterator[List[Part]]:
+    """Group items into tasks of about ``chunksize`` poses, splitting larger items into pose chunks."""
+    task, n = [], 0
+    for idx, item in enumerate(items):
+        poses = list(item.get("poses", []))
+        offsets = range(0, len(poses), chunksize) if poses else [0]
+        for lo in offsets:
+            part = dict(item, poses=poses[lo:lo + chunksize])
+            task.append((idx, lo, len(offsets), item.get("id"), part))
+            n += len(part["poses"])
+            if n >= chunksize:
+                yield task
+                task, n = [], 0
+    if task:
+        yield task
+
+def _init_worker(model_cfg: Dict[str, Any], store_path: Optional[str] = None, gates: bool = False,
+                 catch: bool = False, profile: Optional[Dict[str, Any]] = None, geometry: bool = False,
+                 cascade: Optional[Dict[str, Any]] = None, topk: Optional[int] = None, features: bool = False) -> None:
+    global _MODEL, _STORE, _GATES, _GEOMETRY, _FEATURES, _CASCADE, _TOPK, _CATCH, _DRAIN
+    if profile is not None:
+        profiling.enable(profiling.Profiler(**profile))
+    _DRAIN = profile is not None
+    with profiling.stage("load_model"):
+        _MODEL = load_model(model_cfg)
+    _STORE = FeatureStore(store_path) if store_path else None
+    _GATES, _GEOMETRY, _FEATURES = gates, geometry, features
+    _CASCADE = Prefilter(**cascade) if cascade is not None else None
+    _TOPK = topk
+    _CATCH = catch
+
+def _score_parts(task: List[Part], errors: Optional[List[Dict[str, Any]]], skipped: List[Dict[str, Any]]):
+    return score_items(_MODEL, [part for *_, part in task], store=_STORE, gates=_GATES, errors=errors, geometry=_GEOMETRY,
+                       cascade=_CASCADE, topk=_TOPK, skipped=skipped, features=_FEATURES)
+
+def _score_task(task: List[Part]):
+    errors = [] if _CATCH else None
+    skipped: List[Dict[str, Any]] = []
+    prof = profiling.active()
+    scored = _score_parts(task, errors, skipped) if prof is None else prof.run_sampled(_score_parts, task, errors, skipped)
+    drained = prof.drain() if _DRAIN and prof is not None else None
+    return [(idx, lo, nchunks, item_id, s) for (idx, lo, nchunks, item_id, _), s in zip(task, scored)], errors or [], drained, skipped
+
+def _windowed(pool, tasks: Iterator[List[Part]], window: int, ordered: bool) -> Iterator[Any]:
+    """``_score_task`` results with at most ``window`` tasks submitted and unconsumed, refilled as results come in."""
+    if ordered:
+        pending = deque(pool.apply_async(_score_task, (t,)) for t in itertools.islice(tasks, window))
+        while pending:
+            result = pending.popleft().get()
+            pending.extend(pool.apply_async(_score_task, (t,)) for t in itertools.islice(tasks, 1))
+            yield result
+        return
+    finished: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+    def submit(n: int) -> int:
+        batch = list(itertools.islice(tasks, n))
+        for t in batch:
+            pool.apply_async(_score_task, (t,), callback=finished.put, error_callback=finished.put)
+        return len(batch)
+    in_flight = submit(window)
+    while in_flight:
+        result = finished.get()
+        if isinstance(result, BaseException):
+            raise result
+        in_flight += submit(1) - 1
+        yield result
+
+def _reduced(items: Iterable[Dict[str, Any]], dedup: Deduplicator, expansions: Dict[int, Any]) -> Iterator[Dict[str, Any]]:
+    for idx, item in enumerate(items):
+        with profiling.stage("dedup"):
+            item, expansions[idx] = dedup.reduce(item)
+        yield item
+
+def _assemble(results, ordered: bool, on_error: Callable[[Dict[str, Any]], None] = None, topk: Optional[int] = None,
+              on_skip: Callable[[Dict[str, Any]], None] = None,
+              expansions: Optional[Dict[int, Any]] = None) -> Iterator[Tuple[Any, List[Dict[str, float]]]]:
+    partial: Dict[int, Dict[int, Optional[List[Dict[str, float]]]]] = {}
+    done: Dict[int, Optional[Tuple[Any, List[Dict[str, float]]]]] = {}
+    next_idx = 0
+    prof = profiling.active()
+    for batch, errors, drained, skipped in results:
+        if drained is not None and prof is not None:
+            prof.merge(drained)
+        for err in errors:
+            on_error(err)
+        if on_skip is not None:
+            for rec in skipped:
+                on_skip(rec)
+        for idx, lo, nchunks, item_id, scores in batch:
+            chunks = partial.setdefault(idx, {})
+            chunks[lo] = scores
+            if len(chunks) < nchunks:
+                continue
+            del partial[idx]
+            # an item with a failed chunk is dropped whole; its errors were reported above
+            failed = any(c is None for c in chunks.values())
+            merged = None if failed else (item_id, [s for k in sorted(chunks) for s in chunks[k]])
+            expanded = expansions is not None and idx in expansions
+            if expanded:
+                state = expansions.pop(idx)
+                if merged is not None:
+                    entries, orphans = expand(merged[1], state)
+                    merged = (item_id, entries)
+                    if on_skip is not None:
+                        for rec in orphans:
+                            on_skip({"id": item_id, "pose": rec["pose"], "reason": "cluster", "cluster": rec["cluster"]})
+            if merged is not None and (nchunks > 1 or expanded) and topk is not None:
+                # each chunk kept its own top-k; the item keeps the best of those
+                kept, dropped = top_k(merged[1], topk)
+                merged = (item_id, kept)
+                if on_skip is not None:
+                    for e in dropped:
+                        on_skip({"id": item_id, "pose": e["pose"], "reason": "topk", "score": e["score"]})
+            if not ordered:
+                if merged is not None:
+                    yield merged
+                continue
+            done[idx] = merged
+            while next_idx in done:
+                merged = done.pop(next_idx)
+                next_idx += 1
+                if merged is not None:
+                    yield merged
+
+def iter_scores(items: Iterable[Dict[str, Any]], model_cfg: Dict[str, Any] = None, workers: int = 1,
+                chunksize: int = 256, ordered: bool = True,
+                store_path: Optional[str] = None, gates: bool = False,
+                on_error: Callable[[Dict[str, Any]], None] = None, geometry: bool = False,
+                cascade: Optional[Dict[str, Any]] = None, topk: Optional[int] = None,
+                on_skip: Callable[[Dict[str, Any]], None] = None,
+                dedup: Optional[Deduplicator] = None, features: bool = False) -> Iterator[Tuple[Any, List[Dict[str, float]]]]:
+    """Yield ``(item id, scores)`` per item, scoring pose chunks on ``workers`` processes.
+
+    Each worker loads the model once and, given ``store_path``, reads and
+    fills that feature store; ``gates`` embeds per-pose structure summaries,
+    ``geometry`` adds the physical validity gates, computed per pose chunk,
+    and ``features`` the feature values each pose was scored on.
+    With ``ordered`` items come out in input order (identical to a serial
+    run); otherwise as soon as all their chunks finish. With ``on_error``,
+    failing poses and items are reported to it (item failures are not
+    yielded) instead of aborting the run. ``cascade`` (``Prefilter`` keyword
+    arguments) and ``topk`` prune poses per item; each dropped pose is
+    reported to ``on_skip``. With ``dedup`` each whole item is clustered here,
+    in the parent, and only cluster leaders are scored; every pose still gets
+    an entry (see ``scoring.dedup``). Items are read only as far ahead as
+    about ``_AHEAD`` tasks per worker, so memory stays bounded on long
+    streams. While a profiler is active
+    (``utils.profiling``), workers run their own and send the totals back.
+    """
+    chunksize = max(1, int(chunksize))
+    expansions: Optional[Dict[int, Any]] = None
+    if dedup is not None:
+        expansions = {}
+        items = _reduced(items, dedup, expansions)
+    tasks = _tasks(items, chunksize)
+    # with dedup, top-k waits until leaders are expanded so every dropped pose is reported
+    worker_topk = topk if dedup is None else None
+    if workers <= 1:
+        _init_worker(model_cfg or {}, store_path, gates, on_error is not None, None, geometry, cascade, worker_topk, features)
+        yield from _assemble(map(_score_task, tasks), True, on_error, topk, on_skip, expansions)
+        return
+    prof = profiling.active()
+    initargs = (model_cfg or {}, store_path, gates, on_error is not None, prof.config() if prof is not None else None, geometry,
+                cascade, worker_topk, features)
+    with mp.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        yield from _assemble(_windowed(pool, tasks, _AHEAD * workers, ordered), ordered, on_error, topk, on_skip, expansions)
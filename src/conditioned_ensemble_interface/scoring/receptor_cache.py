@@ -0,0 +1,64 @@
+from __future__ import annotations
+from typing import Callable, Dict, Optional
+from collections import OrderedDict
+import hashlib
+import numpy as np
+from .contacts import ChainAtoms
+
+def content_key(records: np.ndarray) -> str:
+    """Content hash of a chain's coordinate records (byte rows from the structure reader)."""
+    return hashlib.sha1(np.ascontiguousarray(records).tobytes()).hexdigest()
+
+class ReceptorCache:
+    """Bounded LRU of parsed chains (heavy-atom arrays, residue-class masks, KD-tree).
+
+    Poses of one ensemble usually share the receptor verbatim, so its chain
+    records hash to the same key and are parsed and indexed once. Chains with
+    fewer than ``min_records`` coordinate records (ligands) are rebuilt every
+    time instead of pushing receptors out of the cache. Callers that already
+    know a chain's identity (packs) pass ``key`` and skip the content hash.
+    """
+    def __init__(self, maxsize: int = 8, min_records: int = 100):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = int(maxsize)
+        self.min_records = int(min_records)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, ChainAtoms]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get_or_build(self, records: np.ndarray, build: Callable[[], ChainAtoms], key: Optional[str] = None) -> ChainAtoms:
+        if len(records) < self.min_records:
+            return build()
+        if key is None:
+            key = content_key(records)
+        table = self._entries.get(key)
+        if table is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return table
+        self.misses += 1
+        table = build()
+        table.tree  # index now so every later pose reuses it
+        self._entries[key] = table
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return table
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+_DEFAULT_CACHE = ReceptorCache()
+
+def default_receptor_cache() -> ReceptorCache:
+    return _DEFAULT_CACHE
@@ -0,0 +1,138 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+import csv, itertools, pathlib
+import numpy as np
+import yaml
+from .ensemble import aggregate_batch
+from .electrostatics import FEATURE as ELECTROSTATICS, screened_energies
+from .features import condition_features
+from .feature_store import FeatureStore, pose_features
+from .model import feature_matrix, score_rows
+from .receptor_cache import ReceptorCache, default_receptor_cache
+
+GRID_AXES = ("pH", "ionic_strength", "cofactor", "glycosaminoglycan_sulfation_level")
+DEFAULT_GRID = {"pH": np.linspace(6.5, 8.0, 7).tolist(), "ionic_strength": [0.05, 0.15, 0.30]}
+
+def _axis_values(spec) -> List[Any]:
+    if isinstance(spec, dict):
+        return np.linspace(float(spec["start"]), float(spec["stop"]), int(spec["num"])).tolist()
+    values = spec if isinstance(spec, (list, tuple, np.ndarray)) else [spec]
+    return [v.item() if isinstance(v, np.generic) else v for v in values]
+
+def condition_grid(axes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Cartesian product of condition axes, last axis varying fastest.
+
+    Values are lists, scalars or ``{start, stop, num}`` linspaces; axes are
+    any of ``GRID_AXES`` and unset conditions keep their defaults.
+    """
+    unknown = [a for a in axes if a not in GRID_AXES]
+    if unknown:
+        raise ValueError(f"Unknown condition axes: {unknown}; expected any of {list(GRID_AXES)}")
+    names = list(axes)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(_axis_values(axes[a]) for a in names))]
+
+def load_grid(path: Optional[str] = None) -> Dict[str, Any]:
+    """Grid axes from a YAML/JSON mapping (optionally under a ``grid:`` key), or the default pH x ionic grid."""
+    if not path:
+        return dict(DEFAULT_GRID)
+    cfg = yaml.safe_load(pathlib.Path(path).read_text())
+    return cfg.get("grid", cfg)
+
+def sweep_scores(model, pose_feats: Sequence[Dict[str, float]], grid: Sequence[Dict[str, Any]],
+                 pairs: Optional[Sequence[Any]] = None) -> np.ndarray:
+    """(n_grid, n_poses) scores of every pose under every grid condition, in one model call.
+
+    Geometry columns are laid out once and broadcast across the grid; only
+    the condition columns are filled per grid point, and the screened
+    electrostatics reweight each pose's cached site pairs (``pairs``, as
+    from ``pose_features``; None scores 0) for the whole grid at once.
+    """
+    conds = [condition_features(g) for g in grid]
+    if not pose_feats or not conds:
+        return np.zeros((len(conds), len(pose_feats)))
+    elec = screened_energies(pairs if pairs is not None else [None] * len(pose_feats),
+                             [c["pH"] for c in conds], [c["ionic_strength"] for c in conds])
+    first = [{**f, **conds[0], ELECTROSTATICS: e} for f, e in zip(pose_feats, elec[0].tolist())]
+    keys = model.feature_keys(first) if hasattr(model, "score_batch") else None
+    if keys is None:
+        flat = score_rows(model, [{**f, **c, ELECTROSTATICS: e} for c, es in zip(conds, elec.tolist())
+                                  for f, e in zip(pose_feats, es)])
+        return np.asarray(flat, dtype=float).reshape(len(conds), len(pose_feats))
+    base = feature_matrix(pose_feats, keys, model.dtype)
+    X = np.repeat(base[None], len(conds), axis=0)
+    cond_cols = [j for j, k in enumerate(keys) if k in conds[0]]
+    if cond_cols:
+        values = feature_matrix(conds, [keys[j] for j in cond_cols], model.dtype)
+        X[:, :, cond_cols] = values[:, None, :]
+    if ELECTROSTATICS in keys:
+        X[:, :, keys.index(ELECTROSTATICS)] = elec
+    y = model.score_batch(X.reshape(-1, len(keys)))
+    return np.asarray(y, dtype=float).reshape(len(conds), len(pose_feats))
+
+def sweep(model, preds: Iterable[Dict[str, Any]], axes: Dict[str, Any], method: str = "softmax",
+          temperature: float = 1.0, cache: ReceptorCache = None, store: FeatureStore = None) -> Iterator[Dict[str, Any]]:
+    """Yield one ``{"id", <axes>, "aggregate"}`` row per prediction and grid point."""
+    cache = cache if cache is not None else default_receptor_cache()
+    grid = condition_grid(axes)
+    for pred in preds:
+        poses = [s["pose"] for s in pred["scores"]]
+        pose_feats, pairs = zip(*[pose_features(p, cache=cache, store=store) for p in poses]) if poses else ((), ())
+        aggs = aggregate_batch(sweep_scores(model, pose_feats, grid, pairs), method=method, temperature=temperature)
+        for cond, agg in zip(grid, aggs.tolist()):
+            yield {"id": pred["id"], **cond, "aggregate": agg}
+
+class RowWriter:
+    """Streams dict rows to CSV, or to Parquet (needs pyarrow) when the path ends in ``.parquet``."""
+    def __init__(self, path: str, batch_rows: int = 4096):
+        self.path = pathlib.Path(path)
+        self.batch_rows = int(batch_rows)
+        self.parquet = self.path.suffix.lower() == ".parquet"
+        self.rows_written = 0
+        self._fh = self._csv = self._pq = None
+        self._pending: List[Dict[str, Any]] = []
+        if self.parquet:
+            try:
+                import pyarrow.parquet  # noqa: F401
+            except Exception:
+                raise RuntimeError("pyarrow not available; install pyarrow for Parquet output") from None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def write(self, row: Dict[str, Any]) -> None:
+        self.rows_written += 1
+        if not self.parquet:
+            if self._csv is None:
+                self._fh = open(self.path, "w", newline="")
+                self._csv = csv.DictWriter(self._fh, fieldnames=list(row), lineterminator="\n")
+                self._csv.writeheader()
+            self._csv.writerow(row)
+            return
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_rows:
+            self._flush_parquet()
+
+    def _flush_parquet(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not self._pending:
+            return
+        table = pa.Table.from_pylist(self._pending)
+        if self._pq is None:
+            self._pq = pq.ParquetWriter(str(self.path), table.schema)
+        self._pq.write_table(table)
+        self._pending = []
+
+    def close(self) -> None:
+        if self.parquet:
+            self._flush_parquet()
+            if self._pq is not None:
+                self._pq.close()
+        elif self._fh is not None:
+            self._fh.close()
+        else:
+            self.path.write_text("")
+
+    def __enter__(self) -> "RowWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import hashlib, json, multiprocessing as mp, os, pathlib
+import numpy as np
+from ..data.ensembles import pose_files
+from .features import FEATURE_SCHEMA_VERSION, condition_features, with_conditions
+from .feature_store import FeatureStore, pose_features
+
+TABLE_FORMAT = 1
+
+# (item index, pose path, label) for every pose of a labeled item
+Row = Tuple[int, str, int]
+
+_STORE: Optional[FeatureStore] = None
+
+class FeatureTable:
+    """Training matrix with one row per labeled pose.
+
+    ``groups`` maps each row to its item's index in ``item_ids``; ``X`` may be
+    a read-only memmap when loaded from disk.
+    """
+    def __init__(self, X: np.ndarray, y: np.ndarray, groups: np.ndarray, item_ids: List[Any],
+                 feature_order: List[str], fingerprint: Optional[str] = None):
+        self.X = X
+        self.y = y
+        self.groups = groups
+        self.item_ids = list(item_ids)
+        self.feature_order = list(feature_order)
+        self.fingerprint = fingerprint
+
+    def __len__(self) -> int:
+        return len(self.y)
+
+def labeled_rows(items: Iterable[Dict[str, Any]]) -> Tuple[List[Any], List[Dict[str, float]], List[Row]]:
+    """Item ids, condition features and pose rows of the items with a native label."""
+    ids, conds, rows = [], [], []
+    for ex in items:
+        native = ex.get("label", {}).get("native_pose")
+        if native is None:
+            continue
+        g = len(ids)
+        ids.append(ex.get("id"))
+        conds.append(condition_features(ex.get("conditions", {})))
+        rows.extend((g, p, int(p == native)) for p in ex.get("poses", []))
+    return ids, conds, rows
+
+def _file_stamp(path: str) -> str:
+    # a missing pose still gets a row (flagged missing_file), so it fingerprints as a fixed token
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "absent"
+    return f"{st.st_size}\0{st.st_mtime_ns}"
+
+def table_fingerprint(ids: Sequence[Any], conds: Sequence[Dict[str, float]], rows: Sequence[Row]) -> str:
+    """Hash of everything a feature table depends on: items, conditions, labels, pose file stats and schema version."""
+    h = hashlib.sha1(f"table{TABLE_FORMAT}/features{FEATURE_SCHEMA_VERSION}\n".encode())
+    h.update(json.dumps([ids, conds], sort_keys=True, default=str).encode())
+    for g, pose, label in rows:
+        stats = "\0".join(map(_file_stamp, pose_files(pose)))
+        h.update(f"{g}\0{pose}\0{label}\0{stats}\n".encode())
+    return h.hexdigest()
+
+def _init_worker(store_path: Optional[str]) -> None:
+    global _STORE
+    _STORE = FeatureStore(store_path) if store_path else None
+
+def _features_task(poses: List[str]) -> List[Tuple[dict, Any]]:
+    return [pose_features(p, store=_STORE) for p in poses]
+
+def _iter_features(poses: List[str], workers: int, chunksize: int, store: Optional[FeatureStore]) -> Iterator[Tuple[dict, Any]]:
+    if workers <= 1:
+        for p in poses:
+            yield pose_features(p, store=store)
+        return
+    chunks = [poses[i:i + chunksize] for i in range(0, len(poses), chunksize)]
+    with mp.Pool(workers, initializer=_init_worker, initargs=(store.path if store is not None else None,)) as pool:
+        for feats in pool.imap(_features_task, chunks):
+            yield from feats
+
+def build_feature_table(items: Iterable[Dict[str, Any]], out_dir: Optional[str] = None, workers: int = 1,
+                        chunksize: int = 64, store: Optional[FeatureStore] = None) -> FeatureTable:
+    """Extract features for every labeled pose on ``workers`` processes.
+
+    Columns are the sorted numeric keys of the first row. Rows are written
+    straight into ``out_dir/X.npy`` when given (see ``save_feature_table``),
+    so the matrix never exists as Python lists.
+    """
+    ids, conds, rows = labeled_rows(items)
+    if not rows:
+        raise RuntimeError("No labeled poses found in dataset")
+    fingerprint = table_fingerprint(ids, conds, rows)
+    if out_dir:
+        out = pathlib.Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        # a table without meta.json is never current, so an interrupted build is rebuilt
+        (out / "meta.json").unlink(missing_ok=True)
+    X = keys = None
+    feats = _iter_features([p for _, p, _ in rows], max(1, int(workers)), max(1, int(chunksize)), store)
+    for i, ((g, _, _), (f, pairs)) in enumerate(zip(rows, feats)):
+        with_conditions([f], conds[g], [pairs])
+        if X is None:
+            keys = sorted(k for k, v in f.items() if isinstance(v, (int, float)))
+            shape = (len(rows), len(keys))
+            X = np.lib.format.open_memmap(str(out / "X.npy"), mode="w+", dtype=np.float64, shape=shape) if out_dir else np.empty(shape)
+        X[i] = [float(f.get(k, 0.0)) for k in keys]
+    table = FeatureTable(X, np.array([r[2] for r in rows], dtype=np.int64), np.array([r[0] for r in rows], dtype=np.int64),
+                         ids, keys, fingerprint)
+    if out_dir:
+        save_feature_table(table, out_dir)
+    return table
+
+def save_feature_table(table: FeatureTable, out_dir: str) -> None:
+    """Write ``X.npy``, ``y.npy``, ``groups.npy`` and ``meta.json`` (last, marking the table complete)."""
+    out = pathlib.Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    x_path = out / "X.npy"
+    if isinstance(table.X, np.memmap) and os.path.abspath(table.X.filename) == os.path.abspath(x_path):
+        table.X.flush()
+    else:
+        np.save(x_path, np.asarray(table.X, dtype=np.float64))
+    np.save(out / "y.npy", table.y)
+    np.save(out / "groups.npy", table.groups)
+    meta = {"format": TABLE_FORMAT, "feature_schema_version": FEATURE_SCHEMA_VERSION, "fingerprint": table.fingerprint,
+            "feature_order": table.feature_order, "item_ids": table.item_ids, "n_rows": len(table)}
+    tmp = out / "meta.json.tmp"
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, out / "meta.json")
+
+def load_feature_table(path: str, mmap: bool = True) -> FeatureTable:
+    """Load a saved table; ``X`` is memory-mapped read-only unless ``mmap`` is false."""
+    root = pathlib.Path(path)
+    meta = json.loads((root / "meta.json").read_text())
+    if meta.get("format") != TABLE_FORMAT:
+        raise ValueError(f"{path}: unsupported feature table format {meta.get('format')!r}")
+    X = np.load(root / "X.npy", mmap_mode="r" if mmap else None)
+    return FeatureTable(X, np.load(root / "y.npy"), np.load(root / "groups.npy"), meta["item_ids"],
+                        meta["feature_order"], meta.get("fingerprint"))
+
+def feature_table(items: Iterable[Dict[str, Any]], path: Optional[str] = None, workers: int = 1,
+                  chunksize: int = 64, store: Optional[FeatureStore] = None) -> Tuple[FeatureTable, bool]:
+    """``(table, reused)``: the table saved at ``path`` if it is current for ``items``, else a fresh build saved there."""
+    items = list(items)
+    if path and (pathlib.Path(path) / "meta.json").exists():
+        try:
+            table = load_feature_table(path)
+        except (OSError, ValueError, KeyError):
+            table = None
+        if table is not None and table.fingerprint == table_fingerprint(*labeled_rows(items)):
+            return table, True
+    return build_feature_table(items, out_dir=path, workers=workers, chunksize=chunksize, store=store), False
@@ -0,0 +1,272 @@
+"""``cei serve``: a long-lived local scoring server with a warm model and receptor cache.
+
+Speaks plain HTTP/1.1 (keep-alive) over localhost TCP or a Unix socket:
+
+- ``POST /score`` with one item ``{"id", "poses", "conditions"}`` (or a
+  ``receptor`` + ``ligands`` / ``ensemble`` item) returns ``{"id", "scores"}``;
+  ``{"items": [...]}`` returns ``{"results": [...]}`` in the same order.
+- ``GET /health`` and ``GET /stats``.
+
+Requests arriving together are micro-batched: the batcher waits up to
+``max_wait_ms`` for more work (or until ``max_batch_poses``) and scores the
+whole batch with one ``score_items`` call, i.e. one model call. Ensemble
+expansion and scoring run on a single background thread, so the model, the
+receptor cache, open packs and the feature store are only ever touched by
+one thread, and the event loop never blocks on file I/O.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio, http.client, json, os, signal, socket, time
+from concurrent.futures import ThreadPoolExecutor
+from .data.ensembles import expand_ensemble
+from .scoring.feature_store import FeatureStore
+from .scoring.model import load_model, score_items
+from .scoring.receptor_cache import ReceptorCache
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+class _Request:
+    __slots__ = ("items", "future", "n_poses")
+
+    def __init__(self, items: List[Dict[str, Any]], future: asyncio.Future):
+        self.items, self.future = items, future
+        # items are expanded on the scoring thread, so ensemble items count as one pose here
+        self.n_poses = sum(len(it.get("poses") or []) or 1 for it in items)
+
+class ScoringServer:
+    """Model, receptor cache and feature store loaded once, shared by every request."""
+    def __init__(self, model_cfg: Optional[Dict[str, Any]] = None, store: Optional[FeatureStore] = None,
+                 gates: bool = False, max_batch_poses: int = 256, max_wait_ms: float = 5.0, receptor_cache: int = 8,
+                 geometry: bool = False):
+        self.model = load_model(model_cfg or {})
+        self.cache = ReceptorCache(maxsize=receptor_cache)
+        self.store, self.gates, self.geometry = store, gates, geometry
+        self.max_batch_poses, self.max_wait = max(1, int(max_batch_poses)), max(0.0, float(max_wait_ms)) / 1e3
+        self.counters = {"requests": 0, "items": 0, "poses": 0, "batches": 0, "errors": 0, "busy_seconds": 0.0}
+        self.started = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cei-score")
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.address: Any = None
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix: Optional[str] = None) -> None:
+        """Listen on ``unix`` if given, else ``host:port`` (port 0 picks a free one; see ``address``)."""
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batch_loop())
+        if unix:
+            if os.path.exists(unix):
+                os.unlink(unix)
+            self._server = await asyncio.start_unix_server(self._handle, path=unix)
+            self.address = unix
+        else:
+            self._server = await asyncio.start_server(self._handle, host=host, port=port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+            try:
+                await self._batcher
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    async def score(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Per-item results for ``items``, scored together with whatever else is queued."""
+        req = _Request(items, asyncio.get_running_loop().create_future())
+        self.counters["requests"] += 1
+        await self._queue.put(req)
+        return await req.future
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            n = batch[0].n_poses
+            deadline = loop.time() + self.max_wait
+            while n < self.max_batch_poses:
+                timeout = deadline - loop.time()
+                if timeout <= 0 and self._queue.empty():
+                    break
+                try:
+                    req = self._queue.get_nowait() if not self._queue.empty() else await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(req)
+                n += req.n_poses
+            items = [it for req in batch for it in req.items]
+            try:
+                results = await loop.run_in_executor(self._executor, self._score_batch, items)
+            except Exception as e:  # the model itself failed; every request in the batch gets the error
+                for req in batch:
+                    if not req.future.done():
+                        req.future.set_exception(e)
+                continue
+            lo = 0
+            for req in batch:
+                if not req.future.done():
+                    req.future.set_result(results[lo:lo + len(req.items)])
+                lo += len(req.items)
+
+    def _score_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        t0 = time.perf_counter()
+        # positional ids attribute errors exactly even when clients reuse item ids
+        keyed: List[Dict[str, Any]] = []
+        errors: List[Dict[str, Any]] = []
+        for k, it in enumerate(items):
+            try:
+                keyed.append(expand_ensemble(dict(it, id=k)))
+            except Exception as e:  # e.g. an unreadable pack; only this item fails
+                errors.append({"id": k, "stage": "expand", "error": f"{type(e).__name__}: {e}"})
+        scored = dict(zip((it["id"] for it in keyed), score_items(self.model, keyed, cache=self.cache, store=self.store,
+                                                                  gates=self.gates, errors=errors, geometry=self.geometry)))
+        by_item: Dict[int, List[Dict[str, Any]]] = {}
+        for err in errors:
+            by_item.setdefault(err["id"], []).append({k: v for k, v in err.items() if k != "id"})
+        out = []
+        for k, item in enumerate(items):
+            res, scores = {"id": item.get("id")}, scored.get(k)
+            if scores is not None:
+                res["scores"] = scores
+            if k in by_item:
+                res["errors"] = by_item[k]
+            out.append(res)
+        c = self.counters
+        c["batches"] += 1
+        c["items"] += len(items)
+        c["poses"] += sum(len(it.get("poses") or []) for it in keyed)
+        c["errors"] += len(errors)
+        c["busy_seconds"] += time.perf_counter() - t0
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        c = self.counters
+        return {**c, "uptime_seconds": time.time() - self.started, "mean_batch_poses": c["poses"] / max(1, c["batches"]),
+                "receptor_cache": self.cache.stats(),
+                "feature_store": {"hits": self.store.hits, "misses": self.store.misses} if self.store is not None else None}
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Any]:
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            return 200, {"ok": True}
+        if path == "/stats":
+            return 200, self.stats()
+        if path != "/score":
+            return 404, {"error": f"no route {path}"}
+        if method != "POST":
+            return 405, {"error": "POST a JSON item or {\"items\": [...]} to /score"}
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError as e:
+            return 400, {"error": f"invalid JSON: {e}"}
+        many = isinstance(payload, dict) and isinstance(payload.get("items"), list)
+        items = payload["items"] if many else [payload]
+        if not all(isinstance(it, dict) for it in items):
+            return 400, {"error": "items must be JSON objects"}
+        try:
+            results = await self.score(items)
+        except Exception as e:
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+        return 200, {"results": results} if many else results[0]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                parts = line.decode("latin-1").split()
+                length = int(headers.get("content-length") or 0)
+                if len(parts) != 3 or length < 0:
+                    status, payload, keep = 400, {"error": "malformed request"}, False
+                elif length > MAX_BODY_BYTES:
+                    status, payload, keep = 413, {"error": f"body over {MAX_BODY_BYTES} bytes"}, False
+                else:
+                    body = await reader.readexactly(length)
+                    status, payload = await self._route(parts[0].upper(), parts[1], body)
+                    keep = headers.get("connection", "").lower() != "close" and parts[2].upper() != "HTTP/1.0"
+                data = json.dumps(payload).encode()
+                head = [f"HTTP/1.1 {status} {_REASONS[status]}", "Content-Type: application/json", f"Content-Length: {len(data)}"]
+                if not keep:
+                    head.append("Connection: close")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+                await writer.drain()
+                if not keep:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+class Client:
+    """Keep-alive client for a running ``cei serve`` (TCP ``host:port`` or ``unix`` socket path)."""
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix: Optional[str] = None, timeout: float = 300.0):
+        self.conn = _UnixHTTPConnection(unix, timeout) if unix else http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, path: str, payload: Any = None) -> Tuple[int, Any]:
+        if payload is None:
+            self.conn.request("GET", path)
+        else:
+            self.conn.request("POST", path, body=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+        resp = self.conn.getresponse()
+        return resp.status, json.loads(resp.read())
+
+    def score(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        status, body = self.request("/score", item)
+        if status != 200:
+            raise RuntimeError(f"cei serve returned {status}: {body.get('error')}")
+        return body
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+async def serve(server: ScoringServer, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix: Optional[str] = None,
+                stop: Optional[asyncio.Event] = None) -> None:
+    """Run ``server`` until ``stop`` is set (or SIGINT/SIGTERM)."""
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    await server.start(host, port, unix)
+    where = server.address if unix else f"http://{server.address[0]}:{server.address[1]}"
+    print(f"[cei] serving on {where}", flush=True)
+    try:
+        await stop.wait()
+    finally:
+        await server.close()
+        print(f"[cei] served {server.counters['requests']} requests in {server.counters['batches']} batches", flush=True)
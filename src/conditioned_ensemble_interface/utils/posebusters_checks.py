@@ -1 +1,374 @@
-# TODO: add physical validity checks
+"""PoseBusters-style physical validity gates, vectorized over stacked poses.
+
+Every check takes the heavy-atom ligand coordinates of many poses as one
+(P, N, 3) array with a shared atom order, so a whole ensemble is gated with a
+few array operations instead of a per-file loop:
+
+- bond lengths within ``bond_tolerance`` of the covalent radius sums, over
+  a bond graph fixed per ligand file (see ``pose_bonds``), so a pose's flags
+  do not depend on which other poses are gated with it;
+- bond angles at least ``min_angle`` degrees (three-membered rings exempt);
+- no internal clash between atoms more than three bonds apart;
+- no protein-ligand clash (distance over van der Waals sum below
+  ``clash_ratio``; metal ions exempt), with the minimum distance reported;
+- every atom inside the docking box, when the item gives one.
+
+``gate_poses`` resolves pose references (complex files, ensemble references
+and packs), groups poses sharing a receptor and a ligand atom order, and
+returns one JSON-ready dict per pose that ``checks_from_structure`` folds into
+the gate flags.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+import functools, hashlib, os
+import numpy as np
+from ..data.ensembles import parse_pose_ref, read_ligand_models, read_sdf_bonds
+from ..data.packed import open_packed, parse_packed_ref
+from ..data.structure import chain_slices, read_first_model
+
+# Alvarez 2008 covalent radii and Bondi van der Waals radii (Angstrom)
+COVALENT_RADII = {"H": 0.31, "B": 0.84, "C": 0.76, "N": 0.71, "O": 0.66, "F": 0.57, "SI": 1.11, "P": 1.07, "S": 1.05,
+                  "CL": 1.02, "SE": 1.20, "BR": 1.20, "I": 1.39, "NA": 1.66, "MG": 1.41, "K": 2.03, "CA": 1.76,
+                  "MN": 1.39, "FE": 1.32, "CO": 1.26, "NI": 1.24, "CU": 1.32, "ZN": 1.22}
+VDW_RADII = {"H": 1.20, "B": 1.92, "C": 1.70, "N": 1.55, "O": 1.52, "F": 1.47, "SI": 2.10, "P": 1.80, "S": 1.80,
+             "CL": 1.75, "SE": 1.90, "BR": 1.85, "I": 1.98, "NA": 2.27, "MG": 1.73, "K": 2.75, "CA": 2.31,
+             "MN": 2.00, "FE": 2.00, "CO": 2.00, "NI": 1.63, "CU": 1.40, "ZN": 1.39}
+DEFAULT_COVALENT, DEFAULT_VDW = 0.77, 1.80
+METALS = frozenset({"NA", "MG", "K", "CA", "MN", "FE", "CO", "NI", "CU", "ZN"})
+HYDROGENS = frozenset({"H", "D", "HD", "HS"})
+THRESHOLDS = {"bond_tolerance": 0.25, "min_angle": 75.0, "internal_clash_ratio": 0.7,
+              "clash_ratio": 0.75, "box_margin": 0.0}
+# pairwise work is done in blocks of about this many distances
+_BLOCK = 1 << 22
+
+def _elements(elements: Sequence[str]) -> np.ndarray:
+    return np.array([e.strip().upper() for e in elements], dtype="U2")
+
+def _radii(elements: np.ndarray, table: Dict[str, float], default: float) -> np.ndarray:
+    return np.array([table.get(e, default) for e in elements.tolist()], dtype=np.float64)
+
+def _pair_distances(coords: np.ndarray, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """(P, M) distances between atoms ``i`` and ``j`` of every pose, in blocks of poses."""
+    P = len(coords)
+    out = np.empty((P, len(i)))
+    step = max(1, _BLOCK // max(1, len(i)))
+    for lo in range(0, P, step):
+        block = coords[lo:lo + step]
+        out[lo:lo + step] = np.linalg.norm(block[:, i] - block[:, j], axis=-1)
+    return out
+
+def infer_bonds(coords: np.ndarray, elements: Sequence[str], tolerance: float = THRESHOLDS["bond_tolerance"],
+                vote: float = 0.5) -> Tuple[np.ndarray, np.ndarray]:
+    """Bonded atom pairs ``(i, j)``: within (1 + tolerance) x covalent sum in more than ``vote`` of the poses.
+
+    The gates infer from one reference pose; voting over several poses is
+    for callers that trust the whole stack.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    r = _radii(_elements(elements), COVALENT_RADII, DEFAULT_COVALENT)
+    i, j = np.triu_indices(coords.shape[1], 1)
+    d = _pair_distances(coords, i, j)
+    keep = (d < (1.0 + tolerance) * (r[i] + r[j])).mean(axis=0) > vote
+    return i[keep], j[keep]
+
+def angle_triplets(n_atoms: int, bonds: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """(T, 3) atom triplets ``(a, center, b)`` of bonded angles, skipping three-membered rings."""
+    bi, bj = bonds
+    neighbours: List[List[int]] = [[] for _ in range(n_atoms)]
+    for a, b in zip(bi.tolist(), bj.tolist()):
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+    bonded = set(zip(bi.tolist(), bj.tolist()))
+    out = [(a, c, b) for c, nb in enumerate(neighbours) for x, a in enumerate(nb) for b in nb[x + 1:]
+           if (min(a, b), max(a, b)) not in bonded]
+    return np.array(out, dtype=np.intp).reshape(-1, 3)
+
+def nonbonded_pairs(n_atoms: int, bonds: Tuple[np.ndarray, np.ndarray], min_separation: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """Atom pairs at least ``min_separation`` bonds apart (or in disconnected fragments)."""
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import shortest_path
+    bi, bj = bonds
+    graph = csr_matrix((np.ones(len(bi)), (bi, bj)), shape=(n_atoms, n_atoms))
+    hops = shortest_path(graph, directed=False, unweighted=True)
+    i, j = np.triu_indices(n_atoms, 1)
+    keep = hops[i, j] >= min_separation
+    return i[keep], j[keep]
+
+def ligand_geometry(coords: np.ndarray, elements: Sequence[str], bonds: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                    **thresholds: float) -> Dict[str, np.ndarray]:
+    """Per-pose bond-length, bond-angle and internal-clash flags and metrics for (P, N, 3) ``coords``.
+
+    ``bonds`` default to those inferred from the first pose.
+    """
+    t = {**THRESHOLDS, **thresholds}
+    coords = np.asarray(coords, dtype=np.float64)
+    P, N = coords.shape[:2]
+    el = _elements(elements)
+    if bonds is None:
+        bonds = infer_bonds(coords[:1], el, t["bond_tolerance"])
+    bi, bj = bonds
+    # metrics with nothing to measure stay infinite, which passes and is reported as None
+    out = {"min_bond_ratio": np.full(P, np.inf), "max_bond_ratio": np.full(P, -np.inf), "min_bond_angle": np.full(P, np.inf),
+           "min_internal_ratio": np.full(P, np.inf)}
+    if len(bi):
+        rcov = _radii(el, COVALENT_RADII, DEFAULT_COVALENT)
+        ratio = _pair_distances(coords, bi, bj) / (rcov[bi] + rcov[bj])
+        out["min_bond_ratio"], out["max_bond_ratio"] = ratio.min(axis=1), ratio.max(axis=1)
+        tri = angle_triplets(N, bonds)
+        if len(tri):
+            u = coords[:, tri[:, 0]] - coords[:, tri[:, 1]]
+            v = coords[:, tri[:, 2]] - coords[:, tri[:, 1]]
+            cos = (u * v).sum(-1) / np.maximum(np.linalg.norm(u, axis=-1) * np.linalg.norm(v, axis=-1), 1e-12)
+            out["min_bond_angle"] = np.degrees(np.arccos(np.clip(cos, -1.0, 1.0))).min(axis=1)
+    pi, pj = nonbonded_pairs(N, bonds)
+    if len(pi):
+        rvdw = _radii(el, VDW_RADII, DEFAULT_VDW)
+        out["min_internal_ratio"] = (_pair_distances(coords, pi, pj) / (rvdw[pi] + rvdw[pj])).min(axis=1)
+    out["bond_lengths_ok"] = (out["min_bond_ratio"] >= 1.0 - t["bond_tolerance"]) & (out["max_bond_ratio"] <= 1.0 + t["bond_tolerance"])
+    out["bond_angles_ok"] = out["min_bond_angle"] >= t["min_angle"]
+    out["internal_clash_ok"] = out["min_internal_ratio"] >= t["internal_clash_ratio"]
+    return out
+
+def protein_contacts(coords: np.ndarray, elements: Sequence[str], receptor_xyz: np.ndarray, receptor_elements: Sequence[str],
+                     clash_ratio: float = THRESHOLDS["clash_ratio"], tree=None) -> Dict[str, np.ndarray]:
+    """Per-pose minimum protein-ligand distance and distance / van der Waals sum ratio.
+
+    All P x N ligand atoms go through one KD-tree query against the receptor
+    (pass a prebuilt ``tree`` over ``receptor_xyz`` to reuse it); metal ions
+    are left out of the clash ratio since they coordinate ligands legitimately.
+    """
+    from scipy.spatial import cKDTree
+    coords = np.asarray(coords, dtype=np.float64)
+    P, N = coords.shape[:2]
+    flat = coords.reshape(-1, 3)
+    tree = tree if tree is not None else cKDTree(np.asarray(receptor_xyz, dtype=np.float64))
+    d, _ = tree.query(flat, k=1)
+    out = {"min_protein_distance": d.reshape(P, N).min(axis=1) if N else np.full(P, np.inf), "min_protein_ratio": np.full(P, np.inf)}
+    lig_vdw = np.tile(_radii(_elements(elements), VDW_RADII, DEFAULT_VDW), P)
+    rec_el = _elements(receptor_elements)
+    rec_vdw = _radii(rec_el, VDW_RADII, DEFAULT_VDW)
+    metal = np.isin(rec_el, list(METALS))
+    if len(flat) and not metal.all():
+        cutoff = clash_ratio * (lig_vdw.max() + rec_vdw[~metal].max())
+        sdm = cKDTree(flat).sparse_distance_matrix(tree, cutoff, output_type="ndarray")
+        sdm = sdm[~metal[sdm["j"]]]
+        if len(sdm):
+            ratio = sdm["v"] / (lig_vdw[sdm["i"]] + rec_vdw[sdm["j"]])
+            np.minimum.at(out["min_protein_ratio"], sdm["i"] // N, ratio)
+    out["protein_clash_ok"] = out["min_protein_ratio"] >= clash_ratio
+    return out
+
+def in_box(coords: np.ndarray, center: Sequence[float], size: Sequence[float], margin: float = THRESHOLDS["box_margin"]) -> np.ndarray:
+    """Per-pose flag: every atom inside the axis-aligned box ``center`` +/- ``size``/2 (+ ``margin``)."""
+    coords = np.asarray(coords, dtype=np.float64)
+    half = np.asarray(size, dtype=np.float64) / 2.0 + margin
+    return (np.abs(coords - np.asarray(center, dtype=np.float64)) <= half).all(axis=(1, 2))
+
+def gate_ensemble(coords: np.ndarray, elements: Sequence[str], receptor_xyz: Optional[np.ndarray] = None,
+                  receptor_elements: Optional[Sequence[str]] = None, box: Optional[Dict[str, Any]] = None,
+                  tree=None, bonds: Optional[Tuple[np.ndarray, np.ndarray]] = None, **thresholds: float) -> Dict[str, np.ndarray]:
+    """All gates for (P, N, 3) heavy-atom ligand ``coords``; ``pass`` ANDs the flags that apply.
+
+    The protein checks need ``receptor_xyz``/``receptor_elements`` and the box
+    check needs ``box`` (``{"center": [x, y, z], "size": [x, y, z]}``);
+    either is skipped when not given. ``bonds`` as in ``ligand_geometry``.
+    """
+    t = {**THRESHOLDS, **thresholds}
+    coords = np.asarray(coords, dtype=np.float64)
+    out = ligand_geometry(coords, elements, bonds, **t)
+    ok = out["bond_lengths_ok"] & out["bond_angles_ok"] & out["internal_clash_ok"]
+    if receptor_xyz is not None and len(receptor_xyz):
+        out.update(protein_contacts(coords, elements, receptor_xyz, receptor_elements, t["clash_ratio"], tree))
+        ok &= out["protein_clash_ok"]
+    if box:
+        out["in_box"] = in_box(coords, box["center"], box["size"], t["box_margin"])
+        ok &= out["in_box"]
+    out["pass"] = ok
+    return out
+
+@functools.lru_cache(maxsize=1024)
+def _heavy_elements(raw: bytes, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    el = _elements(np.frombuffer(raw, dtype=dtype))
+    keep = ~np.isin(el, list(HYDROGENS))
+    return el[keep], keep
+
+def _heavy(xyz: np.ndarray, elements: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # poses of one ligand repeat the same element column, so it is normalized once
+    elements = np.ascontiguousarray(elements)
+    el, keep = _heavy_elements(elements.tobytes(), elements.dtype.str)
+    return np.asarray(xyz, dtype=np.float64)[keep], el
+
+def _split_complex(atoms: np.ndarray, ligand_chain: Optional[str]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(ligand atoms, receptor atoms) of a complex: ``ligand_chain``, else the smallest chain."""
+    chains = chain_slices(atoms)
+    if len(chains) < 2:
+        return atoms, None
+    ids = [c for c, _ in chains]
+    pick = ids.index(ligand_chain) if ligand_chain in ids else min(range(len(chains)), key=lambda k: chains[k][1].stop - chains[k][1].start)
+    rows = chains[pick][1]
+    return atoms[rows], np.concatenate([atoms[:rows.start], atoms[rows.stop:]])
+
+class ReceptorAtoms:
+    """Heavy receptor atoms per distinct receptor, plus structures derived from them (KD-tree, grids).
+
+    Entries are built once per key; with ``maxsize`` the least recently used
+    receptor is dropped, so a long-lived instance stays bounded.
+    """
+    def __init__(self, maxsize: Optional[int] = None):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def add(self, key: str, load: Callable[[], Tuple[np.ndarray, np.ndarray]]) -> str:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return key
+        xyz, el = _heavy(*load())
+        self.entries[key] = {"xyz": xyz, "elements": el}
+        while self.maxsize is not None and len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return key
+
+    def atoms(self, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        entry = self.entries[key]
+        return entry["xyz"], entry["elements"]
+
+    def derived(self, key: str, name: str, build: Callable[[np.ndarray, np.ndarray], Any]) -> Any:
+        """``build(xyz, elements)`` for receptor ``key``, computed once and kept with its atoms."""
+        entry = self.entries[key]
+        if name not in entry:
+            entry[name] = build(entry["xyz"], entry["elements"])
+        return entry[name]
+
+def _kdtree(xyz: np.ndarray, elements: np.ndarray):
+    from scipy.spatial import cKDTree
+    return cKDTree(xyz) if len(xyz) else None
+
+def load_pose_atoms(pose: str, receptors: ReceptorAtoms, ligand_chain: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, Optional[str]]:
+    """Heavy ligand (xyz, elements) of a pose and the ``receptors`` key of its receptor (None for a bare ligand).
+
+    Complex files are split into the ``ligand_chain`` (else the smallest
+    chain) and the rest; a single-chain file is taken as a bare ligand.
+    Every atom is read, including the repeated names PDBParser would drop,
+    and PDBQT elements come from the atom types.
+    """
+    ref = parse_pose_ref(pose)
+    if ref is not None:
+        receptor, ligands, k = ref
+        def load():
+            atoms = read_first_model(receptor, keep_duplicates=True, ad_types=receptor.lower().endswith(".pdbqt"))
+            if atoms is None:
+                raise ValueError(f"{receptor}: no model")
+            return atoms["xyz"], atoms["element"]
+        lig = read_ligand_models(ligands)[k - 1]
+        st = os.stat(receptor)
+        return (*_heavy(lig["xyz"], lig["element"]), receptors.add(f"file:{os.path.abspath(receptor)}:{st.st_size}:{st.st_mtime_ns}", load))
+    packed = parse_packed_ref(pose)
+    if packed is not None:
+        pack = open_packed(packed[0])
+        lig = pack.ligand(packed[1])
+        load = lambda: (pack.arrays["receptor_xyz"], pack.arrays["receptor_element"])
+        st = os.stat(pack.path)
+        return (*_heavy(lig["xyz"], lig["element"]), receptors.add(f"pack:{pack.path}:{st.st_size}:{st.st_mtime_ns}", load))
+    if pose.lower().endswith((".sdf", ".sd", ".mol")):
+        lig = read_ligand_models(pose)[0]
+        return (*_heavy(lig["xyz"], lig["element"]), None)
+    atoms = read_first_model(pose, keep_duplicates=True, ad_types=pose.lower().endswith(".pdbqt"))
+    if atoms is None:
+        raise ValueError(f"{pose}: no model")
+    lig, rec = _split_complex(atoms, ligand_chain)
+    if rec is None:
+        return (*_heavy(lig["xyz"], lig["element"]), None)
+    # complexes docked against the same receptor share one entry
+    key = "xyz:" + hashlib.sha1(np.ascontiguousarray(rec["xyz"]).tobytes() + rec["element"].tobytes()).hexdigest()
+    return (*_heavy(lig["xyz"], lig["element"]), receptors.add(key, lambda: (rec["xyz"], rec["element"])))
+
+def _heavy_bonds(pairs: np.ndarray, keep: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # all-atom index pairs -> pairs of heavy-atom indices, dropping bonds to hydrogens
+    index = np.cumsum(keep) - 1
+    pairs = np.sort(index[pairs[keep[pairs].all(axis=1)]], axis=1)
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    return pairs[:, 0], pairs[:, 1]
+
+def _reference_bonds(models: Sequence[Any], k: int, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+    # bonds of the first of ``models`` with pose k's heavy elements
+    el = _heavy(models[k]["xyz"], models[k]["element"])[1]
+    for m in models[:k + 1]:
+        xyz, ref = _heavy(m["xyz"], m["element"])
+        if np.array_equal(ref, el):
+            return infer_bonds(xyz[None], el, tolerance)
+
+@functools.lru_cache(maxsize=1024)
+def _file_bonds(path: str, size: int, mtime_ns: int, model: int, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+    models = read_ligand_models(path)
+    if path.lower().endswith((".sdf", ".sd", ".mol")):
+        el = np.ascontiguousarray(models[model - 1]["element"])
+        return _heavy_bonds(read_sdf_bonds(path)[model - 1], _heavy_elements(el.tobytes(), el.dtype.str)[1])
+    return _reference_bonds(models, model - 1, tolerance)
+
+@functools.lru_cache(maxsize=1024)
+def _pack_bonds(key: str, path: str, model: int, tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+    pack = open_packed(path)
+    # a pack's poses from one ligand file share that file's first pose as reference
+    refs = [parse_pose_ref(n) for n in pack.names]
+    source = refs[model - 1][1] if refs[model - 1] else None
+    same = [k for k, r in enumerate(refs, 1) if (r[1] if r else None) == source]
+    k = same.index(model)
+    return _reference_bonds([pack.ligand(m) for m in same[:k + 1]], k, tolerance)
+
+def pose_bonds(pose: str, xyz: np.ndarray, elements: np.ndarray, tolerance: float = THRESHOLDS["bond_tolerance"]) -> Tuple[np.ndarray, np.ndarray]:
+    """Heavy-atom bonds of a pose's ligand (heavy ``xyz``/``elements`` from ``load_pose_atoms``), fixed per ligand file.
+
+    SDF ligands use their bond block. Models of a PDB/PDBQT ligand file, and
+    a pack's poses from one ligand file, take the bonds inferred from the
+    first model with the same heavy elements; any other file infers its own.
+    """
+    ref = parse_pose_ref(pose)
+    packed = parse_packed_ref(pose) if ref is None else None
+    path, model = (ref[1], ref[2]) if ref else (pose, 1)
+    if packed is not None:
+        pack = open_packed(packed[0])
+        return _pack_bonds(pack.key, pack.path, packed[1], tolerance)
+    if ref is not None or path.lower().endswith((".sdf", ".sd", ".mol")):
+        st = os.stat(path)
+        return _file_bonds(os.path.abspath(path), st.st_size, st.st_mtime_ns, model, tolerance)
+    return infer_bonds(xyz[None], elements, tolerance)
+
+def _as_json(value: Any) -> Any:
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+def gate_poses(poses: Sequence[str], box: Optional[Dict[str, Any]] = None, ligand_chain: Optional[str] = None,
+               **thresholds: float) -> List[Dict[str, Any]]:
+    """One gate dict per pose (flags, metrics and ``pass``), gating same-receptor, same-topology poses as one stack.
+
+    Poses that cannot be read get ``{"pass": False, "error": ...}``. Metrics
+    that do not apply (no bonds, no receptor atoms in range) are None.
+    """
+    receptors = ReceptorAtoms()
+    out: List[Optional[Dict[str, Any]]] = [None] * len(poses)
+    t = {**THRESHOLDS, **thresholds}
+    groups: Dict[Tuple[Optional[str], bytes, bytes], List[Tuple[int, np.ndarray]]] = {}
+    for k, pose in enumerate(poses):
+        try:
+            xyz, el, rec = load_pose_atoms(pose, receptors, ligand_chain)
+            bonds = np.stack(pose_bonds(pose, xyz, el, t["bond_tolerance"])) if len(xyz) else None
+        except Exception as e:
+            out[k] = {"pass": False, "error": f"{type(e).__name__}: {e}"}
+            continue
+        if not len(xyz):
+            out[k] = {"pass": False, "error": "no ligand heavy atoms"}
+            continue
+        groups.setdefault((rec, el.tobytes(), bonds.astype(np.int64).tobytes()), []).append((k, xyz))
+    for (rec, el_bytes, bond_bytes), members in groups.items():
+        elements = np.frombuffer(el_bytes, dtype="U2")
+        bonds = tuple(np.frombuffer(bond_bytes, dtype=np.int64).reshape(2, -1).astype(np.intp))
+        coords = np.stack([xyz for _, xyz in members])
+        rxyz, rel = receptors.atoms(rec) if rec is not None else (None, None)
+        tree = receptors.derived(rec, "tree", _kdtree) if rec is not None else None
+        res = gate_ensemble(coords, elements, rxyz, rel, box, tree=tree, bonds=bonds, **thresholds)
+        for row, (k, _) in enumerate(members):
+            out[k] = {name: _as_json(v[row]) for name, v in res.items()}
+    return out
@@ -1,8 +1,38 @@
-
 from __future__ import annotations
-from typing import Dict, Any
+from typing import Dict, Any, List
 import os
-from Bio.PDB import PDBParser
+from ..data.ensembles import parse_pose_ref
+from ..data.packed import parse_packed_ref
+from ..data.structure import chain_slices, read_first_model
+from ..scoring.features import analyze_interface, charge_pairs
+from ..scoring.receptor_cache import ReceptorCache
+
+def checks_from_structure(structure: Dict[str, Any], min_atoms_per_chain: int = 2) -> Dict[str, Any]:
+    """Gate flags from a structure summary ({file_exists, parsed_ok, chain_atoms}).
+
+    The summary is small enough to embed in prediction JSONL, so gates can be
+    re-applied later, with any threshold, without touching the pose file.
+    A ``geometry`` entry (``cei --geometry-gates``) adds ``geometry_ok``,
+    which the pose must also pass.
+    """
+    chain_atoms: List[int] = list(structure.get("chain_atoms") or [])
+    out = {
+        "file_exists": bool(structure.get("file_exists")),
+        "parsed_ok": bool(structure.get("parsed_ok")),
+        "n_chains": len(chain_atoms),
+        "atoms_per_chain_ok": False,
+        "two_chain_interface_ok": False,
+        "pass": False,
+    }
+    geometry = structure.get("geometry")
+    if geometry is not None:
+        out["geometry_ok"] = bool(geometry.get("pass"))
+    if len(chain_atoms) < 2:
+        return out
+    out["atoms_per_chain_ok"] = all(n >= min_atoms_per_chain for n in chain_atoms)
+    out["two_chain_interface_ok"] = True
+    out["pass"] = out["parsed_ok"] and out["two_chain_interface_ok"] and out["atoms_per_chain_ok"] and out.get("geometry_ok", True)
+    return out
 
 def basic_pose_checks(pdb_path: str, min_atoms_per_chain: int = 2) -> Dict[str, Any]:
     """Lightweight physical sanity checks.
@@ -13,37 +43,30 @@ def basic_pose_checks(pdb_path: str, min_atoms_per_chain: int = 2) -> Dict[str,
     - atoms_per_chain_ok
     - two_chain_interface_ok (needs >=2 chains)
     """
-    out = {
-        "file_exists": os.path.exists(pdb_path),
-        "parsed_ok": False,
-        "n_chains": 0,
-        "atoms_per_chain_ok": False,
-        "two_chain_interface_ok": False,
-        "pass": False,
+    if parse_pose_ref(pdb_path) is not None or parse_packed_ref(pdb_path) is not None:
+        return analyze_pose(pdb_path, min_atoms_per_chain)["checks"]
+    structure = {"file_exists": os.path.exists(pdb_path), "parsed_ok": False, "chain_atoms": []}
+    if structure["file_exists"]:
+        try:
+            atoms = read_first_model(pdb_path)
+            structure["parsed_ok"] = True
+            if atoms is not None:
+                structure["chain_atoms"] = [rows.stop - rows.start for _, rows in chain_slices(atoms)]
+        except Exception:
+            pass
+    return checks_from_structure(structure, min_atoms_per_chain)
+
+def analyze_pose(pdb_path: str, min_atoms_per_chain: int = 2, cache: ReceptorCache = None) -> Dict[str, Any]:
+    """Gate flags and interface features from a single parse of the pose.
+
+    Returns {"structure", "checks", "features", "charge_pairs"}; "checks"
+    equals basic_pose_checks and "features" equals compute_interface_features.
+    """
+    tables, features = analyze_interface(pdb_path, cache)
+    structure = {
+        "file_exists": "missing_file" not in features,
+        "parsed_ok": "missing_file" not in features and "parse_error" not in features,
+        "chain_atoms": [t.n_atoms for t in tables] if tables is not None else [],
     }
-    if not out["file_exists"]:
-        return out
-    parser = PDBParser(QUIET=True)
-    try:
-        structure = parser.get_structure("pose", pdb_path)
-    except Exception:
-        return out
-    out["parsed_ok"] = True
-    models = list(structure.get_models())
-    if not models:
-        return out
-    model = models[0]
-    chains = list(model.get_chains())
-    out["n_chains"] = len(chains)
-    if len(chains) < 2:
-        return out
-    atoms_ok = True
-    for ch in chains:
-        n = sum(1 for _ in ch.get_atoms())
-        if n < min_atoms_per_chain:
-            atoms_ok = False
-            break
-    out["atoms_per_chain_ok"] = atoms_ok
-    out["two_chain_interface_ok"] = len(chains) >= 2
-    out["pass"] = out["parsed_ok"] and out["two_chain_interface_ok"] and out["atoms_per_chain_ok"]
-    return out
+    return {"structure": structure, "checks": checks_from_structure(structure, min_atoms_per_chain), "features": features,
+            "charge_pairs": charge_pairs(tables)}
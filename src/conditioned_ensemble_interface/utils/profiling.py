@@ -0,0 +1,190 @@
+"""Opt-in stage timers, counters and per-pose traces.
+
+Pipeline code marks work with ``with profiling.stage("parse"):``. While no
+profiler is enabled (the default) that returns a shared no-op context, so
+the instrumentation costs one global lookup. ``cei --profile`` enables a
+``Profiler`` per process; pool workers ship their totals and traces back with
+each task (``drain``) and the parent ``merge``s them.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+import contextlib, cProfile, os, time
+
+_NULL = contextlib.nullcontext()
+_ACTIVE: Optional["Profiler"] = None
+BACKENDS = ("cprofile", "pyinstrument")
+
+class _Stage:
+    __slots__ = ("prof", "name", "t0")
+
+    def __init__(self, prof: "Profiler", name: str):
+        self.prof, self.name = prof, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.prof.add(self.name, time.perf_counter() - self.t0)
+
+class _PoseTrace:
+    __slots__ = ("prof", "record", "t0")
+
+    def __init__(self, prof: "Profiler", item_id: Any, pose: str):
+        self.prof, self.record = prof, {"id": item_id, "pose": pose}
+
+    def __enter__(self):
+        self.prof._pose = {}
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.t0
+        stages, self.prof._pose = self.prof._pose, None
+        self.prof._emit({**self.record, "seconds": seconds, **{f"{k}_s": v for k, v in stages.items()}})
+
+class Profiler:
+    """Per-stage call counts and seconds, named counters, and optional per-pose traces.
+
+    ``trace_sink`` receives each per-pose trace record as it completes (the
+    parent process); with ``trace`` but no sink, records are buffered for
+    ``drain`` (pool workers). ``sample_every`` > 0 runs every n-th task passed
+    to ``run_sampled`` under cProfile (or pyinstrument), dumping the profile
+    into ``sample_dir``.
+    """
+    def __init__(self, trace: bool = False, trace_sink: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 sample_every: int = 0, sample_dir: str = "runs/profiles", backend: str = "cprofile"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown profiler backend: {backend}; expected one of {list(BACKENDS)}")
+        self.totals: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self.traces: List[Dict[str, Any]] = []
+        self.trace = bool(trace or trace_sink)
+        self.trace_sink = trace_sink
+        self.sample_every, self.sample_dir, self.backend = int(sample_every), sample_dir, backend
+        self.samples: List[str] = []
+        self._pose: Optional[Dict[str, float]] = None
+        self._tasks = 0
+        self.started = time.perf_counter()
+
+    def config(self) -> Dict[str, Any]:
+        """Constructor arguments for a worker-side profiler (traces buffered, not sunk)."""
+        return {"trace": self.trace, "sample_every": self.sample_every, "sample_dir": self.sample_dir, "backend": self.backend}
+
+    def add(self, name: str, seconds: float, calls: int = 1) -> None:
+        t = self.totals.get(name)
+        if t is None:
+            self.totals[name] = [calls, seconds]
+        else:
+            t[0] += calls
+            t[1] += seconds
+        if self._pose is not None:
+            self._pose[name] = self._pose.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def _emit(self, record: Dict[str, Any]) -> None:
+        if self.trace_sink is not None:
+            self.trace_sink(record)
+        else:
+            self.traces.append(record)
+
+    def run_sampled(self, fn: Callable[..., Any], *args) -> Any:
+        """``fn(*args)``, profiled in depth when this is a sampled task."""
+        self._tasks += 1
+        if self.sample_every <= 0 or (self._tasks - 1) % self.sample_every:
+            return fn(*args)
+        os.makedirs(self.sample_dir, exist_ok=True)
+        path = os.path.join(self.sample_dir, f"task_{os.getpid()}_{self._tasks}")
+        if self.backend == "pyinstrument":
+            try:
+                from pyinstrument import Profiler as _Pyinstrument
+            except Exception:
+                raise RuntimeError("pyinstrument not available; install pyinstrument or use the cprofile backend") from None
+            p = _Pyinstrument()
+            p.start()
+            try:
+                return fn(*args)
+            finally:
+                p.stop()
+                with open(path + ".html", "w") as f:
+                    f.write(p.output_html())
+                self.samples.append(path + ".html")
+        p = cProfile.Profile()
+        try:
+            return p.runcall(fn, *args)
+        finally:
+            p.dump_stats(path + ".prof")
+            self.samples.append(path + ".prof")
+
+    def drain(self) -> Dict[str, Any]:
+        """Totals, counters, traces and sample files gathered since the last drain, then reset."""
+        out = {"totals": self.totals, "counters": self.counters, "traces": self.traces, "samples": self.samples}
+        self.totals, self.counters, self.traces, self.samples = {}, {}, [], []
+        return out
+
+    def merge(self, drained: Dict[str, Any]) -> None:
+        """Fold another process's ``drain`` into this profiler."""
+        for name, (calls, seconds) in drained["totals"].items():
+            t = self.totals.setdefault(name, [0, 0.0])
+            t[0] += calls
+            t[1] += seconds
+        for name, n in drained["counters"].items():
+            self.count(name, n)
+        for record in drained["traces"]:
+            self._emit(record)
+        self.samples.extend(drained["samples"])
+
+    def summary(self) -> Dict[str, Any]:
+        wall = time.perf_counter() - self.started
+        stages = {name: {"calls": int(calls), "seconds": seconds, "mean_ms": 1e3 * seconds / max(1, calls)}
+                  for name, (calls, seconds) in sorted(self.totals.items(), key=lambda kv: -kv[1][1])}
+        return {"wall_seconds": wall, "stages": stages, "counters": dict(self.counters), "samples": list(self.samples)}
+
+    def format_summary(self) -> List[str]:
+        s = self.summary()
+        lines = [f"{'stage':<14}{'calls':>9}{'total_s':>11}{'mean_ms':>11}{'% wall':>8}"]
+        for name, st in s["stages"].items():
+            lines.append(f"{name:<14}{st['calls']:>9}{st['seconds']:>11.3f}{st['mean_ms']:>11.3f}"
+                         f"{100 * st['seconds'] / max(s['wall_seconds'], 1e-9):>7.1f}%")
+        lines.append(f"{'wall':<14}{'':>9}{s['wall_seconds']:>11.3f}")
+        lines.extend(f"{name}: {n}" for name, n in sorted(s["counters"].items()))
+        lines.extend(f"sampled profile: {p}" for p in s["samples"])
+        return lines
+
+def enable(profiler: Optional[Profiler] = None) -> Profiler:
+    global _ACTIVE
+    _ACTIVE = profiler if profiler is not None else Profiler()
+    return _ACTIVE
+
+def disable() -> Optional[Profiler]:
+    global _ACTIVE
+    prof, _ACTIVE = _ACTIVE, None
+    return prof
+
+def active() -> Optional[Profiler]:
+    return _ACTIVE
+
+def stage(name: str):
+    """Context manager timing ``name`` on the active profiler; a no-op when profiling is off."""
+    prof = _ACTIVE
+    return _NULL if prof is None else _Stage(prof, name)
+
+def count(name: str, n: int = 1) -> None:
+    if _ACTIVE is not None:
+        _ACTIVE.count(name, n)
+
+def pose_trace(item_id: Any, pose: str):
+    """Context manager recording one pose's per-stage seconds when tracing is on."""
+    prof = _ACTIVE
+    return _NULL if prof is None or not prof.trace else _PoseTrace(prof, item_id, pose)
+
+def timed(iterable: Iterable[Any], name: str) -> Iterator[Any]:
+    """Iterate ``iterable``, timing each ``next`` as stage ``name`` (lazy loaders)."""
+    it = iter(iterable)
+    while True:
+        with stage(name):
+            try:
+                value = next(it)
+            except StopIteration:
+                return
+        yield value
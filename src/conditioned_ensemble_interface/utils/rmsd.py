@@ -0,0 +1,187 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence
+import functools, math
+import multiprocessing as mp
+import numpy as np
+from ..data.ensembles import model_block, parse_pose_ref
+from ..data.packed import open_packed, parse_packed_ref
+
+# symmetric RMSD is evaluated in blocks of about this many coordinate triples
+_BLOCK = 1 << 20
+MAX_MATCHES = 10000
+
+def _rdkit():
+    try:
+        from rdkit import Chem
+    except Exception:
+        raise RuntimeError("rdkit not available; install rdkit for RMSD evaluation") from None
+    return Chem
+
+def symmetric_rmsd(native: np.ndarray, poses: np.ndarray, matches: np.ndarray) -> np.ndarray:
+    """Fixed-frame RMSD of each pose to ``native``, minimized over symmetry-equivalent atom orderings.
+
+    ``native`` is (N, 3); ``poses`` is (P, N, 3) in native atom order; row
+    ``k`` of ``matches`` (K, N) maps native atom ``i`` to its equivalent atom
+    ``matches[k, i]``. No superposition is done, as in redocking.
+    """
+    native = np.asarray(native, dtype=float)
+    poses = np.asarray(poses, dtype=float).reshape(-1, *native.shape)
+    matches = np.asarray(matches, dtype=np.intp).reshape(-1, len(native))
+    out = np.empty(len(poses))
+    step = max(1, _BLOCK // max(1, matches.size))
+    for lo in range(0, len(poses), step):
+        diff = poses[lo:lo + step][:, matches] - native
+        sq = np.einsum("pkij,pkij->pk", diff, diff)
+        out[lo:lo + step] = np.sqrt(sq.min(axis=1) / max(1, len(native)))
+    return out
+
+def leader_clusters(coords: np.ndarray, threshold: float) -> np.ndarray:
+    """Greedy leader clustering of (P, N, 3) poses by fixed-frame RMSD; the leader's index per pose.
+
+    Poses are visited in order: one not yet within ``threshold`` of an
+    earlier leader becomes a leader and claims every unclaimed pose within
+    ``threshold`` of it. The centroid shift bounds the RMSD from below, so
+    only poses with nearby centroids (a KD-tree query) are compared.
+    """
+    from scipy.spatial import cKDTree
+    coords = np.asarray(coords, dtype=float)
+    P, N = coords.shape[:2]
+    leader = np.full(P, -1, dtype=np.intp)
+    if not P:
+        return leader
+    centroids = coords.mean(axis=1)
+    tree = cKDTree(centroids)
+    limit = float(threshold) ** 2 * max(1, N)
+    for k in range(P):
+        if leader[k] >= 0:
+            continue
+        near = np.asarray(tree.query_ball_point(centroids[k], float(threshold)), dtype=np.intp)
+        near = near[leader[near] < 0]
+        sq = ((coords[near] - coords[k]) ** 2).sum(axis=(1, 2))
+        leader[near[sq <= limit]] = k
+        leader[k] = k
+    return leader
+
+def load_ligand(path: str, chain: Optional[str] = None):
+    """RDKit molecule from an SDF (first record) or PDB file; ``chain`` keeps one chain of a complex.
+
+    An ensemble or pack pose reference loads its ligand model.
+    """
+    Chem = _rdkit()
+    packed = parse_packed_ref(path)
+    if packed is not None:
+        return Chem.MolFromPDBBlock(open_packed(packed[0]).pdb_block(packed[1]), removeHs=False)
+    ref = parse_pose_ref(path)
+    if ref is not None:
+        block = model_block(ref[1], ref[2])
+        if ref[1].lower().endswith((".sdf", ".sd", ".mol")):
+            return Chem.MolFromMolBlock(block, removeHs=False)
+        return Chem.MolFromPDBBlock(block, removeHs=False) if block else None
+    if path.lower().endswith((".sdf", ".sd")):
+        return next(iter(Chem.SDMolSupplier(path, removeHs=False)), None)
+    if chain is None:
+        return Chem.MolFromPDBFile(path, removeHs=False)
+    with open(path) as f:
+        block = "".join(l for l in f if l.startswith(("ATOM", "HETATM")) and l[21:22] == chain)
+    return Chem.MolFromPDBBlock(block, removeHs=False) if block else None
+
+def _heavy_graph(mol):
+    """Heavy atoms with every bond single and nothing aromatic: matching then depends on
+    elements and connectivity only, so bond orders perceived differently per file format
+    (PDB CONECT, PDBQT, SDF) do not break it."""
+    Chem = _rdkit()
+    rw = Chem.RWMol(Chem.RemoveHs(mol, sanitize=False))
+    for b in rw.GetBonds():
+        b.SetBondType(Chem.BondType.SINGLE)
+        b.SetIsAromatic(False)
+    for a in rw.GetAtoms():
+        a.SetIsAromatic(False)
+        a.SetFormalCharge(0)
+    out = rw.GetMol()
+    out.UpdatePropertyCache(strict=False)
+    Chem.FastFindRings(out)
+    return out
+
+class NativeReference:
+    """Heavy atoms of a native ligand and its symmetry matches, enumerated once for all poses."""
+    def __init__(self, mol, max_matches: int = MAX_MATCHES):
+        self.mol = _heavy_graph(mol)
+        self.coords = self.mol.GetConformer().GetPositions()
+        self.matches = np.array(self.mol.GetSubstructMatches(self.mol, uniquify=False, useChirality=False,
+                                                             maxMatches=max_matches), dtype=np.intp)
+
+    def ordered_coords(self, mol) -> Optional[np.ndarray]:
+        """Heavy-atom coordinates of ``mol`` in native atom order, or None if it is not the same molecule."""
+        if mol is None:
+            return None
+        pose = _heavy_graph(mol)
+        if pose.GetNumAtoms() != self.mol.GetNumAtoms():
+            return None
+        m = pose.GetSubstructMatch(self.mol)
+        return pose.GetConformer().GetPositions()[list(m)] if m else None
+
+    def rmsds(self, mols: Sequence[Any]) -> np.ndarray:
+        """RMSD per molecule, NaN where it cannot be compared (load failure or different molecule)."""
+        out = np.full(len(mols), np.nan)
+        coords = [self.ordered_coords(m) for m in mols]
+        ok = [i for i, c in enumerate(coords) if c is not None]
+        if ok:
+            out[ok] = symmetric_rmsd(self.coords, np.stack([coords[i] for i in ok]), self.matches)
+        return out
+
+@functools.lru_cache(maxsize=32)
+def native_reference(path: str, chain: Optional[str] = None) -> NativeReference:
+    mol = load_ligand(path, chain)
+    if mol is None:
+        raise RuntimeError(f"Failed to load native: {path}")
+    return NativeReference(mol)
+
+def item_native(item: Dict[str, Any]) -> Optional[str]:
+    label = item.get("label", {})
+    return item.get("native_ligand") or label.get("native_ligand") or label.get("native_pose")
+
+def evaluate_item(item: Dict[str, Any], ks: Sequence[int] = (1, 5), threshold: float = 2.0,
+                  chain: Optional[str] = None, scores: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """Per-item RMSD summary with Top-k success for each ``k``.
+
+    Poses are ranked in dataset order, or by descending ``scores`` (pose ->
+    score) when given, with unscored poses last.
+    """
+    poses = list(item.get("poses", []))
+    if scores:
+        poses.sort(key=lambda p: -scores[p] if p in scores else math.inf)
+    native = item_native(item)
+    if native is None:
+        raise ValueError(f"item {item.get('id')!r} has no native ligand or native_pose label")
+    ref = native_reference(native, chain)
+    rmsd = ref.rmsds([load_ligand(p, chain) for p in poses])
+    ok = np.isfinite(rmsd)
+    best = int(np.nanargmin(rmsd)) if ok.any() else None
+    row = {"id": item.get("id"), "native": native, "n_poses": len(poses), "n_compared": int(ok.sum()),
+           "n_symmetry_matches": len(ref.matches),
+           "best_rmsd": float(rmsd[best]) if best is not None else float("nan"),
+           "best_rank": best + 1 if best is not None else None}
+    for k in ks:
+        row[f"top{k}_success"] = bool((rmsd[:k][ok[:k]] <= threshold).any())
+    row["poses"] = [{"pose": p, "rmsd": float(r)} for p, r in zip(poses, rmsd)]
+    return row
+
+def evaluate_dataset(items: Iterable[Dict[str, Any]], ks: Sequence[int] = (1, 5), threshold: float = 2.0,
+                     chain: Optional[str] = None, scores: Optional[Dict[Any, Dict[str, float]]] = None,
+                     workers: int = 1, chunksize: int = 4) -> Iterator[Dict[str, Any]]:
+    """``evaluate_item`` rows in input order, items spread over ``workers`` processes.
+
+    ``scores`` maps item id to pose scores for ranking. Each process keeps its
+    native references, so items sharing a native prepare it once per worker.
+    """
+    scores = scores or {}
+    args = ((item, tuple(ks), threshold, chain, scores.get(item.get("id"))) for item in items)
+    if workers <= 1:
+        for a in args:
+            yield evaluate_item(*a)
+        return
+    with mp.Pool(workers) as pool:
+        yield from pool.imap(_evaluate_args, args, chunksize=max(1, int(chunksize)))
+
+def _evaluate_args(args) -> Dict[str, Any]:
+    return evaluate_item(*args)
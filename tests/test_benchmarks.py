@@ -0,0 +1,26 @@
+# Benchmark harness: a tiny synthetic run produces every stage and baseline comparison flags slowdowns.
+import importlib.util
+import os
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+spec = importlib.util.spec_from_file_location("run_benchmarks", os.path.join("benchmarks", "run_benchmarks.py"))
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+
+def test_synthetic_workload_and_compare(tmp_path):
+    items = bench.load_workload("synth:200x3", str(tmp_path))
+    assert len(items[0]["poses"]) == 3
+    feats = bench.compute_interface_features(items[0]["poses"][0])
+    assert feats["contact_count_4A"] > 0
+    results = bench.run(["synth:200x3"], stages=bench.STAGES, repeats=1, min_time=0.0, log=lambda *_: None)
+    assert set(results["results"]) == {f"synth:200x3/{s}" for s in bench.STAGES}
+    assert results["results"]["synth:200x3/features"]["n"] == 3
+
+    base = {"results": {"a": {"median_s": 1.0}, "b": {"median_s": 1.0}, "c": {"median_s": 1.0}, "gone": {"median_s": 1.0}}}
+    cur = {"results": {"a": {"median_s": 1.2}, "b": {"median_s": 1.5}, "c": {"median_s": 0.5}, "new": {"median_s": 1.0}}}
+    status = {r["key"]: r["status"] for r in bench.compare(cur, base, threshold=0.25)}
+    assert status == {"a": "ok", "b": "regression", "c": "improved", "gone": "missing", "new": "new"}
+    assert bench.compare(cur, base, threshold=0.25, min_delta=1.0)[1]["status"] == "ok"
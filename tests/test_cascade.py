@@ -0,0 +1,53 @@
+# Cascade scoring: the grid prefilter drops only hopeless poses, and --topk matches the full run's best poses.
+import os
+import json
+import numpy as np
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.cli import main
+from conditioned_ensemble_interface.data.ensembles import read_ligand_models
+from conditioned_ensemble_interface.data.packed import packed_ref, write_packed
+from conditioned_ensemble_interface.data.structure import read_first_model
+from conditioned_ensemble_interface.scoring.cascade import Prefilter
+
+RECEPTOR = "data/3ptb/receptor_clean.pdb"
+LIGANDS = "runs/3ptb_smina/poses.pdbqt"
+
+def _pack(tmp_path):
+    rec = read_first_model(RECEPTOR)
+    models = list(read_ligand_models(LIGANDS))
+    native = read_ligand_models("data/3ptb/ligand.sdf")[0]
+    far = native.copy()
+    far["xyz"] += 60.0
+    # inside the receptor's bounding box, but in an empty corner of it
+    corner = native.copy()
+    corner["xyz"] += rec["xyz"].max(axis=0) - native["xyz"].mean(axis=0)
+    buried = native.copy()
+    buried["xyz"] = rec["xyz"][200:200 + len(buried)]
+    path = str(tmp_path / "p.npz")
+    write_packed(path, rec, models + [far, corner, buried])
+    return path, len(models)
+
+def test_prefilter_rejects_only_hopeless_poses(tmp_path):
+    pack, n = _pack(tmp_path)
+    verdicts = Prefilter().screen([packed_ref(pack, k) for k in range(1, n + 4)] + ["missing.pdb"])
+    assert verdicts[:n] == [None] * n and verdicts[-1] is None
+    assert [v["reason"] for v in verdicts[n:n + 3]] == ["no_overlap", "no_contact", "clash"]
+
+def test_cascade_topk_run(tmp_path):
+    pack, n = _pack(tmp_path)
+    ds, full, pruned = tmp_path / "ds.jsonl", str(tmp_path / "full.jsonl"), str(tmp_path / "pruned.jsonl")
+    ds.write_text(json.dumps({"id": "x", "ensemble": pack, "conditions": {"pH": 7.4}}) + "\n")
+    main(["--dataset", str(ds), "--out", full, "--no-feature-store"])
+    main(["--dataset", str(ds), "--out", pruned, "--no-feature-store", "--cascade", "--topk", "3", "--chunksize", "4"])
+    scores = json.loads(open(full).read())["scores"]
+    kept = json.loads(open(pruned).read())["scores"]
+    best = sorted(scores[:n], key=lambda e: -e["score"])[:3]
+    assert sorted(e["pose"] for e in kept) == sorted(e["pose"] for e in best)
+    assert all(np.isclose(e["score"], {s["pose"]: s["score"] for s in scores}[e["pose"]]) for e in kept)
+    skipped = [json.loads(l) for l in open(tmp_path / "pruned.skipped.jsonl")]
+    reasons = sorted(r["reason"] for r in skipped)
+    assert reasons == ["clash", "no_contact", "no_overlap"] + ["topk"] * (n - 3)
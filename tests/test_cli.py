@@ -0,0 +1,40 @@
+# cei runs: failures go to the error log, and --resume completes a crashed run exactly.
+import os
+import json
+import pytest
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.cli import main
+
+def _dataset(tmp_path):
+    items = [{"id": f"it{i}", "poses": ["examples/pose1.pdb", "examples/pose2.pdb"], "conditions": {"pH": 7.0 + i / 10}}
+             for i in range(5)]
+    items[1]["conditions"] = {"pH": "not-a-number"}
+    items[3]["poses"].append(None)
+    path = tmp_path / "ds.jsonl"
+    path.write_text("".join(json.dumps(it) + "\n" for it in items))
+    return str(path)
+
+def test_errors_and_resume(tmp_path):
+    ds, out = _dataset(tmp_path), str(tmp_path / "out.jsonl")
+    main(["--dataset", ds, "--out", out, "--no-feature-store"])
+    full = open(out).read()
+    assert [json.loads(l)["id"] for l in full.splitlines()] == ["it0", "it2", "it3", "it4"]
+    errors = [json.loads(l) for l in open(tmp_path / "out.errors.jsonl")]
+    assert [(e["id"], e["stage"]) for e in errors] == [("it1", "item"), ("it3", "pose")]
+
+    # simulate a crash halfway through writing the third line
+    lines = full.splitlines(keepends=True)
+    open(out, "w").write(lines[0] + lines[1] + lines[2][:10])
+    main(["--dataset", ds, "--out", out, "--no-feature-store", "--resume", "--workers", "2", "--chunksize", "1"])
+    assert open(out).read() == full
+
+def test_resume_rejects_compressed_out(tmp_path, capsys):
+    ds = _dataset(tmp_path)
+    for out in ("out.jsonl.gz", "out.jsonl.zst", "out.parquet"):
+        with pytest.raises(SystemExit):
+            main(["--dataset", ds, "--out", str(tmp_path / out), "--no-feature-store", "--resume"])
+        assert "--resume needs an uncompressed JSONL --out" in capsys.readouterr().err
@@ -0,0 +1,75 @@
+# Columnar predictions: flat rows rebuild the nested records, and cei --features embeds every feature column.
+import os
+import json
+import pytest
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.cli import main
+from conditioned_ensemble_interface.data.columnar import columnar_format, flat_rows, iter_predictions, nested_records, prediction_columns
+from conditioned_ensemble_interface.data.ensembles import pose_ref
+from conditioned_ensemble_interface.scoring.features import FEATURE_KEYS
+from conditioned_ensemble_interface.scoring.model import item_features
+
+def _pdb(path, lines):
+    path.write_text("".join("ATOM  %5d  %-3s ALA %s   1    %8s   0.000   0.000  1.00  0.00           %s\n" % (k + 1, *l)
+                            for k, l in enumerate(lines)) + "END\n")
+    return str(path)
+
+def test_feature_keys_cover_every_row_kind(tmp_path):
+    # one pose per row kind: interface features and each error flag
+    poses = ["examples/pose1.pdb", "missing.pdb", _pdb(tmp_path / "bad.pdb", [("CA", "A", "x.000", "C")]),
+             pose_ref("data/3ptb/receptor_clean.pdb", "runs/3ptb_smina/poses.pdbqt", 99),
+             _pdb(tmp_path / "one.pdb", [("CA", "A", "0.000", "C")]),
+             _pdb(tmp_path / "h.pdb", [("CA", "A", "0.000", "C"), ("H", "B", "1.000", "H")])]
+    rows = item_features({"poses": poses, "conditions": {"pH": 7.0}})
+    assert len(rows) == len(poses)
+    assert {k for r in rows for k, v in r.items() if isinstance(v, (int, float))} == set(FEATURE_KEYS)
+
+def test_flat_rows_round_trip():
+    structure = {"file_exists": True, "parsed_ok": True, "chain_atoms": [120, 9],
+                 "geometry": {"pass": False, "bond_lengths_ok": True, "bond_angles_ok": False, "internal_clash_ok": True}}
+    records = [
+        {"id": "a", "scores": [{"pose": "p1", "score": 0.5, "structure": structure, "cluster": "p1", "weight": 0.5,
+                                "features": {"clashes": 1.0, "pH": 7.4}},
+                               {"pose": "p2", "score": 0.25, "structure": dict(structure, geometry={"pass": True}),
+                                "cluster": "p1", "weight": 0.5, "features": {"missing_file": 1.0}}]},
+        {"id": "b", "scores": []},
+    ]
+    cols = prediction_columns(FEATURE_KEYS, gates=True, geometry=True, clusters=True)
+    rows = [r for rec in records for r in flat_rows(rec, cols)]
+    assert len(rows) == 3 and rows[2]["pose"] is None and all(list(r) == cols for r in rows)
+    assert rows[0]["geometry_bond_angles_ok"] is False and rows[0]["geometry_protein_clash_ok"] is None
+    assert rows[1]["f_missing_file"] == 1.0 and rows[1]["f_clashes"] is None
+    assert list(nested_records([tuple(r.values()) for r in rows], cols)) == records
+    assert columnar_format("x.parquet") == "parquet" and columnar_format("x.ARROW") == "arrow" and columnar_format("x.jsonl.gz") is None
+
+def test_cli_features_and_columnar_output(tmp_path):
+    out = str(tmp_path / "p.jsonl")
+    main(["--config", "configs/minipep.yaml", "--out", out, "--no-feature-store", "--features"])
+    preds = list(iter_predictions(out, ("score",)))
+    feats = preds[0]["scores"][0]["features"]
+    assert set(feats) <= set(FEATURE_KEYS) and feats["pH"] == 7.4 and "screened_electrostatics" in feats
+    parquet = str(tmp_path / "p.parquet")
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        with pytest.raises(RuntimeError, match="pyarrow not available"):
+            main(["--config", "configs/minipep.yaml", "--out", parquet, "--no-feature-store", "--features"])
+        return
+    main(["--config", "configs/minipep.yaml", "--out", parquet, "--no-feature-store", "--features", "--row-group-rows", "1"])
+    assert list(iter_predictions(parquet)) == preds
+    assert [[s["pose"] for s in p["scores"]] for p in iter_predictions(parquet, ())] == [[s["pose"] for s in p["scores"]] for p in preds]
+
+def test_writer_keeps_one_id_type(tmp_path):
+    pytest.importorskip("pyarrow")
+    from conditioned_ensemble_interface.data.columnar import ColumnarWriter
+    path = str(tmp_path / "p.parquet")
+    with ColumnarWriter(path, row_group_rows=1) as w:
+        for i in (7, 8):
+            w.write({"id": i, "scores": [{"pose": "p", "score": 0.5}]})
+        with pytest.raises(ValueError, match="ids of one type"):
+            w.write({"id": "b", "scores": []})
+    assert [p["id"] for p in iter_predictions(path)] == [7, 8]
@@ -0,0 +1,41 @@
+# Contact engine must reproduce the brute-force all-pairs counts exactly.
+import os
+import numpy as np
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.contacts import ChainAtoms, chain_pair_contacts
+
+def _brute(a, b):
+    out = {"contacts": 0, "clashes": 0, "hydrophobic": 0, "salt_bridges": 0}
+    for i in range(len(a)):
+        for j in range(len(b)):
+            d = float(np.linalg.norm(a.coords[i] - b.coords[j]))
+            if d < 2.0:
+                out["clashes"] += 1
+            if d <= 4.0:
+                out["contacts"] += 1
+                if a.standard[i] and b.standard[j]:
+                    out["hydrophobic"] += int(a.hydrophobic[i] and b.hydrophobic[j])
+                    out["salt_bridges"] += int((a.positive[i] and b.negative[j]) or (b.positive[j] and a.negative[i]))
+    return out
+
+def _random_chain(rng, n, offset):
+    coords = np.round(rng.uniform(0, 10, size=(n, 3)), 3) + offset
+    flags = rng.random((4, n)) < 0.5
+    return ChainAtoms(coords, flags[0], flags[1], flags[2], flags[3])
+
+def test_chain_pair_contacts_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        a = _random_chain(rng, 120, 0.0)
+        b = _random_chain(rng, 40, 6.0)
+        assert chain_pair_contacts(a, b) == _brute(a, b)
+
+def test_chain_pair_contacts_exact_cutoffs():
+    ones = [True, True]
+    a = ChainAtoms([[0.0, 0.0, 0.0], [10.0, 0.0, 0.0]], ones, ones, ones, [False, False])
+    b = ChainAtoms([[4.0, 0.0, 0.0], [12.0, 0.0, 0.0]], ones, ones, [False, False], ones)
+    assert chain_pair_contacts(a, b) == _brute(a, b) == {"contacts": 2, "clashes": 0, "hydrophobic": 2, "salt_bridges": 2}
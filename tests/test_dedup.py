@@ -0,0 +1,60 @@
+# Pose deduplication: leaders are scored once, members inherit their score, and weights make clusters count once.
+import os
+import json
+import numpy as np
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.cli import main
+from conditioned_ensemble_interface.data.ensembles import pose_ref, read_ligand_models
+from conditioned_ensemble_interface.data.packed import packed_ref, write_packed
+from conditioned_ensemble_interface.data.structure import read_first_model
+from conditioned_ensemble_interface.scoring.dedup import Deduplicator
+from conditioned_ensemble_interface.scoring.ensemble import aggregate
+from conditioned_ensemble_interface.utils.rmsd import leader_clusters
+
+def test_leader_clusters_and_weighted_aggregate():
+    base = np.zeros((1, 3, 3))
+    coords = np.concatenate([base, base + 5.0, base + 0.2, base + [0.0, 0.0, 0.6], base + 5.1])
+    # pose 3 is within 0.6 of pose 0 but not 0.5: it leads its own cluster
+    assert leader_clusters(coords, 0.5).tolist() == [0, 1, 0, 3, 1]
+    assert leader_clusters(coords, 1.0).tolist() == [0, 1, 0, 0, 1]
+    assert aggregate([1.0, 1.0, 3.0], "mean", weights=[0.5, 0.5, 1.0]) == 2.0
+    assert aggregate([1.0, 2.0], "softmax") == aggregate([1.0, 2.0], "softmax", weights=[1.0, 1.0])
+
+def test_dedup_run_scores_leaders_only(tmp_path):
+    rec = read_first_model("data/3ptb/receptor_clean.pdb")
+    models = list(read_ligand_models("data/3ptb/ligand.sdf")) * 3
+    models = [m.copy() for m in models]
+    models[1]["xyz"] += 0.05
+    models[2]["xyz"] += [2.0, 0.0, 0.0]
+    pack = str(tmp_path / "p.npz")
+    write_packed(str(pack), rec, models)
+    ds, full, dedup = tmp_path / "ds.jsonl", str(tmp_path / "full.jsonl"), str(tmp_path / "dedup.jsonl")
+    ds.write_text(json.dumps({"id": "x", "ensemble": pack}) + "\n")
+    main(["--dataset", str(ds), "--out", full, "--no-feature-store"])
+    main(["--dataset", str(ds), "--out", dedup, "--no-feature-store", "--dedup-rmsd", "0.5", "--chunksize", "1"])
+    full_scores = json.loads(open(full).read())["scores"]
+    entries = json.loads(open(dedup).read())["scores"]
+    assert [e["pose"] for e in entries] == [packed_ref(pack, k) for k in (1, 2, 3)]
+    assert [e["cluster"] for e in entries] == [packed_ref(pack, k) for k in (1, 1, 3)]
+    assert [e["weight"] for e in entries] == [0.5, 0.5, 1.0]
+    assert entries[1]["score"] == entries[0]["score"] == full_scores[0]["score"]
+    assert entries[2]["score"] == full_scores[2]["score"]
+
+def test_clusters_follow_all_atom_rmsd():
+    ligands = "runs/3ptb_smina/poses.pdbqt"
+    poses = [pose_ref("data/3ptb/receptor_clean.pdb", ligands, k) for k in range(1, 11)]
+    xyz = np.stack([m["xyz"] for m in read_ligand_models(ligands)]).astype(float)
+    assert xyz.shape == (10, 9, 3)
+    rmsd = np.sqrt(((xyz[:, None] - xyz[None]) ** 2).sum(-1).mean(-1))
+    for threshold in (0.5, 1.62, 1.7):
+        # brute-force leader clustering on the true 9-atom RMSD
+        expected = np.full(10, -1)
+        for k in range(10):
+            if expected[k] < 0:
+                expected[(expected < 0) & (rmsd[k] <= threshold)] = k
+        assert Deduplicator(threshold).clusters(poses).tolist() == expected.tolist()
+    assert Deduplicator(0.5).clusters(poses).tolist() == list(range(10))
@@ -0,0 +1,63 @@
+# Screened electrostatics: cached site pairs reweighted per condition match the direct Debye-Hueckel sum, in rows and sweeps.
+import os
+import numpy as np
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.electrostatics import COULOMB, DIELECTRIC, FEATURE, screened_energies
+from conditioned_ensemble_interface.scoring.feature_store import FeatureStore
+from conditioned_ensemble_interface.scoring.features import FEATURE_KEYS, compute_interface_features, pose_features
+from conditioned_ensemble_interface.scoring.model import item_features
+from conditioned_ensemble_interface.scoring.sweep import condition_grid, sweep_scores
+
+def _atom(serial, name, resname, chain, resseq, xyz, element):
+    return "ATOM  %5d %-4s %3s %s%4d    %8.3f%8.3f%8.3f  1.00  0.00          %2s" % (serial, name, resname, chain, resseq, *xyz, element)
+
+def _complex(path):
+    atoms = [("CA", "LYS", "A", 1, (0.0, 0.0, -3.0), "C"), ("NZ", "LYS", "A", 1, (0.0, 0.0, 0.0), "N"),
+             ("CA", "ASP", "B", 1, (0.0, 0.0, 6.0), "C"), ("OD1", "ASP", "B", 1, (0.0, 1.0, 4.0), "O"),
+             ("OD2", "ASP", "B", 1, (0.0, -1.0, 4.0), "O"), ("NZ", "LYS", "B", 2, (0.0, 0.0, 30.0), "N")]
+    path.write_text("\n".join(_atom(k + 1, *a) for k, a in enumerate(atoms)) + "\nEND\n")
+    return str(path)
+
+def _direct(ph, ionic):
+    lys, asp = 1.0 / (1.0 + 10 ** (ph - 10.5)), -1.0 / (1.0 + 10 ** (3.9 - ph))
+    r = np.sqrt(17.0)
+    return 2 * (lys * asp * 0.5) * COULOMB / DIELECTRIC * np.exp(-np.sqrt(ionic) / 3.04 * r) / r
+
+class _Linear:
+    dtype = np.float64
+    def feature_keys(self, rows):
+        return [FEATURE, "pH"]
+    def score_batch(self, X):
+        return X[:, 0] + 0.01 * X[:, 1]
+    def score(self, feats):
+        return float(self.score_batch(np.array([[feats[FEATURE], feats["pH"]]]))[0])
+
+def test_pairs_reweight_to_direct_sum(tmp_path):
+    pose = _complex(tmp_path / "c.pdb")
+    feats, pairs = pose_features(pose)
+    # the pairs stay out of the flat feature row, and the store hands back the same pairs
+    assert feats == compute_interface_features(pose) and set(feats) - {"pose_path"} <= set(FEATURE_KEYS)
+    store = FeatureStore(str(tmp_path / "fs.sqlite"))
+    assert store.pose_features(pose) == store.pose_features(pose) == (feats, pairs) and store.hits == 1
+    # the far lysine on chain B is past the cutoff and never paired
+    assert sorted(pairs["distance"]) == [np.sqrt(17.0)] * 2
+    ph, ionic = [2.0, 7.4, 7.4, 7.4], [0.15, 0.0, 0.15, 1.0]
+    e = screened_energies([pairs, None], ph, ionic)
+    assert np.allclose(e[:, 0], [_direct(p, i) for p, i in zip(ph, ionic)]) and not e[:, 1].any()
+    assert e[1, 0] < e[2, 0] < e[3, 0] < 0 and e[1, 0] < e[0, 0] < 0
+
+def test_rows_and_sweep_agree(tmp_path):
+    pose = _complex(tmp_path / "c.pdb")
+    rows = item_features({"poses": [pose, "examples/pose1.pdb"], "conditions": {"pH": 6.5, "ionic_strength": 0.3}})
+    assert np.isclose(rows[0][FEATURE], _direct(6.5, 0.3)) and rows[1][FEATURE] == 0.0
+    grid = condition_grid({"pH": [5.0, 6.5, 8.0], "ionic_strength": [0.05, 0.3]})
+    feats, pairs = zip(*[pose_features(p) for p in (pose, "examples/pose1.pdb")])
+    m = _Linear()
+    scores = sweep_scores(m, feats, grid, pairs)
+    assert scores[3, 0] == m.score(rows[0])
+    per_row = [[m.score(item_features({"poses": [p], "conditions": g})[0]) for p in (pose, "examples/pose1.pdb")] for g in grid]
+    assert scores.tolist() == per_row
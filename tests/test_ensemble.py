@@ -0,0 +1,44 @@
+# Batched aggregation: ragged and padded layouts agree with the scalar formula and softmax never overflows.
+import math
+import os
+import numpy as np
+import pytest
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.ensemble import aggregate, aggregate_batch
+
+def _reference(scores, method, t):
+    if method == "best":
+        return max(scores)
+    if method == "mean":
+        return sum(scores) / len(scores)
+    ws = [math.exp(s / t) for s in scores]
+    return sum(w * s for w, s in zip(ws, scores)) / sum(ws)
+
+def test_batch_layouts_match_scalar_formula():
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(0, 12, size=200)
+    flat = rng.normal(0, 3, size=int(lengths.sum()))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    width = int(lengths.max())
+    padded = np.full((len(lengths), width), np.nan)
+    mask = np.arange(width) < lengths[:, None]
+    padded[mask] = flat
+    for method in ("best", "mean", "softmax"):
+        ragged = aggregate_batch(flat, offsets, method=method, temperature=0.7)
+        assert np.array_equal(ragged, aggregate_batch(padded, mask=mask, method=method, temperature=0.7), equal_nan=True)
+        for i, (lo, hi) in enumerate(zip(offsets, offsets[1:])):
+            items = flat[lo:hi].tolist()
+            if not items:
+                assert math.isnan(ragged[i]) and math.isnan(aggregate(items, method))
+                continue
+            assert ragged[i] == aggregate(items, method, 0.7)
+            assert math.isclose(ragged[i], _reference(items, method, 0.7), rel_tol=1e-12, abs_tol=1e-12)
+
+def test_softmax_is_stable_at_extremes():
+    assert aggregate([1000.0, 999.0], "softmax", 0.01) == 1000.0
+    assert math.isclose(aggregate([-1e5, -1e5 + 1], "softmax"), -1e5 + 1 / (1 + math.exp(-1)), rel_tol=1e-12)
+    assert aggregate_batch([[5.0, 800.0], [-800.0, -805.0]], method="softmax").tolist() == [800.0, pytest.approx(-800.0 - 5 / (1 + math.exp(5)))]
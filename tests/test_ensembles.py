@@ -0,0 +1,70 @@
+# Receptor + multi-model ligand items: in-memory complexes equal the assembled complex files.
+import json
+import os
+import shutil
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.data.ensembles import count_models, expand_ensemble, parse_pose_ref, pose_ref
+from conditioned_ensemble_interface.data.loaders import load_dataset
+from conditioned_ensemble_interface.scoring.features import compute_interface_features
+from conditioned_ensemble_interface.scoring.feature_store import FeatureStore
+from conditioned_ensemble_interface.utils.posechecks import basic_pose_checks
+
+RECEPTOR = "data/3ptb/receptor_clean.pdb"
+LIGANDS = "runs/3ptb_smina/poses.pdbqt"
+
+def _complex(tmp_path, k):
+    rec = [l for l in open(RECEPTOR) if l.startswith(("ATOM", "HETATM"))]
+    lig, model = [], 0
+    for line in open(LIGANDS):
+        if line.startswith("MODEL"):
+            model += 1
+        elif model == k and line.startswith(("ATOM", "HETATM")):
+            lig.append(line[:21] + "L" + line[22:])
+    path = tmp_path / f"complex_{k}.pdb"
+    path.write_text("".join(rec + lig) + "END\n")
+    return str(path)
+
+def _strip(feats):
+    return {k: v for k, v in feats.items() if k != "pose_path"}
+
+def test_models_match_assembled_complexes(tmp_path):
+    assert count_models(LIGANDS) == 10
+    for k in (1, 4, 10):
+        feats = compute_interface_features(pose_ref(RECEPTOR, LIGANDS, k))
+        assert "contact_count_4A" in feats
+        assert _strip(feats) == _strip(compute_interface_features(_complex(tmp_path, k)))
+    assert "no_models" in compute_interface_features(pose_ref(RECEPTOR, LIGANDS, 11))
+    assert "missing_file" in compute_interface_features(pose_ref(RECEPTOR, "missing.pdbqt", 1))
+    assert basic_pose_checks(pose_ref(RECEPTOR, LIGANDS, 1))["pass"]
+
+def test_sdf_records_and_dataset_expansion(tmp_path):
+    sdf = tmp_path / "poses.sdf"
+    sdf.write_text(open("runs/3ptb_smina/pose_#1.sdf").read() + open("runs/3ptb_smina/pose_#2.sdf").read())
+    assert count_models(str(sdf)) == 2
+    assert "contact_count_4A" in compute_interface_features(pose_ref(RECEPTOR, str(sdf), 2))
+
+    item = {"id": "x", "receptor": RECEPTOR, "ligands": [LIGANDS, str(sdf)], "label": {"native_model": 3}}
+    (tmp_path / "ds.jsonl").write_text(json.dumps(item) + "\n")
+    (row,) = load_dataset(str(tmp_path / "ds.jsonl"))
+    assert len(row["poses"]) == 12 and row["label"]["native_pose"] == row["poses"][2]
+    assert parse_pose_ref(row["poses"][-1]) == (RECEPTOR, str(sdf), 2)
+    plain = {"id": "y", "poses": ["examples/pose1.pdb"]}
+    assert expand_ensemble(plain) is plain
+
+def test_store_keys_follow_both_files(tmp_path):
+    lig = str(tmp_path / "poses.pdbqt")
+    shutil.copy(LIGANDS, lig)
+    store = FeatureStore(str(tmp_path / "fs.sqlite"))
+    ref = pose_ref(RECEPTOR, lig, 2)
+    assert store.interface_features(ref) == compute_interface_features(ref)
+    assert store.interface_features(ref) == compute_interface_features(ref)
+    store.interface_features(pose_ref(RECEPTOR, lig, 3))
+    assert (store.hits, store.misses) == (1, 2)
+    with open(lig, "a") as f:
+        f.write("REMARK changed\n")
+    store.interface_features(ref)
+    assert store.misses == 3
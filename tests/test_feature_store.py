@@ -0,0 +1,33 @@
+# Feature store: cached rows equal fresh features and are keyed by content + schema version.
+import os
+import shutil
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.features import compute_interface_features
+from conditioned_ensemble_interface.scoring.feature_store import FeatureStore
+
+def test_store_hits_match_fresh_features(tmp_path):
+    store = FeatureStore(str(tmp_path / "fs.sqlite"))
+    poses = ["examples/pose1.pdb", "runs/3ptb_complexes/complex_native.pdb", "missing.pdb"]
+    for _ in range(2):
+        for p in poses:
+            assert store.interface_features(p) == compute_interface_features(p)
+    assert (store.hits, store.misses) == (2, 2)
+
+    copy = str(tmp_path / "copy.pdb")
+    shutil.copy("examples/pose1.pdb", copy)
+    assert store.interface_features(copy) == compute_interface_features(copy)
+    assert store.hits == 3  # same content under a new path
+    with open(copy, "a") as f:
+        f.write("REMARK changed\n")
+    store.interface_features(copy)
+    assert store.misses == 3
+
+    newer = FeatureStore(store.path, version=store.version + 1)
+    newer.interface_features("examples/pose1.pdb")
+    assert newer.misses == 1 and newer.stats()["stale_entries"] == 3
+    assert newer.prune() == 3 and newer.stats()["entries"] == 1
+    assert newer.prune(max_bytes=0) == 1 and newer.stats()["entries"] == 0
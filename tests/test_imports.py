@@ -0,0 +1,22 @@
+# Startup cost: `cei --help` imports no numeric stack and dummy-model scoring never loads sklearn, joblib or Bio.
+import importlib.util
+import os
+
+spec = importlib.util.spec_from_file_location("import_time", os.path.join("benchmarks", "import_time.py"))
+import_time = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(import_time)
+
+def test_help_and_dummy_path_stay_light(tmp_path):
+    assert import_time.loaded_modules("import conditioned_ensemble_interface.cli") == []
+    assert import_time.loaded_modules(import_time.help_code()) == []
+    run = ("from conditioned_ensemble_interface.cli import main\n"
+           f"main(['--config', 'configs/example.yaml', '--out', {str(tmp_path / 'out.jsonl')!r}, "
+           f"'--feature-store', {str(tmp_path / 'fs.sqlite')!r}])")
+    assert not {"sklearn", "joblib", "Bio"} & set(import_time.loaded_modules(run))
+    # features served from the store skip the KD-tree module entirely
+    assert "scipy" not in import_time.loaded_modules(run)
+
+def test_import_profile_parses_importtime():
+    prof = import_time.import_profile("conditioned_ensemble_interface.data.loaders")
+    self_us, cum_us = prof["conditioned_ensemble_interface.data.loaders"]
+    assert 0 < self_us <= cum_us
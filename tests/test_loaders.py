@@ -0,0 +1,43 @@
+# Streaming JSONL helpers: compressed round trip, sharding, the sorted-id merge and resume ids.
+import os
+import pytest
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+import json
+from conditioned_ensemble_interface.data.loaders import (JsonlWriter, _truncate_partial_line, completed_ids, iter_jsonl,
+                                                        merge_by_id, parse_shard, shard)
+
+def test_gzip_roundtrip_and_shards(tmp_path):
+    path = tmp_path / "out.jsonl.gz"
+    records = [{"id": f"x{i:02d}", "v": i} for i in range(10)]
+    with JsonlWriter(path, flush_every=3) as w:
+        for r in records:
+            w.write(r)
+    assert w.lines_written == 10 and list(iter_jsonl(path)) == records
+    parts = [list(shard(iter_jsonl(path), *parse_shard(f"{i}/3"))) for i in range(3)]
+    assert sorted(sum(parts, []), key=lambda r: r["v"]) == records and [len(p) for p in parts] == [4, 3, 3]
+    with pytest.raises(ValueError):
+        parse_shard("3/3")
+
+def test_merge_by_id():
+    left = [{"id": "a"}, {"id": "b"}, {"id": "d"}]
+    right = [{"id": "a", "c": 1}, {"id": "c", "c": 2}, {"id": "d", "c": 3}]
+    assert [(l["id"], r and r["c"]) for l, r in merge_by_id(left, right)] == [("a", 1), ("b", None), ("d", 3)]
+    with pytest.raises(ValueError):
+        list(merge_by_id([{"id": "b"}, {"id": "a"}], right))
+
+def test_completed_ids_streams_and_truncates(tmp_path):
+    path = tmp_path / "out.jsonl"
+    full = "".join(json.dumps(r) + "\n" for r in [{"id": "a", "scores": [{"pose": "p", "score": 1.0}]}, {"scores": [], "id": 7}])
+    path.write_text(full + '{"id": "partial", "sco')
+    assert completed_ids(path) == {"a", 7}
+    assert path.read_text() == full
+    path.write_text(full + "x" * 100)
+    with open(path, "rb+") as f:
+        _truncate_partial_line(f, block=8)
+    assert path.read_text() == full
+    path.write_text("no newline at all")
+    assert completed_ids(path) == set() and path.read_text() == ""
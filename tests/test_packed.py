@@ -0,0 +1,75 @@
+# Packed ensembles: memory-mapped poses score like the receptor + ligands files they were packed from.
+import os
+import numpy as np
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.data.ensembles import expand_ensemble, pack_files, pose_ref
+from conditioned_ensemble_interface.data.ensembles import read_ligand_models
+from conditioned_ensemble_interface.data.packed import open_packed, packed_ref, parse_packed_ref, write_packed
+from conditioned_ensemble_interface.data.structure import read_first_model
+from conditioned_ensemble_interface.scoring.features import compute_interface_features
+from conditioned_ensemble_interface.scoring.feature_store import FeatureStore
+from conditioned_ensemble_interface.scoring.receptor_cache import ReceptorCache
+from conditioned_ensemble_interface.utils.posechecks import basic_pose_checks
+from conditioned_ensemble_interface.utils.rmsd import evaluate_item
+
+RECEPTOR = "data/3ptb/receptor_clean.pdb"
+LIGANDS = "runs/3ptb_smina/poses.pdbqt"
+
+def _strip(feats):
+    return {k: v for k, v in feats.items() if k != "pose_path"}
+
+def test_pack_matches_source_files(tmp_path):
+    pack = str(tmp_path / "3ptb.npz")
+    assert pack_files(RECEPTOR, [LIGANDS], pack) == 10
+    p = open_packed(pack)
+    assert len(p) == 10 and p.names[0] == pose_ref(RECEPTOR, LIGANDS, 1)
+    xyz = p.ligand_xyz()
+    assert xyz.dtype == np.float32 and not xyz.flags.writeable
+    assert np.shares_memory(p.ligand(3)["xyz"], xyz)
+    with np.load(pack) as z:
+        assert np.array_equal(z["ligand_xyz"], xyz) and z["pose_offsets"][-1] == len(xyz)
+    for k in (1, 4, 10):
+        assert _strip(compute_interface_features(packed_ref(pack, k))) == _strip(compute_interface_features(pose_ref(RECEPTOR, LIGANDS, k)))
+    assert "no_models" in compute_interface_features(packed_ref(pack, 11))
+    assert basic_pose_checks(packed_ref(pack, 1))["pass"]
+
+    # every ligand atom is stored (benzamidine names all seven carbons "C"); features see PDBParser's two
+    assert len(p.ligand(1)["xyz"]) == 9 and p.pdb_block(1).count("HETATM") == 9
+    assert p.ligand(1, keep_duplicates=False)["name"].tolist() == ["C", "N"]
+    rmsd = lambda poses: [r["rmsd"] for r in evaluate_item({"poses": poses, "native_ligand": "data/3ptb/ligand.sdf"})["poses"]]
+    by_ref = rmsd([pose_ref(RECEPTOR, LIGANDS, k) for k in range(1, 11)])
+    assert np.isfinite(by_ref).all() and np.allclose(rmsd([packed_ref(pack, k) for k in range(1, 11)]), by_ref)
+
+    row = expand_ensemble({"id": "x", "ensemble": pack, "label": {"native_model": 2}})
+    assert len(row["poses"]) == 10 and row["label"]["native_pose"] == row["poses"][1]
+    assert parse_packed_ref(row["poses"][-1]) == (pack, 10)
+
+def test_store_keys_follow_pack(tmp_path):
+    pack = str(tmp_path / "p.npz")
+    pack_files(RECEPTOR, [LIGANDS], pack)
+    store = FeatureStore(str(tmp_path / "fs.sqlite"))
+    store.interface_features(packed_ref(pack, 1))
+    store.interface_features(packed_ref(pack, 1))
+    store.interface_features(packed_ref(pack, 2))
+    assert (store.hits, store.misses) == (1, 2)
+    assert "missing_file" in store.interface_features(packed_ref(str(tmp_path / "none.npz"), 1))
+
+def test_receptor_cache_keyed_per_pack(tmp_path):
+    rec = read_first_model(RECEPTOR)
+    glycine = rec.copy()
+    glycine["resname"] = "GLY"  # same coordinates, different chemistry
+    ligands = [m.copy() for m in list(read_ligand_models(LIGANDS))[:2]]
+    for m in ligands:
+        m["resname"] = "LEU"
+    a, b = str(tmp_path / "a.npz"), str(tmp_path / "b.npz")
+    write_packed(a, rec, ligands)
+    write_packed(b, glycine, ligands)
+    cache = ReceptorCache()
+    for ref in (packed_ref(a, 1), packed_ref(a, 2), packed_ref(b, 1)):
+        assert compute_interface_features(ref, cache=cache) == compute_interface_features(ref)
+    assert compute_interface_features(packed_ref(a, 1))["hydrophobic_contacts"] != compute_interface_features(packed_ref(b, 1))["hydrophobic_contacts"]
+    assert cache.stats()["hits"] == 1 and len(cache) == 2
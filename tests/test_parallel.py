@@ -0,0 +1,38 @@
+# Multi-process scoring must write exactly what a serial run writes.
+import os
+import glob
+import json
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.parallel import _AHEAD, iter_scores
+
+def _lines(results):
+    return [json.dumps({"id": i, "scores": s}) for i, s in results]
+
+def test_parallel_matches_serial():
+    poses = sorted(glob.glob("runs/3ptb_complexes/*.pdb")) + ["examples/pose1.pdb", "examples/pose2.pdb", "missing.pdb"]
+    items = [{"id": "big", "poses": poses, "conditions": {"pH": 7.0}},
+             {"id": "empty", "poses": []},
+             {"id": "small", "poses": poses[:2], "conditions": {"pH": 6.5, "ionic_strength": 0.3}}]
+    cfg = {"path": "artifacts/model.joblib"}
+    serial = _lines(iter_scores(items, cfg))
+    assert len(serial) == 3
+    assert _lines(iter_scores(items, cfg, workers=2, chunksize=3)) == serial
+    assert sorted(_lines(iter_scores(items, cfg, workers=2, chunksize=2, ordered=False))) == sorted(serial)
+
+def test_parallel_reads_items_a_bounded_window_ahead():
+    cfg = {"path": "artifacts/model.joblib"}
+    for ordered in (True, False):
+        pulled = []
+        def items():
+            for k in range(40):
+                pulled.append(k)
+                yield {"id": k, "poses": ["examples/pose1.pdb"]}
+        results = iter_scores(items(), cfg, workers=2, chunksize=1, ordered=ordered)
+        next(results)
+        # one pose per task: the pool was fed its window plus one refill, not the whole stream
+        assert len(pulled) <= 2 * _AHEAD + 1
+        assert len(list(results)) == 39
@@ -0,0 +1,107 @@
+# Geometry gates: vectorized bond/angle/clash/box checks flag exactly the distorted poses of an ensemble.
+import os
+import numpy as np
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.data.ensembles import pack_files, pose_ref, read_ligand_models
+from conditioned_ensemble_interface.data.packed import packed_ref
+from conditioned_ensemble_interface.scoring.model import load_model, score_items
+from conditioned_ensemble_interface.utils.posebusters_checks import ReceptorAtoms, gate_ensemble, gate_poses, infer_bonds, load_pose_atoms
+from conditioned_ensemble_interface.utils.posechecks import checks_from_structure
+
+RECEPTOR = "data/3ptb/receptor_clean.pdb"
+LIGANDS = "runs/3ptb_smina/poses.pdbqt"
+
+def _chain(n=6, bond=1.53):
+    # zig-zag carbon chain with ~111 degree angles
+    return np.array([[k * bond * 0.83, (k % 2) * bond * 0.56, 0.0] for k in range(n)])
+
+def test_gates_flag_each_distortion():
+    good = _chain()
+    stretched = good.copy()
+    stretched[3:] += [0.9, 0.0, 0.0]
+    bent = good.copy()
+    bent[2] = good[0] + [0.3, 1.2, 0.0]
+    folded = good.copy()
+    folded[5] = good[0] + [0.2, -1.1, 0.5]
+    coords = np.stack([good] * 5 + [stretched, bent, folded])
+    elements = ["C"] * 6
+    bi, bj = infer_bonds(coords, elements)
+    assert list(zip(bi.tolist(), bj.tolist())) == [(k, k + 1) for k in range(5)]
+
+    receptor = np.array([good[2] + [0.0, 0.0, 1.5], [50.0, 50.0, 50.0]])
+    box = {"center": good.mean(axis=0).tolist(), "size": [12.0, 12.0, 12.0]}
+    res = gate_ensemble(coords, elements, box=box)
+    assert res["pass"].tolist() == [True] * 5 + [False] * 3
+    assert not res["bond_lengths_ok"][5] and not res["bond_angles_ok"][6] and not res["internal_clash_ok"][7]
+    assert res["bond_angles_ok"][5] and res["internal_clash_ok"][6] and res["in_box"].all()
+
+    res = gate_ensemble(coords[:1], elements, receptor, ["N", "C"], box={"center": [40.0, 0.0, 0.0], "size": [4.0, 4.0, 4.0]})
+    assert not res["protein_clash_ok"][0] and not res["in_box"][0]
+    assert np.isclose(res["min_protein_distance"][0], 1.5)
+    assert gate_ensemble(coords[:1], elements, receptor, ["ZN", "C"])["protein_clash_ok"][0]
+
+def test_gate_poses_over_pack_and_inline_scores(tmp_path):
+    pack = str(tmp_path / "3ptb.npz")
+    pack_files(RECEPTOR, [LIGANDS], pack)
+    poses = [packed_ref(pack, k) for k in range(1, 11)] + [packed_ref(pack, 11)]
+    gates = gate_poses(poses)
+    assert all(g["pass"] for g in gates[:10]) and gates[0]["min_protein_distance"] > 2.0
+    assert not gates[10]["pass"] and "error" in gates[10]
+
+    scores = score_items(load_model({}), [{"id": "x", "poses": poses[:10]}], geometry=True)[0]
+    structure = scores[0]["structure"]
+    assert structure["geometry"] == gates[0]
+    checks = checks_from_structure(structure)
+    assert checks["geometry_ok"] and checks["pass"]
+    assert not checks_from_structure(dict(structure, geometry={"pass": False}))["pass"]
+    assert "geometry_ok" not in checks_from_structure({k: v for k, v in structure.items() if k != "geometry"})
+
+def test_docked_ligands_keep_every_atom():
+    # docking output names every carbon "C"; PDBParser would keep one C and one N of benzamidine
+    receptors = ReceptorAtoms()
+    for pose in (pose_ref(RECEPTOR, LIGANDS, 4), "runs/3ptb_complexes/complex_native.pdb"):
+        xyz, el, _ = load_pose_atoms(pose, receptors)
+        assert el.tolist() == ["C"] * 7 + ["N"] * 2
+        assert len(infer_bonds(xyz[None], el)[0]) == 9  # six ring bonds, ring-amidine and two C-N
+    gates = gate_poses([pose_ref(RECEPTOR, LIGANDS, k) for k in range(1, 11)])
+    assert all(g["pass"] and g["min_bond_ratio"] is not None and g["min_bond_angle"] > 100.0 for g in gates)
+
+def test_topology_is_fixed_per_ligand_file(tmp_path):
+    # model 2 is model 1 blown up 1.5x: no bond survives inference on it alone, yet it must fail the gate however batched
+    model = open(LIGANDS).read().split("ENDMDL")[0].split("\n", 1)[1]
+    rows = [l for l in model.splitlines() if l.startswith(("ATOM", "HETATM"))]
+    xyz = np.array([[float(l[30:38]), float(l[38:46]), float(l[46:54])] for l in rows])
+    xyz = xyz.mean(axis=0) + 1.5 * (xyz - xyz.mean(axis=0))
+    stretched = "".join(f"{l[:30]}{x:8.3f}{y:8.3f}{z:8.3f}{l[54:]}\n" for l, (x, y, z) in zip(rows, xyz))
+    ligands = tmp_path / "poses.pdbqt"
+    ligands.write_text(f"MODEL 1\n{model}ENDMDL\nMODEL 2\n{stretched}ENDMDL\n")
+    pack = str(tmp_path / "poses.npz")
+    pack_files(RECEPTOR, [str(ligands)], pack)
+    for refs in ([pose_ref(RECEPTOR, str(ligands), k) for k in (1, 2)], [packed_ref(pack, k) for k in (1, 2)]):
+        alone, together = gate_poses(refs[1:]), gate_poses(refs)
+        assert alone[0] == together[1] and not alone[0]["bond_lengths_ok"] and alone[0]["max_bond_ratio"] > 1.3
+        assert together[0]["pass"]
+
+def test_elements_come_from_pdb_columns_and_pdbqt_types(tmp_path):
+    # "NA" in a PDB element column is sodium (metal, clash-exempt); only PDBQT atom types go through the AD table
+    xyz = load_pose_atoms(pose_ref(RECEPTOR, LIGANDS, 1), ReceptorAtoms())[0]
+    out = xyz - xyz.mean(axis=0)
+    k = np.argmax(np.linalg.norm(out, axis=1))
+    (x, y, z), far = xyz[k] + 2.0 * out[k] / np.linalg.norm(out[k]), xyz[k] + 30.0
+    receptor = tmp_path / "receptor.pdb"
+    receptor.write_text(f"ATOM      1  CA  GLY A   1    {far[0]:8.3f}{far[1]:8.3f}{far[2]:8.3f}  1.00  0.00           C\n"
+                        f"HETATM    2 NA    NA A 901    {x:8.3f}{y:8.3f}{z:8.3f}  1.00  0.00          NA\nEND\n")
+    receptors = ReceptorAtoms()
+    rec = load_pose_atoms(pose_ref(str(receptor), LIGANDS, 1), receptors)[2]
+    assert receptors.atoms(rec)[1].tolist() == ["C", "NA"]
+    gate = gate_poses([pose_ref(str(receptor), LIGANDS, 1)])[0]
+    assert gate["protein_clash_ok"] and abs(gate["min_protein_distance"] - 2.0) < 1e-3
+
+    rows = [l for l in open(LIGANDS).read().split("ENDMDL")[0].splitlines() if l.startswith("ATOM")]
+    ligand = tmp_path / "chloro.pdbqt"
+    ligand.write_text("".join(f"{l[:77]}{t}\n" for l, t in zip(rows, ["Cl", "A", "NA", "OA"])))
+    assert read_ligand_models(str(ligand))[0]["element"].tolist() == ["CL", "C", "N", "O"]
@@ -0,0 +1,20 @@
+# One-parse pose analysis must agree with the separate checks and feature calls.
+import os
+import glob
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.features import compute_interface_features
+from conditioned_ensemble_interface.utils.posechecks import analyze_pose, basic_pose_checks, checks_from_structure
+
+def test_analyze_pose_matches_separate_passes():
+    paths = sorted(glob.glob("runs/3ptb_complexes/*.pdb")) + ["examples/pose1.pdb", "examples/pose2.pdb", "missing.pdb"]
+    for p in paths:
+        for min_atoms in (2, 3):
+            a = analyze_pose(p, min_atoms_per_chain=min_atoms)
+            assert a["checks"] == basic_pose_checks(p, min_atoms_per_chain=min_atoms)
+            assert a["features"] == compute_interface_features(p)
+            assert checks_from_structure(a["structure"], min_atoms) == a["checks"]
+    assert analyze_pose("examples/pose1.pdb", min_atoms_per_chain=3)["structure"]["chain_atoms"] == [3, 2]
@@ -0,0 +1,51 @@
+# Profiling: stage totals, per-pose traces and worker merging; off by default and output unchanged when on.
+import json
+import os
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.cli import main
+from conditioned_ensemble_interface.utils import profiling
+
+def _dataset(tmp_path):
+    items = [{"id": f"it{i}", "poses": ["examples/pose1.pdb", "examples/pose2.pdb"], "conditions": {"pH": 7.0}} for i in range(3)]
+    path = tmp_path / "ds.jsonl"
+    path.write_text("".join(json.dumps(it) + "\n" for it in items))
+    return str(path)
+
+def test_profiler_totals_and_merge():
+    assert profiling.active() is None and profiling.stage("x") is profiling.stage("y")
+    worker = profiling.Profiler(trace=True)
+    profiling.enable(worker)
+    try:
+        with profiling.pose_trace("a", "p.pdb"):
+            with profiling.stage("parse"):
+                pass
+            with profiling.stage("parse"):
+                pass
+        profiling.count("poses", 2)
+    finally:
+        profiling.disable()
+    sunk = []
+    parent = profiling.Profiler(trace_sink=sunk.append)
+    parent.merge(worker.drain())
+    assert worker.totals == {} and parent.totals["parse"][0] == 2 and parent.counters == {"poses": 2}
+    assert sunk[0]["id"] == "a" and sunk[0]["parse_s"] <= sunk[0]["seconds"]
+    assert parent.format_summary()[1].startswith("parse")
+
+def test_cli_profile_keeps_output(tmp_path, capsys):
+    ds = _dataset(tmp_path)
+    plain, prof = str(tmp_path / "plain.jsonl"), str(tmp_path / "prof.jsonl")
+    main(["--dataset", ds, "--out", plain, "--no-feature-store"])
+    trace = tmp_path / "trace.jsonl"
+    main(["--dataset", ds, "--out", prof, "--no-feature-store", "--workers", "2", "--chunksize", "1",
+          "--profile-trace", str(trace), "--profile-sample", "2", "--profile-dir", str(tmp_path / "profiles")])
+    assert open(plain).read() == open(prof).read()
+    assert profiling.active() is None
+    records = [json.loads(l) for l in trace.open()]
+    assert sorted((r["id"], r["pose"]) for r in records) == sorted((f"it{i}", p) for i in range(3) for p in ["examples/pose1.pdb", "examples/pose2.pdb"])
+    out = capsys.readouterr().out
+    assert "[profile] parse" in out and "[profile] score" in out and "poses_scored: 6" in out
+    assert any(f.endswith(".prof") for f in os.listdir(tmp_path / "profiles"))
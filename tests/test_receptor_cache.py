@@ -0,0 +1,30 @@
+# Receptor cache: shared chains are parsed once and results match the uncached path.
+import os
+import numpy as np
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.features import compute_interface_features
+from conditioned_ensemble_interface.scoring.receptor_cache import ReceptorCache
+
+def test_cached_features_match_and_reuse_receptor():
+    poses = ["runs/3ptb_complexes/complex_native.pdb", "runs/3ptb_complexes/complex_pose_1.pdb",
+             "examples/pose1.pdb", "examples/pose2.pdb", "does/not/exist.pdb"]
+    cache = ReceptorCache(maxsize=4)
+    for p in poses:
+        assert compute_interface_features(p, cache=cache) == compute_interface_features(p)
+    # both 3PTB complexes share receptor_clean.pdb verbatim
+    assert cache.stats()["hits"] >= 1 and len(cache) == 1
+
+def test_lru_eviction_is_bounded():
+    from conditioned_ensemble_interface.scoring.contacts import ChainAtoms
+    cache = ReceptorCache(maxsize=2, min_records=1)
+    build = lambda: ChainAtoms([[0.0, 0.0, 0.0]], [True], [False], [False], [False])
+    rows = {k: np.frombuffer(k.encode().ljust(80), dtype=np.uint8).reshape(1, 80) for k in "abc"}
+    for k in "abac":
+        cache.get_or_build(rows[k], build)
+    assert len(cache) == 2
+    cache.get_or_build(rows["a"], build)
+    assert cache.stats()["hits"] == 2  # "a" survived, "b" was evicted
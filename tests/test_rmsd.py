@@ -0,0 +1,45 @@
+# Symmetric RMSD: one vectorized call equals the per-pose minimum over symmetry matches.
+import os
+import numpy as np
+import pytest
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.utils.rmsd import evaluate_item, symmetric_rmsd
+
+def test_symmetric_rmsd_matches_brute_force():
+    rng = np.random.default_rng(0)
+    native = rng.normal(size=(9, 3))
+    # identity plus swaps of two symmetric atom pairs (like carboxylate oxygens)
+    matches = np.array([np.arange(9)] * 4)
+    matches[1, [2, 3]] = [3, 2]
+    matches[2, [6, 7]] = [7, 6]
+    matches[3, [2, 3, 6, 7]] = [3, 2, 7, 6]
+    poses = native + rng.normal(scale=0.3, size=(50, 9, 3))
+    poses[::2][:, [2, 3]] = poses[::2][:, [3, 2]]
+    got = symmetric_rmsd(native, poses, matches)
+    brute = [min(np.sqrt(((p[m] - native) ** 2).sum(axis=1).mean()) for m in matches) for p in poses]
+    assert np.allclose(got, brute, rtol=1e-12)
+    assert (got <= symmetric_rmsd(native, poses, matches[:1]) + 1e-12).all()
+    assert symmetric_rmsd(native, native[None], matches).tolist() == [0.0]
+
+def test_evaluate_item_ranks_by_scores(tmp_path):
+    pytest.importorskip("rdkit")
+    from rdkit import Chem
+    from rdkit.Chem import AllChem
+    mol = Chem.AddHs(Chem.MolFromSmiles("OC(=O)c1ccccc1"))
+    AllChem.EmbedMolecule(mol, randomSeed=0)
+    paths = []
+    for i, shift in enumerate([0.0, 3.0]):
+        conf = mol.GetConformer()
+        for a in range(mol.GetNumAtoms()):
+            p = conf.GetAtomPosition(a)
+            conf.SetAtomPosition(a, (p.x + shift, p.y, p.z))
+        paths.append(str(tmp_path / f"pose{i}.pdb"))
+        Chem.MolToPDBFile(mol, paths[-1])
+    item = {"id": "x", "poses": paths, "label": {"native_pose": paths[0]}}
+    row = evaluate_item(item, ks=(1,), scores={paths[0]: 0.1, paths[1]: 0.9})
+    assert row["n_compared"] == 2 and row["best_rank"] == 2 and row["best_rmsd"] == pytest.approx(0.0, abs=1e-3)
+    assert not row["top1_success"] and row["n_symmetry_matches"] >= 2
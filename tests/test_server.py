@@ -0,0 +1,82 @@
+# cei serve: concurrent localhost requests are micro-batched and score exactly like a cei run.
+import asyncio
+import os
+import threading
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.parallel import iter_scores
+from conditioned_ensemble_interface.server import Client, ScoringServer
+
+MODEL = {"path": "artifacts/real_3ptb_complex.joblib"}
+ITEM = {"id": "x", "poses": ["examples/pose1.pdb", "examples/pose2.pdb", "runs/3ptb_complexes/complex_native.pdb"],
+        "conditions": {"pH": 7.4, "ionic_strength": 0.15}}
+
+class _Running:
+    def __init__(self, server, **where):
+        self.server, self.loop = server, asyncio.new_event_loop()
+        started = threading.Event()
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(server.start(**where))
+            started.set()
+            self.loop.run_forever()
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait(30)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result(30)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(30)
+
+def test_concurrent_requests_share_a_batch():
+    expected = dict(iter_scores([ITEM], MODEL))["x"]
+    running = _Running(ScoringServer(MODEL, max_wait_ms=200), host="127.0.0.1", port=0)
+    try:
+        host, port = running.server.address
+        out = {}
+        def call(k):
+            with Client(host, port) as c:
+                out[k] = c.score(dict(ITEM, id=f"r{k}"))
+        threads = [threading.Thread(target=call, args=(k,)) for k in range(6)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        assert {k: r["id"] for k, r in out.items()} == {k: f"r{k}" for k in range(6)}
+        assert all(r["scores"] == expected for r in out.values())
+        with Client(host, port) as c:
+            status, stats = c.request("/stats")
+            assert status == 200 and stats["requests"] == 6 and stats["batches"] < 6
+            assert stats["receptor_cache"]["hits"] > 0
+            status, body = c.request("/score", {"items": [ITEM, {"id": "bad", "poses": ["examples/pose1.pdb"], "conditions": {"pH": "x"}}]})
+            assert status == 200 and body["results"][0]["scores"] == expected
+            assert "scores" not in body["results"][1] and body["results"][1]["errors"][0]["stage"] == "item"
+            assert c.request("/nope")[0] == 404 and c.request("/score", [1])[0] == 400
+    finally:
+        running.stop()
+
+def test_bad_ensemble_fails_only_its_item(tmp_path):
+    pack = tmp_path / "broken.npz"
+    pack.write_bytes(b"not a pack")
+    running = _Running(ScoringServer(MODEL, max_wait_ms=0), host="127.0.0.1", port=0)
+    try:
+        with Client(*running.server.address) as c:
+            status, body = c.request("/score", {"items": [{"id": "bad", "ensemble": str(pack)}, ITEM]})
+            assert status == 200 and body["results"][1]["scores"] == dict(iter_scores([ITEM], MODEL))["x"]
+            assert body["results"][0]["id"] == "bad" and "scores" not in body["results"][0]
+            assert body["results"][0]["errors"][0]["stage"] == "expand"
+    finally:
+        running.stop()
+
+def test_unix_socket(tmp_path):
+    sock = str(tmp_path / "cei.sock")
+    running = _Running(ScoringServer(MODEL, max_wait_ms=0), unix=sock)
+    try:
+        with Client(unix=sock) as c:
+            assert c.request("/health") == (200, {"ok": True})
+            assert c.score(ITEM)["scores"] == dict(iter_scores([ITEM], MODEL))["x"]
+    finally:
+        running.stop()
+    assert not os.path.exists(sock)
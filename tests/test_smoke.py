@@ -36,3 +36,10 @@ def test_features_and_model_scoring():
     # sanity: aggregation should return a finite float
     agg = aggregate([s1, s2], method="softmax", temperature=1.0)
     assert isinstance(agg, float) and math.isfinite(agg)
+
+def test_batch_scoring_matches_per_pose():
+    from conditioned_ensemble_interface.scoring.model import DummyModel, score_rows
+    cond = condition_features({"pH": 7.0, "ionic_strength": 0.15})
+    rows = [{**compute_interface_features(p), **cond} for p in ["examples/pose1.pdb", "examples/pose2.pdb", "runs/3ptb_complexes/complex_native.pdb"]]
+    for m in (load_model({"path": "artifacts/model.joblib"}), DummyModel()):
+        assert score_rows(m, rows) == [m.score(r) for r in rows]
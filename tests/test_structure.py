@@ -0,0 +1,20 @@
+# Native PDB reader must agree field-for-field with the Bio.PDB fallback.
+import os
+import glob
+import numpy as np
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.data.structure import _read_with_biopython, chain_slices, read_first_model
+
+def test_native_reader_matches_biopython():
+    paths = sorted(glob.glob("runs/3ptb_complexes/*.pdb")) + sorted(glob.glob("examples/*.pdb"))
+    assert paths
+    for p in paths:
+        fast, ref = read_first_model(p, fallback=False), _read_with_biopython(p)
+        assert fast.dtype == ref.dtype and len(fast) == len(ref), p
+        for field in fast.dtype.names:
+            assert np.array_equal(fast[field], ref[field]), (p, field)
+        assert [c for c, _ in chain_slices(fast)] == [c for c, _ in chain_slices(ref)]
@@ -0,0 +1,21 @@
+# Broadcast condition sweep must score exactly like per-pose, per-condition rows.
+import os
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.features import compute_interface_features, condition_features
+from conditioned_ensemble_interface.scoring.model import DummyModel, load_model
+from conditioned_ensemble_interface.scoring.sweep import condition_grid, sweep_scores
+
+def test_sweep_scores_match_per_row_scoring():
+    poses = ["examples/pose1.pdb", "examples/pose2.pdb", "runs/3ptb_complexes/complex_native.pdb", "missing.pdb"]
+    feats = [compute_interface_features(p) for p in poses]
+    grid = condition_grid({"pH": {"start": 6.0, "stop": 8.0, "num": 3}, "ionic_strength": [0.05, 0.3],
+                           "cofactor": [False, True], "glycosaminoglycan_sulfation_level": [0.0, 0.7]})
+    assert len(grid) == 24 and grid[1] == {"pH": 6.0, "ionic_strength": 0.05, "cofactor": False, "glycosaminoglycan_sulfation_level": 0.7}
+    for m in (load_model({"path": "artifacts/model.joblib"}), DummyModel()):
+        scores = sweep_scores(m, feats, grid)
+        assert scores.shape == (24, 4)
+        assert scores.tolist() == [[m.score({**f, **condition_features(g)}) for f in feats] for g in grid]
@@ -0,0 +1,52 @@
+# Training matrix: parallel builds match serial ones, saved tables are reused only while current.
+import os
+import shutil
+import numpy as np
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.training import build_feature_table, feature_table
+
+def _items(tmp_path):
+    poses = []
+    for name in ("pose1.pdb", "pose2.pdb"):
+        shutil.copy(os.path.join("examples", name), tmp_path / name)
+        poses.append(str(tmp_path / name))
+    return [{"id": "a", "poses": poses, "conditions": {"pH": 7.4}, "label": {"native_pose": poses[0]}},
+            {"id": "unlabeled", "poses": poses},
+            {"id": "b", "poses": poses[::-1], "conditions": {"pH": 6.8, "ionic_strength": 0.2}, "label": {"native_pose": poses[0]}}]
+
+def test_parallel_build_matches_serial(tmp_path):
+    items = _items(tmp_path)
+    serial = build_feature_table(items)
+    par = build_feature_table(items, workers=2, chunksize=1)
+    assert np.array_equal(serial.X, par.X) and serial.X.dtype == np.float64
+    assert serial.feature_order == par.feature_order == sorted(serial.feature_order)
+    assert serial.y.tolist() == [1, 0, 0, 1] and serial.groups.tolist() == [0, 0, 1, 1]
+    assert serial.item_ids == ["a", "b"]
+
+def test_saved_table_reused_until_inputs_change(tmp_path):
+    items = _items(tmp_path)
+    out = str(tmp_path / "table")
+    built, reused = feature_table(items, out)
+    assert not reused
+    loaded, reused = feature_table(items, out)
+    assert reused and isinstance(loaded.X, np.memmap)
+    assert np.array_equal(loaded.X, built.X) and loaded.feature_order == built.feature_order
+    assert loaded.y.tolist() == built.y.tolist()
+
+    items[0]["conditions"]["pH"] = 7.0
+    assert not feature_table(items, out)[1]
+    with open(items[0]["poses"][1], "a") as f:
+        f.write("REMARK changed\n")
+    assert not feature_table(items, out)[1]
+    assert feature_table(items, out)[1]
+
+def test_missing_pose_gets_flagged_row(tmp_path):
+    items = _items(tmp_path)[:1]
+    items[0]["poses"].append(str(tmp_path / "nope.pdb"))
+    table, reused = feature_table(items, str(tmp_path / "table"))
+    assert not reused and table.X.shape[0] == 3 and table.y.tolist() == [1, 0, 0]
+    assert feature_table(items, str(tmp_path / "table"))[1]
@@ -0,0 +1,27 @@
+# NumPy tree export must reproduce predict_proba and only be used while it matches its joblib.
+import os
+import shutil
+import numpy as np
+
+SRC = os.path.join(os.getcwd(), "src")
+if SRC not in os.sys.path:
+    os.sys.path.insert(0, SRC)
+
+from conditioned_ensemble_interface.scoring.model import SklearnModel, TreeEnsembleModel, export_tree_ensemble, load_model
+
+def test_tree_export_matches_sklearn(tmp_path):
+    src = str(tmp_path / "m.joblib")
+    shutil.copy("artifacts/model.joblib", src)
+    assert isinstance(load_model({"path": src}), SklearnModel)
+    ref = SklearnModel(src)
+    export_tree_ensemble(ref.model, str(tmp_path / "m.npz"), source_path=src)
+    fast = load_model({"path": src})
+    assert isinstance(fast, TreeEnsembleModel) and fast.feature_order == ref.feature_order
+    rng = np.random.default_rng(0)
+    X = (rng.random((700, fast.n_features)) * rng.choice([1, 10, 100], size=(700, fast.n_features))).astype(np.float32)
+    X[::3] = np.round(X[::3])
+    assert np.array_equal(fast.score_batch(X), ref.score_batch(X))
+    assert isinstance(load_model({"path": src, "kind": "sklearn"}), SklearnModel)
+    with open(src, "ab") as f:  # retrained artifact: the old export no longer applies
+        f.write(b"\0")
+    assert isinstance(load_model({"path": src}), SklearnModel)